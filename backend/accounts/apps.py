@@ -7,3 +7,4 @@ class AccountsConfig(AppConfig):
     
     def ready(self):
         import accounts.models  # This loads the signals
+        import accounts.authentication  # Logout invalidates the session cache
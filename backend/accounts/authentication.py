@@ -0,0 +1,157 @@
+import hashlib
+from importlib import import_module
+from typing import Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from decouple import config
+from django.conf import settings
+from django.contrib.auth import HASH_SESSION_KEY, SESSION_KEY, user_logged_out
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from rest_framework.authentication import SessionAuthentication
+
+# Short, so a revoked session stops resolving within a minute even on other workers
+SESSION_USER_CACHE_TTL = config('SESSION_USER_CACHE_TTL', default=60, cast=int)
+SESSION_USER_CACHE_ALIAS = config('SESSION_USER_CACHE_ALIAS', default='default')
+
+# Cached for cookies that don't map to a logged-in user
+ANONYMOUS = (None, None)
+
+
+def _cache():
+    return caches[SESSION_USER_CACHE_ALIAS]
+
+
+def _cache_key(session_key: str) -> str:
+    # Never put raw session keys in a shared cache
+    return 'session-user:' + hashlib.sha256(session_key.encode()).hexdigest()
+
+
+def _load_session(session_key: str) -> Tuple[Optional[int], Optional[str]]:
+    """(user id, session auth hash) stored in the session, via the configured session engine"""
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    user_id = session.get(SESSION_KEY)
+    if user_id is None:
+        return ANONYMOUS
+    return int(user_id), session.get(HASH_SESSION_KEY)
+
+
+def session_user_id(session_key: str) -> Tuple[Optional[int], Optional[str]]:
+    """Session -> (user id, auth hash), through the shared cache"""
+    key = _cache_key(session_key)
+    cached = _cache().get(key)
+    if cached is not None:
+        return cached
+
+    entry = _load_session(session_key)
+    _cache().set(key, entry, SESSION_USER_CACHE_TTL)
+    return entry
+
+
+def forget_session(session_key: Optional[str]):
+    if session_key:
+        _cache().delete(_cache_key(session_key))
+
+
+def _verified(user: Optional[User], session_hash: Optional[str]) -> bool:
+    """Same check as django.contrib.auth.get_user: a password change ends old sessions"""
+    if user is None or not session_hash:
+        return False
+    return any(
+        constant_time_compare(session_hash, auth_hash)
+        for auth_hash in (user.get_session_auth_hash(), *user.get_session_auth_fallback_hash())
+    )
+
+
+def _user_queryset(select_profile: bool):
+    users = User.objects.filter(is_active=True)
+    return users.select_related('profile') if select_profile else users
+
+
+def _memoized(request, select_profile: bool):
+    memo = getattr(request, '_session_user', None)
+    if memo is None:
+        return False, None
+    user, with_profile = memo
+    if select_profile and user is not None and not with_profile:
+        return False, None
+    return True, user
+
+
+def get_session_user(request, select_profile: bool = False) -> Optional[User]:
+    """
+    The user logged in with the request's session cookie, or None.
+    Resolved once per request; pass select_profile=True to load user.profile in the same query.
+    """
+    found, user = _memoized(request, select_profile)
+    if found:
+        return user
+
+    user = None
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        user_id, session_hash = session_user_id(session_key)
+        if user_id is not None:
+            user = _user_queryset(select_profile).filter(id=user_id).first()
+            if not _verified(user, session_hash):
+                forget_session(session_key)
+                user = None
+
+    request._session_user = (user, select_profile)
+    return user
+
+
+async def aget_session_user(request, select_profile: bool = False) -> Optional[User]:
+    """get_session_user for async views"""
+    found, user = _memoized(request, select_profile)
+    if found:
+        return user
+
+    user = None
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        # Session engines have no async API on Django 4.2
+        user_id, session_hash = await sync_to_async(session_user_id)(session_key)
+        if user_id is not None:
+            user = await _user_queryset(select_profile).filter(id=user_id).afirst()
+            if not _verified(user, session_hash):
+                await sync_to_async(forget_session)(session_key)
+                user = None
+
+    request._session_user = (user, select_profile)
+    return user
+
+
+class SessionCookieAuthentication(SessionAuthentication):
+    """
+    DRF authentication backed by get_session_user, so DRF and plain JSON views share
+    one lookup per request. Like SessionAuthentication, unsafe methods need a CSRF token
+    unless the view's dispatch is marked csrf_exempt.
+    """
+
+    def authenticate(self, request):
+        user = get_session_user(request._request)
+        if user is None:
+            return None
+        self.enforce_csrf(request)
+        return user, None
+
+    def enforce_csrf(self, request):
+        # DRF runs the check itself with no view to look at; honour @csrf_exempt like the middleware does
+        view = (request.parser_context or {}).get('view')
+        if getattr(getattr(view, 'dispatch', None), 'csrf_exempt', False):
+            return
+        super().enforce_csrf(request)
+
+    def authenticate_header(self, request):
+        # Makes DRF answer 401 rather than 403 for anonymous requests
+        return 'Session'
+
+
+@receiver(user_logged_out)
+def forget_session_on_logout(sender, request, **kwargs):
+    if request is not None:
+        forget_session(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        forget_session(request.session.session_key)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_userprofile_is_profile_complete'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='timezone',
+            field=models.CharField(default='UTC', help_text='IANA time zone; decides which day a meal is logged on', max_length=64),
+        ),
+    ]
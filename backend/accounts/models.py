@@ -1,8 +1,14 @@
+import copy
+
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from .response_cache import invalidate
 
 class UserProfile(models.Model):
     ACTIVITY_CHOICES = [
@@ -55,6 +61,11 @@ class UserProfile(models.Model):
     daily_fat_goal = models.FloatField(null=True, blank=True)
     
     # Preferences
+    timezone = models.CharField(
+        max_length=64,
+        default='UTC',
+        help_text="IANA time zone; decides which day a meal is logged on"
+    )
     dietary_restrictions = models.JSONField(default=list, blank=True)
     allergies = models.JSONField(default=list, blank=True)
     
@@ -67,6 +78,54 @@ class UserProfile(models.Model):
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._snapshot(field_names)
+        return instance
+
+    def _snapshot(self, attnames):
+        # Copies: JSON lists edited in place must still compare as changed
+        loaded = getattr(self, '_loaded_values', {})
+        loaded.update({name: copy.deepcopy(self.__dict__[name]) for name in attnames if name in self.__dict__})
+        self._loaded_values = loaded
+
+    def changed_fields(self):
+        """Fields whose value differs from the database row, or None if that isn't known"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return [
+            field.name for field in self._meta.concrete_fields
+            if field.attname in loaded and field.attname in self.__dict__
+            and self.__dict__[field.attname] != loaded[field.attname]
+        ]
+
+    def save(self, *args, **kwargs):
+        """Writes only the changed columns of a loaded profile, and nothing when none changed"""
+        changed = None if self._state.adding or args or kwargs else self.changed_fields()
+        if changed is not None:
+            if not changed:
+                return
+            kwargs['update_fields'] = changed + ['updated_at']
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get('update_fields')
+        self._snapshot(
+            [self._meta.get_field(name).attname for name in update_fields] if update_fields is not None
+            else [field.attname for field in self._meta.concrete_fields]
+        )
+    
+    @property
+    def tzinfo(self):
+        try:
+            return ZoneInfo(self.timezone or 'UTC')
+        except (ZoneInfoNotFoundError, ValueError):
+            return ZoneInfo('UTC')
+
+    def local_date(self, value=None):
+        """Calendar date of a timestamp (default: now) in the user's time zone"""
+        return timezone.localdate(value, timezone=self.tzinfo)
     
     def calculate_bmr(self):
         """Calculate Basal Metabolic Rate using Mifflin-St Jeor Equation"""
@@ -132,15 +191,16 @@ class UserProfile(models.Model):
             'fat': round((daily_calories * fat_ratio) / 9),  # 9 cal per gram
         }
     
-    def update_goals(self):
-        """Auto-calculate and update nutrition goals"""
+    def update_goals(self, save=True):
+        """Auto-calculate and update nutrition goals; save=False leaves the write to the caller"""
         goals = self.calculate_macro_goals()
         if goals:
             self.daily_calorie_goal = goals['calories']
             self.daily_protein_goal = goals['protein']
             self.daily_carbs_goal = goals['carbs']
             self.daily_fat_goal = goals['fat']
-            self.save()
+            if save:
+                self.save()
 
 # Signal to auto-create profile when user is created
 @receiver(post_save, sender=User)
@@ -149,7 +209,14 @@ def create_user_profile(sender, instance, created, **kwargs):
         UserProfile.objects.create(user=instance)
         print(f"Profile created for user: {instance.username}")
 
+@receiver(post_save, sender=UserProfile)
+def invalidate_cached_profile(sender, instance, raw=False, **kwargs):
+    if not raw:
+        invalidate(instance.user_id, 'profile')
+
 @receiver(post_save, sender=User)
 def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
\ No newline at end of file
+    # Only a profile already loaded through the user can hold unsaved edits; save() skips it if none
+    profile = instance._state.fields_cache.get('profile')
+    if profile is not None:
+        profile.save()
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Per-user cache of rendered JSON payloads (dashboard summary, progress, profile, recent meals).
+
+Every payload depends on one or more sections of a user's data ('meals', 'progress',
+'profile'). Each section has a version token in the cache, and a payload is stored under
+the versions it was built from; writes bump the token (see invalidate), so the next read
+misses and nothing has to find and delete the old entries.
+
+Entries are fresh for RESPONSE_CACHE_TTL and kept RESPONSE_CACHE_STALE_TTL longer. Once an
+entry goes stale, one request takes a short lock and rebuilds it while the others are
+served the stale copy. When there is no copy at all, the others give that rebuild one
+short wait and then build their own, uncached, rather than tie up a worker polling.
+"""
+import hashlib
+import json
+import time
+from typing import Any, Callable, Hashable, Iterable
+
+from decouple import config
+from django.core.cache import caches
+from django.db import transaction
+
+RESPONSE_CACHE_ALIAS = config('RESPONSE_CACHE_ALIAS', default='default')
+# 0 turns the cache off
+RESPONSE_CACHE_TTL = config('RESPONSE_CACHE_TTL', default=60, cast=int)
+RESPONSE_CACHE_STALE_TTL = config('RESPONSE_CACHE_STALE_TTL', default=30, cast=int)
+# Longest a rebuild may hold the lock (a crashed rebuild frees it after this)
+REBUILD_LOCK_TTL = 10
+# How long a request without a copy waits for another request's rebuild before building its own
+REBUILD_WAIT = 0.05
+
+SECTIONS = ('meals', 'progress', 'profile')
+
+
+def _cache():
+    return caches[RESPONSE_CACHE_ALIAS]
+
+
+def _version_key(user_id: int, section: str) -> str:
+    return f'response-version:{user_id}:{section}'
+
+
+def _new_version() -> int:
+    # Not 1: a token that was evicted must not come back as a value old entries were stored under
+    return time.time_ns()
+
+
+def _versions(user_id: int, sections: Iterable[str]) -> str:
+    keys = {section: _version_key(user_id, section) for section in sections}
+    found = _cache().get_many(keys.values())
+    versions = []
+    for section, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = _new_version()
+            if not _cache().add(key, version, timeout=None):
+                version = _cache().get(key, version)
+        versions.append(f'{section}{version}')
+    return '-'.join(versions)
+
+
+def _bump(user_id: int, sections: Iterable[str]):
+    for section in sections:
+        key = _version_key(user_id, section)
+        try:
+            _cache().incr(key)
+        except ValueError:
+            # No token yet, so nothing cached under one either
+            _cache().add(key, _new_version(), timeout=None)
+
+
+def invalidate(user_id: int, *sections: str):
+    """
+    Drop a user's cached payloads that depend on these sections. Runs once the current
+    transaction commits, so a concurrent rebuild can't cache the data from before the write.
+    """
+    for section in sections:
+        if section not in SECTIONS:
+            raise ValueError(f"Unknown section {section!r}; expected one of {', '.join(SECTIONS)}")
+    transaction.on_commit(lambda: _bump(user_id, sections))
+
+
+def cached_payload(user, name: str, sections: Iterable[str], build: Callable[[], Any],
+                   *key_parts: Hashable) -> Any:
+    """
+    build(), cached for `user` under `name` and `key_parts` until one of `sections` changes
+    or the entry expires. The payload must be picklable (plain dicts/lists for JsonResponse).
+    """
+    if RESPONSE_CACHE_TTL <= 0:
+        return build()
+    digest = hashlib.sha1(json.dumps(key_parts, default=str).encode()).hexdigest()
+    # date_joined: ids can be reused after a delete, a token for the old account must not match
+    key = (f'response:{user.id}:{user.date_joined.timestamp()}:{name}:{digest}:'
+           f'{_versions(user.id, sections)}')
+    cache = _cache()
+
+    entry = cache.get(key)  # (fresh until, payload)
+    if entry is not None and entry[0] > time.time():
+        return entry[1]
+
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, timeout=REBUILD_LOCK_TTL):
+        if entry is None:
+            # Another request is building it: one short wait in case it's nearly done
+            time.sleep(REBUILD_WAIT)
+            entry = cache.get(key)
+        if entry is not None:
+            return entry[1]
+        return build()
+
+    try:
+        payload = build()
+        cache.set(key, (time.time() + RESPONSE_CACHE_TTL, payload),
+                  timeout=RESPONSE_CACHE_TTL + RESPONSE_CACHE_STALE_TTL)
+    finally:
+        cache.delete(lock)
+    return payload
@@ -1,3 +1,5 @@
+from zoneinfo import available_timezones
+
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
@@ -8,13 +10,18 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = UserProfile
         fields = [
             'age', 'weight', 'height', 'gender', 
-            'activity_level', 'primary_goal',
+            'activity_level', 'primary_goal', 'timezone',
             'dietary_restrictions', 'allergies',
             'daily_calorie_goal', 'daily_protein_goal',
             'daily_carbs_goal', 'daily_fat_goal',
             'is_profile_complete'
         ]
 
+    def validate_timezone(self, value):
+        if value not in available_timezones():
+            raise serializers.ValidationError("Unknown timezone")
+        return value
+
 class UserWithProfileSerializer(serializers.ModelSerializer):
     profile = UserProfileSerializer(read_only=True)
     
@@ -1,3 +1,260 @@
-from django.test import TestCase
+import json
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils.crypto import get_random_string
+from django.utils.decorators import method_decorator
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+
+from meals.models import Meal
+
+from . import authentication, response_cache
+from .models import UserProfile
+from .response_cache import cached_payload, invalidate
+
+
+class ProfileWriteTests(TestCase):
+    """UserProfile is written only when a column changes, and then once"""
+
+    PROFILE = {'age': 30, 'weight': 70, 'height': 175, 'gender': 'male'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('writer', password='pw12345xyz')
+
+    def _profile_writes(self, func):
+        with CaptureQueriesContext(connection) as queries:
+            response = func()
+        writes = [
+            query['sql'] for query in queries.captured_queries
+            if query['sql'].startswith(('UPDATE', 'INSERT')) and 'accounts_userprofile' in query['sql']
+        ]
+        return response, writes
+
+    def _patch_profile(self, data):
+        return self.client.patch('/api/auth/profile/', json.dumps(data),
+                                 content_type='application/json', secure=True)
+
+    def test_login_does_not_write_profile(self):
+        response, writes = self._profile_writes(lambda: self.client.post(
+            '/api/auth/login/', {'username': 'writer', 'password': 'pw12345xyz'},
+            content_type='application/json', secure=True,
+        ))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(writes, [])
+
+    def test_registration_writes_profile_once(self):
+        _, writes = self._profile_writes(lambda: User.objects.create_user('newcomer', password='pw12345xyz'))
+        self.assertEqual(len(writes), 1)
+        self.assertTrue(writes[0].startswith('INSERT'))
+
+    def test_profile_update_is_one_write_with_goals(self):
+        self.client.force_login(self.user)
+        response, writes = self._profile_writes(lambda: self._patch_profile(self.PROFILE))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(writes), 1)
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.weight, 70)
+        self.assertTrue(profile.is_profile_complete)
+        self.assertEqual(profile.daily_calorie_goal, response.json()['profile']['daily_calorie_goal'])
+        self.assertIsNotNone(profile.daily_calorie_goal)
+
+    def test_unchanged_profile_update_does_not_write(self):
+        self.client.force_login(self.user)
+        self._patch_profile(self.PROFILE)
+        _, writes = self._profile_writes(lambda: self._patch_profile(self.PROFILE))
+        self.assertEqual(writes, [])
+
+    def test_save_writes_only_changed_columns(self):
+        profile = UserProfile.objects.get(user=self.user)
+        profile.allergies.append('peanuts')
+        _, writes = self._profile_writes(profile.save)
+        self.assertEqual(len(writes), 1)
+        self.assertIn('"allergies"', writes[0])
+        self.assertNotIn('"weight"', writes[0])
+
+        _, writes = self._profile_writes(profile.save)
+        self.assertEqual(writes, [])
+        self.assertEqual(UserProfile.objects.get(user=self.user).allergies, ['peanuts'])
+
+
+class ResponseCacheTests(TestCase):
+    """Cached payloads are rebuilt after writes commit, and only once under concurrent misses"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cached', password='pw12345xyz')
+
+    def setUp(self):
+        caches[response_cache.RESPONSE_CACHE_ALIAS].clear()
+        self.builds = 0
+
+    def _payload(self, sections=('meals',), value='payload'):
+        def build():
+            self.builds += 1
+            return value
+        return cached_payload(self.user, 'test', sections, build)
+
+    def test_payload_is_built_once(self):
+        self._payload()
+        self.assertEqual(self._payload(), 'payload')
+        self.assertEqual(self.builds, 1)
+
+    def test_meal_write_invalidates_after_commit(self):
+        self._payload()
+        with self.captureOnCommitCallbacks() as callbacks:
+            meal = Meal.objects.create(user=self.user, meal_type='lunch', description='rice')
+            # Not before the write commits: a concurrent rebuild would cache the old data
+            self._payload()
+            self.assertEqual(self.builds, 1)
+        for callback in callbacks:
+            callback()
+        self._payload()
+        self.assertEqual(self.builds, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            meal.delete()
+        self._payload()
+        self.assertEqual(self.builds, 3)
+
+    def test_profile_write_invalidates_profile_payloads_only(self):
+        self._payload(sections=('profile',))
+        self._payload(sections=('meals',))
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = UserProfile.objects.get(user=self.user)
+            profile.weight = 80
+            profile.save()
+        self._payload(sections=('profile',))
+        self._payload(sections=('meals',))
+        self.assertEqual(self.builds, 3)
+
+    def test_unknown_section_is_rejected(self):
+        with self.assertRaises(ValueError):
+            invalidate(self.user.id, 'meal')
+
+    @mock.patch('accounts.response_cache.time.sleep')
+    def test_request_without_a_copy_waits_once_then_builds_uncached(self, sleep):
+        seen = []
+
+        def concurrent_request():
+            # Runs while the outer request holds the rebuild lock
+            seen.append(self._payload(value='uncached'))
+            return 'cached'
+
+        self.assertEqual(cached_payload(self.user, 'test', ('meals',), concurrent_request), 'cached')
+        self.assertEqual(seen, ['uncached'])
+        sleep.assert_called_once_with(response_cache.REBUILD_WAIT)
+        # The lock holder's copy is the one kept
+        self.assertEqual(self._payload(), 'cached')
+        self.assertEqual(self.builds, 1)
+
+    def test_stale_copy_is_served_during_a_rebuild(self):
+        self._payload(value='old')
+        seen = []
+
+        def concurrent_request():
+            seen.append(self._payload(value='unused'))
+            return 'new'
+
+        later = time.time() + response_cache.RESPONSE_CACHE_TTL + 1
+        with mock.patch('accounts.response_cache.time.time', return_value=later):
+            self.assertEqual(cached_payload(self.user, 'test', ('meals',), concurrent_request), 'new')
+        self.assertEqual(seen, ['old'])
+        self.assertEqual(self.builds, 1)
+
+    def test_failed_rebuild_releases_the_lock(self):
+        def broken():
+            raise RuntimeError('boom')
+
+        with self.assertRaises(RuntimeError):
+            cached_payload(self.user, 'test', ('meals',), broken)
+        self.assertEqual(self._payload(), 'payload')
+        self.assertEqual(self.builds, 1)
+
+
+class WriteView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response({'user': request.user.username})
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ExemptWriteView(WriteView):
+    pass
+
+
+class SessionAuthenticationTests(TestCase):
+    """The cached session -> user lookup behind the JSON views and DRF"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('session', password='pw12345xyz')
+
+    def setUp(self):
+        caches[authentication.SESSION_USER_CACHE_ALIAS].clear()
+        self.client.force_login(self.user)
+
+    def _current_user(self, client=None):
+        return (client or self.client).get('/api/auth/user/', secure=True)
+
+    def _session_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self._current_user()
+        return response, [query['sql'] for query in queries.captured_queries if 'django_session' in query['sql']]
+
+    def test_session_is_read_once_then_cached(self):
+        response, reads = self._session_queries()
+        self.assertEqual(response.json()['user']['username'], 'session')
+        self.assertEqual(len(reads), 1)
+        response, reads = self._session_queries()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(reads, [])
+
+    def test_logout_forgets_the_cached_session(self):
+        self._current_user()
+        cookie = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        self.assertEqual(self.client.post('/api/auth/logout/', secure=True).status_code, 200)
+
+        replay = Client()
+        replay.cookies[settings.SESSION_COOKIE_NAME] = cookie
+        self.assertEqual(self._current_user(replay).status_code, 401)
+
+    def test_password_change_ends_cached_sessions(self):
+        self._current_user()
+        self.user.set_password('another-pw12345')
+        self.user.save()
+        self.assertEqual(self._current_user().status_code, 401)
+
+    def test_unknown_cookie_is_anonymous(self):
+        anonymous = Client()
+        anonymous.cookies[settings.SESSION_COOKIE_NAME] = 'not-a-session'
+        self.assertEqual(self._current_user(anonymous).status_code, 401)
+
+    def _post(self, view, csrf_token=None):
+        factory = APIRequestFactory(enforce_csrf_checks=True)
+        request = factory.post('/write/', secure=True, **({'HTTP_X_CSRFTOKEN': csrf_token} if csrf_token else {}))
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+        if csrf_token:
+            request.COOKIES[settings.CSRF_COOKIE_NAME] = csrf_token
+        request.META['HTTP_REFERER'] = f'https://{request.get_host()}/'
+        return view.as_view()(request)
+
+    def test_drf_writes_need_a_csrf_token(self):
+        self.assertEqual(self._post(WriteView).status_code, 403)
+        token = get_random_string(32)
+        self.assertEqual(self._post(WriteView, csrf_token=token).status_code, 200)
+
+    def test_csrf_exempt_views_are_honoured(self):
+        self.assertEqual(self._post(ExemptWriteView).status_code, 200)
@@ -4,6 +4,7 @@ from django.utils.decorators import method_decorator
 from django.contrib.auth import get_user
 from django.contrib.auth.decorators import login_required
 import logging
+from zoneinfo import available_timezones
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -20,6 +21,8 @@ from .serializers import (
     UserProfileSerializer
 )
 from .models import UserProfile
+from .authentication import get_session_user
+from .response_cache import cached_payload
 
 # Add logger
 logger = logging.getLogger(__name__)
@@ -119,21 +122,8 @@ class CurrentUserView(APIView):
         if request.method == 'GET':
             print("current_user_json function called")  # Debug print
             
-            user = None
-            sessionid = request.COOKIES.get('sessionid')
-            print(f"current_user_json - sessionid: {sessionid}")
-            
-            if sessionid:
-                from django.contrib.sessions.models import Session
-                from django.contrib.auth.models import User
-                try:
-                    session = Session.objects.get(session_key=sessionid)
-                    user_id = session.get_decoded().get('_auth_user_id')
-                    if user_id:
-                        user = User.objects.get(id=user_id)
-                        print(f"Found user: {user.username}")
-                except (Session.DoesNotExist, User.DoesNotExist) as e:
-                    print(f"Session lookup failed: {e}")
+            user = get_session_user(request)
+            logger.debug("current_user_json - user: %s", user)
             
             if user:
                 return JsonResponse({'user': {'id': user.id, 'username': user.username}})  # Simple response for now
@@ -198,19 +188,7 @@ def csrf_seed(request):
 def update_profile_json(request):
     if request.method in ['PATCH', 'POST']:
         # Authentication
-        user = None
-        sessionid = request.COOKIES.get('sessionid')
-        
-        if sessionid:
-            from django.contrib.sessions.models import Session
-            from django.contrib.auth.models import User
-            try:
-                session = Session.objects.get(session_key=sessionid)
-                user_id = session.get_decoded().get('_auth_user_id')
-                if user_id:
-                    user = User.objects.get(id=user_id)
-            except (Session.DoesNotExist, User.DoesNotExist):
-                pass
+        user = get_session_user(request, select_profile=True)
         
         if not user:
             return JsonResponse({'error': 'Authentication required'}, status=401)
@@ -240,12 +218,17 @@ def update_profile_json(request):
             profile.dietary_restrictions = data['dietary_restrictions']
         if 'allergies' in data:
             profile.allergies = data['allergies']
+        if 'timezone' in data:
+            if data['timezone'] not in available_timezones():
+                return JsonResponse({'error': 'Unknown timezone'}, status=400)
+            profile.timezone = data['timezone']
         
         # Check if profile is complete
         if all([profile.age, profile.weight, profile.height, profile.gender]):
             profile.is_profile_complete = True
-            profile.update_goals()  # Auto-calculate nutrition goals
+            profile.update_goals(save=False)  # Auto-calculate nutrition goals
         
+        # One UPDATE of the changed columns, goals included; none if nothing changed
         profile.save()
         
         return JsonResponse({
@@ -257,6 +240,7 @@ def update_profile_json(request):
                 'gender': profile.gender,
                 'activity_level': profile.activity_level,
                 'primary_goal': profile.primary_goal,
+                'timezone': profile.timezone,
                 'daily_calorie_goal': profile.daily_calorie_goal,
                 'daily_protein_goal': profile.daily_protein_goal,
                 'daily_carbs_goal': profile.daily_carbs_goal,
@@ -267,31 +251,20 @@ def update_profile_json(request):
     
     elif request.method == 'GET':
         # Get profile
-        user = None
-        sessionid = request.COOKIES.get('sessionid')
-        
-        if sessionid:
-            from django.contrib.sessions.models import Session
-            from django.contrib.auth.models import User
-            try:
-                session = Session.objects.get(session_key=sessionid)
-                user_id = session.get_decoded().get('_auth_user_id')
-                if user_id:
-                    user = User.objects.get(id=user_id)
-            except (Session.DoesNotExist, User.DoesNotExist):
-                pass
+        user = get_session_user(request, select_profile=True)
         
         if not user:
             return JsonResponse({'error': 'Authentication required'}, status=401)
         
         profile = user.profile
-        return JsonResponse({
+        return JsonResponse(cached_payload(user, 'profile', ('profile',), lambda: {
             'age': profile.age,
             'weight': profile.weight,
             'height': profile.height,
             'gender': profile.gender,
             'activity_level': profile.activity_level,
             'primary_goal': profile.primary_goal,
+            'timezone': profile.timezone,
             'dietary_restrictions': profile.dietary_restrictions,
             'allergies': profile.allergies,
             'daily_calorie_goal': profile.daily_calorie_goal,
@@ -301,7 +274,7 @@ def update_profile_json(request):
             'is_profile_complete': profile.is_profile_complete,
             'bmr': profile.calculate_bmr(),
             'recommended_calories': profile.calculate_daily_calories(),
-        })
+        }))
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
@@ -316,20 +289,9 @@ def simple_user_test(request):
         print(f"Session key from request: {request.session.session_key}")
         print(f"User authenticated: {request.user.is_authenticated}")
         
-        # Try to get user from session manually
-        sessionid = request.COOKIES.get('sessionid')
-        manual_user = None
-        if sessionid:
-            from django.contrib.sessions.models import Session
-            from django.contrib.auth.models import User
-            try:
-                session = Session.objects.get(session_key=sessionid)
-                user_id = session.get_decoded().get('_auth_user_id')
-                if user_id:
-                    manual_user = User.objects.get(id=user_id)
-                    print(f"Manual session lookup found user: {manual_user.username}")
-            except (Session.DoesNotExist, User.DoesNotExist) as e:
-                print(f"Manual session lookup failed: {e}")
+        # Same lookup the JSON views use
+        manual_user = get_session_user(request)
+        print(f"Session cookie lookup found user: {manual_user}")
         
         return JsonResponse({
             'user_authenticated': request.user.is_authenticated,
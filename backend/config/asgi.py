@@ -12,5 +12,32 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Async analyze view: in-flight USDA/OpenAI calls don't hold a worker thread
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Build the fuzzy food-name index now instead of on the first analysis
+from nutrition.food_index import FoodIndexService  # noqa: E402
+from nutrition.http_client import close_async_http_client  # noqa: E402
+
+FoodIndexService.warm()
+
+
+async def lifespan(receive, send):
+    """ASGI lifespan events, which Django's handler doesn't take: close upstream connections on shutdown"""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await close_async_http_client()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    else:
+        await django_application(scope, receive, send)
@@ -37,7 +37,7 @@ INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  # Add this for static files
+    'config.middleware.AsyncWhiteNoiseMiddleware',  # Static files; WhiteNoise's own is sync-only
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -72,6 +72,7 @@ DATABASE_URL = config('DATABASE_URL', default=None)
 import os
 from decouple import config
 import re
+from urllib.parse import urlparse
 
 # Database
 DATABASE_URL = config('DATABASE_URL', default=None)
@@ -108,6 +109,37 @@ else:
         }
     }
 
+# Cache - shared by the session-user lookup, food/AI result caches and per-user responses.
+# CACHE_URL: locmem:// (default, per process), file:///var/tmp/django_cache (shared by the
+# processes on one host, e.g. for tests) or redis://host:6379/0 (production; needs redis-py)
+CACHE_URL = config('CACHE_URL', default='locmem://')
+_cache_url = urlparse(CACHE_URL)
+
+if _cache_url.scheme in ('redis', 'rediss'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+elif _cache_url.scheme == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': _cache_url.path,
+        }
+    }
+elif _cache_url.scheme == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': _cache_url.netloc or 'default',
+            'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+        }
+    }
+else:
+    raise ValueError(f"Unsupported CACHE_URL scheme {_cache_url.scheme!r}; use locmem://, file:// or redis://")
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -126,7 +158,9 @@ AUTH_PASSWORD_VALIDATORS = [
 
 # REST Framework
 REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': [],
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'accounts.authentication.SessionCookieAuthentication',
+    ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
     ],
@@ -237,6 +271,15 @@ USE_OPENAI = config('USE_OPENAI', default=False, cast=bool)
 # USDA API
 USDA_API_KEY = config('USDA_API_KEY', default='DEMO_KEY')
 
+# Serve /api/meals/analyze/ with the async view (set by config/asgi.py)
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Background meal analysis: POST /api/meals/analyze/ answers 202 and a worker
+# (manage.py run_analysis_worker) fills in the meal. Clients can also opt in per
+# request with `Prefer: respond-async`.
+ANALYZE_IN_BACKGROUND = config('ANALYZE_IN_BACKGROUND', default=False, cast=bool)
+ANALYSIS_QUEUE_BACKEND = config('ANALYSIS_QUEUE_BACKEND', default='meals.queue.DatabaseQueue')
+
 
 # Security settings (production only)
 if not DEBUG:
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Build the fuzzy food-name index now instead of on the first analysis
+from nutrition.food_index import FoodIndexService  # noqa: E402
+
+FoodIndexService.warm()
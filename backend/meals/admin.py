@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Meal, Food, MealFood, Recommendation
+from .models import Meal, Food, MealFood, Recommendation, AnalysisJob, MealImport
 
 @admin.register(Food)
 class FoodAdmin(admin.ModelAdmin):
@@ -9,8 +9,8 @@ class FoodAdmin(admin.ModelAdmin):
 
 @admin.register(Meal)
 class MealAdmin(admin.ModelAdmin):
-    list_display = ['user', 'meal_type', 'description', 'total_calories', 'logged_at']
-    list_filter = ['meal_type', 'logged_at']
+    list_display = ['user', 'meal_type', 'description', 'total_calories', 'analysis_status', 'logged_at']
+    list_filter = ['meal_type', 'analysis_status', 'logged_at']
     search_fields = ['user__username', 'description']
     readonly_fields = ['logged_at', 'ai_confidence']
     
@@ -30,4 +30,17 @@ class MealAdmin(admin.ModelAdmin):
 class RecommendationAdmin(admin.ModelAdmin):
     list_display = ['user', 'title', 'recommendation_type', 'confidence_score', 'is_read', 'created_at']
     list_filter = ['recommendation_type', 'is_read', 'created_at']
-    search_fields = ['user__username', 'title', 'content']
\ No newline at end of file
+    search_fields = ['user__username', 'title', 'content']
+
+@admin.register(AnalysisJob)
+class AnalysisJobAdmin(admin.ModelAdmin):
+    list_display = ['meal', 'status', 'attempts', 'available_at', 'locked_until', 'updated_at']
+    list_filter = ['status']
+    readonly_fields = ['meal', 'attempts', 'locked_by', 'last_error', 'created_at', 'updated_at']
+
+@admin.register(MealImport)
+class MealImportAdmin(admin.ModelAdmin):
+    list_display = ['user', 'file_name', 'status', 'rows_done', 'meals_created', 'rows_failed', 'updated_at']
+    list_filter = ['status']
+    search_fields = ['user__username', 'file_name']
+    readonly_fields = ['checksum', 'rows_done', 'meals_created', 'rows_failed', 'errors', 'dates', 'created_at', 'updated_at']
@@ -0,0 +1,136 @@
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+from .models import DailyProgress
+
+# DailyProgress column -> key used in the API payloads
+SERIES_FIELDS = {
+    'total_calories': 'calories',
+    'total_protein': 'protein',
+    'total_carbs': 'carbs',
+    'total_fat': 'fat',
+    'total_fiber': 'fiber',
+}
+
+# A day counts towards an adherence streak at or above this score
+STREAK_THRESHOLD = 80
+
+ROLLING_WINDOW = 7
+
+# Longest range the progress endpoint serves in one request
+MAX_RANGE_DAYS = 366
+
+# kcal per gram
+MACRO_CALORIES = {'protein': 4, 'carbs': 4, 'fat': 9}
+
+
+def _mean(values: List[float]) -> float:
+    return sum(values) / len(values) if values else 0
+
+
+def rolling_means(days: List[date], values: List[float], window: int = ROLLING_WINDOW) -> List[float]:
+    """
+    Mean over the tracked days in the trailing `window` calendar days, for each day.
+    One pass with a running sum; untracked days are skipped, not counted as zero.
+    """
+    means = []
+    total = 0.0
+    start = 0
+    for i, (day, value) in enumerate(zip(days, values)):
+        total += value
+        while days[start] <= day - timedelta(days=window):
+            total -= values[start]
+            start += 1
+        means.append(round(total / (i - start + 1), 1))
+    return means
+
+
+def adherence_streaks(days: List[date], scores: List[float], end: date,
+                      threshold: float = STREAK_THRESHOLD) -> Dict:
+    """Longest run of consecutive calendar days at or above `threshold`, and the run ending at `end`"""
+    longest = current = 0
+    previous = None
+    for day, score in zip(days, scores):
+        if score < threshold:
+            current = 0
+        elif previous is not None and day - previous == timedelta(days=1) and current:
+            current += 1
+        else:
+            current = 1
+        longest = max(longest, current)
+        previous = day
+
+    # The current streak only counts if it reaches today (or yesterday, before today's meals)
+    if not days or end - days[-1] > timedelta(days=1):
+        current = 0
+    return {'current': current, 'longest': longest, 'threshold': threshold}
+
+
+def macro_ratios(totals: Dict[str, float]) -> Dict[str, float]:
+    """Share of macro calories from protein/carbs/fat, in percent"""
+    calories = {macro: totals[macro] * kcal for macro, kcal in MACRO_CALORIES.items()}
+    total = sum(calories.values())
+    if not total:
+        return {macro: 0 for macro in MACRO_CALORIES}
+    return {macro: round(value * 100 / total, 1) for macro, value in calories.items()}
+
+
+def progress_report(user, start: date, end: date) -> Dict:
+    """
+    Per-day series and summary statistics for DailyProgress rows between start and end
+    (inclusive), from a single query. Averages are over days tracked, not calendar days.
+    """
+    rows = list(
+        DailyProgress.objects.filter(user=user, date__gte=start, date__lte=end)
+        .order_by('date')
+        .values('date', 'goal_calories', 'adherence_score', 'meals_count', *SERIES_FIELDS)
+    )
+
+    days = [row['date'] for row in rows]
+    series = {key: [row[field] for row in rows] for field, key in SERIES_FIELDS.items()}
+    adherence = [row['adherence_score'] for row in rows]
+    rolling_calories = rolling_means(days, series['calories'])
+
+    progress = [
+        {
+            'date': row['date'].isoformat(),
+            **{key: row[field] for field, key in SERIES_FIELDS.items()},
+            'goal_calories': row['goal_calories'],
+            'adherence_score': row['adherence_score'],
+            'meals_count': row['meals_count'],
+            'calories_7d_avg': rolling,
+        }
+        for row, rolling in zip(rows, rolling_calories)
+    ]
+
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'progress': progress,
+        'summary': summarize(start, end, days, series, adherence) if rows else None,
+    }
+
+
+def summarize(start: date, end: date, days: List[date], series: Dict[str, List[float]],
+              adherence: List[float]) -> Dict:
+    summary = {
+        'period_days': (end - start).days + 1,
+        'days_tracked': len(days),
+        'avg_adherence': round(_mean(adherence), 1),
+        'streaks': adherence_streaks(days, adherence, end),
+        'macro_ratios': macro_ratios({macro: sum(series[macro]) for macro in MACRO_CALORIES}),
+    }
+    for key, values in series.items():
+        summary[f'avg_{key}'] = round(_mean(values), 1)
+        summary[f'min_{key}'] = round(min(values), 1)
+        summary[f'max_{key}'] = round(max(values), 1)
+    return summary
+
+
+def progress_for_last_days(user, days: int, today: Optional[date] = None) -> Dict:
+    """progress_report for the `days` days before today, plus today"""
+    today = today or user.profile.local_date()
+    report = progress_report(user, today - timedelta(days=days), today)
+    if report['summary']:
+        report['summary']['period_days'] = days
+    return report
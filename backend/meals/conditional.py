@@ -0,0 +1,79 @@
+"""
+ETags for the polled JSON views, used with django.views.decorators.http.condition.
+
+Each validator is a row count and max(updated_at) over the rows a response is built
+from: one indexed aggregate, so a matching If-None-Match is answered with 304 before
+the view runs its own queries or serializes anything. Creates and edits move
+max(updated_at), deletes move the count. Writes that skip updated_at (a bare
+QuerySet.update()) are not seen, the same caveat as the DailyProgress signals.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from django.db.models import Count, Max
+
+from accounts.authentication import get_session_user
+
+from .models import DailyProgress, Meal
+
+
+def _validator(queryset) -> str:
+    row = queryset.order_by().aggregate(rows=Count('id'), last=Max('updated_at'))
+    return f"{row['rows']}-{row['last'].timestamp() if row['last'] else 0}"
+
+
+def _etag(*parts) -> str:
+    return ':'.join(str(part) for part in parts)
+
+
+def _session_user(request, select_profile: bool = False):
+    # Other methods and anonymous requests get no ETag and go straight to the view (405/401)
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    return get_session_user(request, select_profile=select_profile)
+
+
+def _requested_date(request, user) -> Optional[date]:
+    if not request.GET.get('date'):
+        return user.profile.local_date()
+    try:
+        return datetime.strptime(request.GET['date'], '%Y-%m-%d').date()
+    except ValueError:
+        return None  # the view answers 400
+
+
+def daily_summary_etag(request) -> Optional[str]:
+    user = _session_user(request, select_profile=True)
+    if user is None:
+        return None
+    day = _requested_date(request, user)
+    if day is None:
+        return None
+    # The view falls back to the day's meals when its DailyProgress row is stale
+    return _etag(
+        'summary', user.id, day,
+        _validator(DailyProgress.objects.filter(user=user, date=day)),
+        _validator(Meal.objects.filter(user=user, logged_date=day)),
+    )
+
+
+def progress_etag(days: int):
+    """ETag function for progress_for_last_days(user, days)"""
+
+    def etag(request) -> Optional[str]:
+        user = _session_user(request, select_profile=True)
+        if user is None:
+            return None
+        today = user.profile.local_date()
+        rows = DailyProgress.objects.filter(user=user, date__gte=today - timedelta(days=days), date__lte=today)
+        return _etag('progress', days, user.id, today, _validator(rows))
+
+    return etag
+
+
+def meals_list_etag(request) -> Optional[str]:
+    user = _session_user(request)
+    if user is None:
+        return None
+    # Any page can change when any meal does; the URL (cursor, fields) keys the rest
+    return _etag('meals', user.id, _validator(Meal.objects.filter(user=user)))
@@ -0,0 +1,156 @@
+import csv
+import json
+import zlib
+from datetime import date
+from typing import Dict, Iterable, Iterator, List
+
+from decouple import config
+
+from .models import DailyProgress, Meal, MealFood
+
+# Export column -> ORM lookup, per dataset
+DATASETS = {
+    'meals': {
+        'id': 'id', 'user_id': 'user_id', 'meal_type': 'meal_type', 'description': 'description',
+        'logged_at': 'logged_at', 'logged_date': 'logged_date',
+        'calories': 'total_calories', 'protein': 'total_protein', 'carbs': 'total_carbs',
+        'fat': 'total_fat', 'fiber': 'total_fiber',
+        'ai_confidence': 'ai_confidence', 'analysis_status': 'analysis_status',
+    },
+    'foods': {
+        'id': 'id', 'meal_id': 'meal_id', 'user_id': 'meal__user_id', 'logged_at': 'meal__logged_at',
+        'food_id': 'food_id', 'food': 'food__name', 'quantity_grams': 'quantity_grams',
+        'calories': 'calories', 'protein': 'protein', 'carbs': 'carbs', 'fat': 'fat',
+    },
+    'progress': {
+        'user_id': 'user_id', 'date': 'date',
+        'calories': 'total_calories', 'protein': 'total_protein', 'carbs': 'total_carbs',
+        'fat': 'total_fat', 'fiber': 'total_fiber',
+        'goal_calories': 'goal_calories', 'goal_protein': 'goal_protein',
+        'goal_carbs': 'goal_carbs', 'goal_fat': 'goal_fat',
+        'meals_count': 'meals_count', 'adherence_score': 'adherence_score',
+    },
+}
+FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows fetched per round trip (a server-side cursor on PostgreSQL)
+CHUNK_SIZE = config('EXPORT_CHUNK_SIZE', default=2000, cast=int)
+# Output is handed to the response/file in blocks of about this many bytes
+BLOCK_SIZE = 64 * 1024
+
+
+def export_queryset(dataset: str, user=None):
+    """Rows of `dataset` as value tuples in a stable order, for one user or everyone"""
+    if dataset == 'meals':
+        queryset = Meal.objects.order_by('user_id', 'logged_at', 'id')
+        if user is not None:
+            queryset = queryset.filter(user=user)
+    elif dataset == 'foods':
+        queryset = MealFood.objects.order_by('meal__user_id', 'meal__logged_at', 'meal_id', 'id')
+        if user is not None:
+            queryset = queryset.filter(meal__user=user)
+    elif dataset == 'progress':
+        queryset = DailyProgress.objects.order_by('user_id', 'date')
+        if user is not None:
+            queryset = queryset.filter(user=user)
+    else:
+        raise ValueError(f"Unknown dataset {dataset!r}; expected one of {', '.join(DATASETS)}")
+
+    columns = DATASETS[dataset]
+    return queryset.values_list(*columns.values())
+
+
+def _value(value):
+    if isinstance(value, date):  # dates and datetimes
+        return value.isoformat()
+    return value
+
+
+def _rows(dataset: str, user, chunk_size: int) -> Iterator[List]:
+    # iterator() streams chunk_size rows at a time instead of caching the whole result
+    for row in export_queryset(dataset, user).iterator(chunk_size=chunk_size):
+        yield [_value(value) for value in row]
+
+
+class _Line:
+    """File-like target for csv.writer that hands back the formatted line"""
+
+    def write(self, value):
+        return value
+
+
+def _csv_lines(columns: List[str], rows: Iterable[List]) -> Iterator[str]:
+    writer = csv.writer(_Line())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _ndjson_lines(columns: List[str], rows: Iterable[List]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), separators=(',', ':')) + '\n'
+
+
+def _blocks(lines: Iterable[str]) -> Iterator[bytes]:
+    """Join lines into ~BLOCK_SIZE byte chunks so each write isn't a single row"""
+    block = []
+    size = 0
+    for line in lines:
+        block.append(line)
+        size += len(line)
+        if size >= BLOCK_SIZE:
+            yield ''.join(block).encode()
+            block = []
+            size = 0
+    if block:
+        yield ''.join(block).encode()
+
+
+def _gzip(blocks: Iterable[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip container
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def iter_export(dataset: str, fmt: str = 'csv', user=None, compress: bool = False,
+                chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    `dataset` ('meals', 'foods' or 'progress') as CSV or NDJSON bytes, optionally gzipped.
+    A generator over a chunked cursor: memory stays flat however many rows there are.
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f"Unknown dataset {dataset!r}; expected one of {', '.join(DATASETS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+
+    columns = list(DATASETS[dataset])
+    rows = _rows(dataset, user, chunk_size)
+    lines = _csv_lines(columns, rows) if fmt == 'csv' else _ndjson_lines(columns, rows)
+    blocks = _blocks(lines)
+    return _gzip(blocks) if compress else blocks
+
+
+def export_filename(dataset: str, fmt: str, compress: bool = False) -> str:
+    return f"{dataset}.{fmt}{'.gz' if compress else ''}"
+
+
+def content_type(fmt: str, compress: bool = False) -> str:
+    return 'application/gzip' if compress else FORMATS[fmt]
+
+
+def export_options(params) -> Dict:
+    """dataset/format/gzip from the query string, validated"""
+    dataset = params.get('dataset') or 'meals'
+    fmt = params.get('format') or 'csv'
+    if dataset not in DATASETS:
+        raise ValueError(f"dataset must be one of {', '.join(DATASETS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    compress = str(params.get('gzip') or '').lower() in ('1', 'true', 'yes')
+    return {'dataset': dataset, 'fmt': fmt, 'compress': compress}
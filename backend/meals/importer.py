@@ -0,0 +1,282 @@
+import csv
+import gzip
+import hashlib
+import json
+import logging
+import os
+import uuid
+from datetime import date, datetime, time
+from itertools import islice
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from decouple import config
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from nutrition.fdc_import import iter_json_array
+
+from .models import AnalysisJob, Meal, MealImport
+from .services import ProgressTrackingService
+
+logger = logging.getLogger(__name__)
+
+# Column names other trackers use -> Meal field
+COLUMN_ALIASES = {
+    'logged_at': ('logged_at', 'timestamp', 'datetime', 'date', 'time', 'eaten_at'),
+    'meal_type': ('meal_type', 'meal', 'type', 'category'),
+    'description': ('description', 'food', 'foods', 'name', 'items', 'note'),
+    'total_calories': ('total_calories', 'calories', 'kcal', 'energy'),
+    'total_protein': ('total_protein', 'protein', 'protein_g', 'protein (g)'),
+    'total_carbs': ('total_carbs', 'carbs', 'carbohydrates', 'carbs_g', 'carbohydrates (g)'),
+    'total_fat': ('total_fat', 'fat', 'fat_g', 'fat (g)'),
+    'total_fiber': ('total_fiber', 'fiber', 'fibre', 'fiber_g', 'fiber (g)'),
+}
+NUTRIENT_FIELDS = ('total_calories', 'total_protein', 'total_carbs', 'total_fat', 'total_fiber')
+MEAL_TYPES = dict(Meal.MEAL_TYPES)
+
+# A date without a time of day is logged at noon where the user is
+DEFAULT_TIME = time(12, 0)
+
+FORMATS = ('.csv', '.json', '.ndjson', '.jsonl')
+
+
+def import_format(file_name: str) -> str:
+    """'.csv', '.json', '.ndjson' or '.jsonl' from a file name, ignoring a trailing .gz"""
+    name = file_name.lower()
+    if name.endswith('.gz'):
+        name = name[:-3]
+    ext = os.path.splitext(name)[1]
+    if ext not in FORMATS:
+        raise ValueError(f"Unsupported file type {ext or file_name!r}; expected CSV, JSON or NDJSON")
+    return ext
+
+
+def file_checksum(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _ndjson_rows(fp) -> Iterator[Optional[Dict]]:
+    for line in fp:
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError:
+            yield None  # rejected by validation, counted as a failed row
+
+
+def iter_import_rows(path: str, file_name: Optional[str] = None) -> Iterator[Optional[Dict]]:
+    """Stream the rows of a CSV, JSON array or NDJSON file (optionally gzipped), one at a time"""
+    fmt = import_format(file_name or path)
+    opener = gzip.open if path.lower().endswith('.gz') else open
+    with opener(path, 'rt', encoding='utf-8-sig', newline='') as fp:
+        if fmt == '.csv':
+            yield from csv.DictReader(fp)
+        elif fmt == '.json':
+            yield from iter_json_array(fp)
+        else:
+            yield from _ndjson_rows(fp)
+
+
+def _pick(row: Dict, field: str):
+    for name in COLUMN_ALIASES[field]:
+        value = row.get(name)
+        if value not in (None, ''):
+            return value
+    return None
+
+
+def _logged_at(value, tzinfo) -> datetime:
+    value = str(value).strip()
+    logged_at = parse_datetime(value)
+    if logged_at is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f'Unreadable date {value!r}; use ISO 8601')
+        logged_at = datetime.combine(day, DEFAULT_TIME)
+    if timezone.is_naive(logged_at):
+        # Other trackers export wall-clock times: read them in the user's time zone
+        logged_at = timezone.make_aware(logged_at, tzinfo)
+    return logged_at
+
+
+def build_meal(user, profile, row) -> Meal:
+    """Unsaved Meal for one imported row, or raises ValueError with the reason"""
+    if not isinstance(row, dict):
+        raise ValueError('Row is not an object')
+    # CSV headers vary in case and padding across trackers
+    row = {str(key).strip().lower(): value for key, value in row.items() if key is not None}
+
+    logged_at = _pick(row, 'logged_at')
+    if logged_at is None:
+        raise ValueError('logged_at required')
+    logged_at = _logged_at(logged_at, profile.tzinfo)
+
+    description = str(_pick(row, 'description') or '').strip()
+    if not description:
+        raise ValueError('description required')
+
+    meal_type = str(_pick(row, 'meal_type') or 'snack').strip().lower()
+    if meal_type not in MEAL_TYPES:
+        raise ValueError(f'Unknown meal_type: {meal_type}')
+
+    nutrients = {}
+    for field in NUTRIENT_FIELDS:
+        value = _pick(row, field)
+        if value is not None:
+            try:
+                nutrients[field] = float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{field} must be a number')
+            if nutrients[field] < 0:
+                raise ValueError(f'{field} must not be negative')
+
+    meal = Meal(
+        user=user,
+        meal_type=meal_type,
+        description=description,
+        logged_at=logged_at,
+        # bulk_create skips Meal.save(), which would fill this in
+        logged_date=profile.local_date(logged_at),
+        # Rows without nutrition are analyzed by the background workers afterwards
+        analysis_status='complete' if nutrients else 'pending',
+    )
+    if nutrients:
+        for field in NUTRIENT_FIELDS:
+            setattr(meal, field, nutrients.get(field, 0))
+    return meal
+
+
+class MealImporter:
+    """
+    Load a MealImport's file in batches: each batch of valid rows is one bulk_create,
+    committed together with the checkpoint, so an interrupted import resumes after the
+    last committed batch without duplicating meals. bulk_create sends no Meal signals,
+    so touched days are marked stale while the import runs and rebuilt once at the end.
+    """
+
+    BATCH_SIZE = config('MEAL_IMPORT_BATCH_SIZE', default=2000, cast=int)
+    MAX_ERRORS = 100  # kept on the MealImport for the user to fix their file
+    UPLOAD_DIR = config('MEAL_IMPORT_DIR', default=str(settings.MEDIA_ROOT / 'imports'))
+
+    def __init__(self, meal_import: MealImport, batch_size: Optional[int] = None):
+        self.meal_import = meal_import
+        self.batch_size = batch_size or self.BATCH_SIZE
+        self.user = meal_import.user
+        self.profile = self.user.profile
+        self.dates = {date.fromisoformat(day) for day in meal_import.dates}
+
+    @classmethod
+    def for_file(cls, user, path: str, file_name: Optional[str] = None) -> Tuple[MealImport, bool]:
+        """The MealImport of this file for this user, created if new; (import, created)"""
+        file_name = file_name or os.path.basename(path)
+        import_format(file_name)
+        meal_import, created = MealImport.objects.get_or_create(
+            user=user,
+            checksum=file_checksum(path),
+            defaults={'path': path, 'file_name': file_name},
+        )
+        if meal_import.path != path:
+            # Same file, moved since the interrupted run
+            meal_import.path = path
+            meal_import.save(update_fields=['path', 'updated_at'])
+        return meal_import, created
+
+    @classmethod
+    def save_upload(cls, user, upload) -> Tuple[MealImport, bool]:
+        """Store an uploaded file under UPLOAD_DIR and queue its import"""
+        import_format(upload.name)
+        os.makedirs(cls.UPLOAD_DIR, exist_ok=True)
+        digest = hashlib.sha256()
+        partial = os.path.join(cls.UPLOAD_DIR, f'{user.id}-{uuid.uuid4().hex}.part')
+        with open(partial, 'wb') as fp:
+            for chunk in upload.chunks():
+                digest.update(chunk)
+                fp.write(chunk)
+
+        checksum = digest.hexdigest()
+        suffix = '.gz' if upload.name.lower().endswith('.gz') else ''
+        path = os.path.join(cls.UPLOAD_DIR, f'{user.id}-{checksum}{import_format(upload.name)}{suffix}')
+        os.replace(partial, path)
+        return MealImport.objects.get_or_create(
+            user=user, checksum=checksum, defaults={'path': path, 'file_name': upload.name[:255]},
+        )
+
+    @staticmethod
+    def claim_queued() -> Optional[MealImport]:
+        """Take the oldest queued import; the conditional UPDATE keeps two runners off one file"""
+        for import_id in MealImport.objects.filter(status='queued').order_by('created_at').values_list('id', flat=True):
+            if MealImport.objects.filter(id=import_id, status='queued').update(status='running'):
+                return MealImport.objects.select_related('user__profile').get(id=import_id)
+        return None
+
+    def run(self, on_batch: Optional[Callable[[MealImport], None]] = None) -> MealImport:
+        meal_import = self.meal_import
+        if meal_import.status == 'done':
+            return meal_import
+        MealImport.objects.filter(id=meal_import.id).update(status='running', last_error='')
+        meal_import.status = 'running'
+
+        try:
+            rows = iter_import_rows(meal_import.path, meal_import.file_name)
+            # Rows of batches committed before an interruption
+            rows = islice(rows, meal_import.rows_done, None)
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                self.import_batch(batch)
+                if on_batch:
+                    on_batch(meal_import)
+
+            self.rebuild_progress()
+        except Exception as e:
+            logger.exception("Meal import %s failed at row %s", meal_import.id, meal_import.rows_done)
+            meal_import.status = 'failed'
+            meal_import.last_error = str(e)[:1000]
+            meal_import.save(update_fields=['status', 'last_error', 'updated_at'])
+            raise
+
+        meal_import.status = 'done'
+        meal_import.finished_at = timezone.now()
+        meal_import.save(update_fields=['status', 'finished_at', 'updated_at'])
+        return meal_import
+
+    def import_batch(self, rows: List[Optional[Dict]]):
+        meal_import = self.meal_import
+        meals = []
+        for offset, row in enumerate(rows, start=meal_import.rows_done + 1):
+            try:
+                meals.append(build_meal(self.user, self.profile, row))
+            except ValueError as e:
+                meal_import.rows_failed += 1
+                if len(meal_import.errors) < self.MAX_ERRORS:
+                    meal_import.errors.append([offset, str(e)])
+
+        days = {meal.logged_date for meal in meals}
+        with transaction.atomic():
+            created = Meal.objects.bulk_create(meals)
+            pending = [meal for meal in created if meal.analysis_status == 'pending']
+            if pending:
+                AnalysisJob.objects.bulk_create([AnalysisJob(meal=meal) for meal in pending])
+            # Reads fall back to aggregating meals until rebuild_progress runs
+            ProgressTrackingService.mark_stale(self.user.id, days)
+
+            self.dates |= days
+            meal_import.rows_done += len(rows)
+            meal_import.meals_created += len(created)
+            meal_import.dates = sorted(day.isoformat() for day in self.dates)
+            meal_import.save(update_fields=[
+                'rows_done', 'meals_created', 'rows_failed', 'errors', 'dates', 'updated_at',
+            ])
+
+    def rebuild_progress(self):
+        """Recompute DailyProgress once for every day the import touched"""
+        if self.dates:
+            ProgressTrackingService.rebuild_progress([self.user.id], min(self.dates), max(self.dates))
@@ -0,0 +1,67 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from meals.models import Meal, Recommendation
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the per-user meal/recommendation queries and check each one uses its "
+        "composite index. Works on SQLite and PostgreSQL."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Username to plan for (default: first user)')
+        parser.add_argument(
+            '--no-seqscan', action='store_true',
+            help='PostgreSQL: disable sequential scans, to show an index is usable on small dev tables'
+        )
+
+    def queries(self, user):
+        today = user.profile.local_date()
+        now = timezone.now()
+        return [
+            # daily_summary_json / update_daily_progress (aggregates, so no ORDER BY)
+            ('meal_user_date_idx', Meal.objects.filter(user=user, logged_date=today).order_by()),
+            # meals_list_json / MealViewSet
+            ('meal_user_recent_idx', Meal.objects.filter(user=user).order_by('-logged_at', '-id')[:10]),
+            # ...and a later page, seeking past a cursor
+            ('meal_user_recent_idx', Meal.objects.filter(
+                Q(logged_at__lt=now) | Q(logged_at=now, id__lt=1), user=user
+            ).order_by('-logged_at', '-id')[:10]),
+            # RecommendationViewSet
+            ('rec_user_recent_idx', Recommendation.objects.filter(user=user).order_by('-created_at')[:20]),
+        ]
+
+    def handle(self, *args, **options):
+        users = User.objects.select_related('profile').order_by('id')
+        user = users.filter(username=options['user']).first() if options['user'] else users.first()
+        if user is None:
+            raise CommandError("No user to plan queries for")
+
+        vendor = connection.vendor
+        self.stdout.write(f"{vendor} plans for user {user.username} ({timezone.now():%Y-%m-%d %H:%M})")
+
+        failures = 0
+        with transaction.atomic():
+            if vendor == 'postgresql' and options['no_seqscan']:
+                with connection.cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+
+            for index_name, queryset in self.queries(user):
+                plan = queryset.explain()
+                used = index_name in plan
+                failures += not used
+                style = self.style.SUCCESS if used else self.style.ERROR
+                self.stdout.write(style(f"\n[{'ok' if used else 'NO INDEX'}] {index_name}"))
+                self.stdout.write(f"  {queryset.query}")
+                for line in plan.splitlines():
+                    self.stdout.write(f"    {line}")
+
+        if failures:
+            hint = " (try --no-seqscan on small PostgreSQL tables)" if vendor == 'postgresql' else ""
+            raise CommandError(f"{failures} queries did not use their index{hint}")
+        self.stdout.write(self.style.SUCCESS("\nAll queries use their indexes"))
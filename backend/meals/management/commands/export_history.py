@@ -0,0 +1,46 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from meals.export import CHUNK_SIZE, DATASETS, FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream meals, meal foods or daily progress as CSV/NDJSON, for one user or everyone. "
+        "Rows are read through a chunked cursor, so memory stays flat for any history size."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', choices=list(DATASETS), default='meals')
+        parser.add_argument('--format', choices=list(FORMATS), default='csv')
+        parser.add_argument('--user', help='Only export this username (default: all users)')
+        parser.add_argument('--output', '-o', help='File to write (default: stdout)')
+        parser.add_argument('--gzip', action='store_true', help='Gzip the output')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows fetched per round trip')
+
+    def handle(self, *args, **options):
+        user = None
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']}")
+
+        chunks = iter_export(
+            options['dataset'], options['format'], user=user,
+            compress=options['gzip'], chunk_size=options['chunk_size'],
+        )
+        written = 0
+        if options['output']:
+            with open(options['output'], 'wb') as output:
+                for chunk in chunks:
+                    output.write(chunk)
+                    written += len(chunk)
+            self.stderr.write(self.style.SUCCESS(f"Wrote {written} bytes to {options['output']}"))
+        else:
+            output = sys.stdout.buffer
+            for chunk in chunks:
+                output.write(chunk)
+            output.flush()
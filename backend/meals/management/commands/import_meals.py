@@ -0,0 +1,80 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from meals.importer import MealImporter
+from meals.models import MealImport
+
+
+class Command(BaseCommand):
+    help = (
+        "Import meal history exported from other trackers (CSV, JSON array or NDJSON, optionally .gz). "
+        "Rows are streamed and bulk-inserted in batches; re-running after an interruption resumes "
+        "from the last committed batch. With --queued, runs imports uploaded through the API."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='File to import for --user')
+        parser.add_argument('--user', help='Username the meals belong to')
+        parser.add_argument('--queued', action='store_true', help='Run queued uploads until none are left')
+        parser.add_argument('--resume', type=int, metavar='IMPORT_ID', help='Resume an interrupted or failed import')
+        parser.add_argument('--batch-size', type=int, default=MealImporter.BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['queued']:
+            while True:
+                meal_import = MealImporter.claim_queued()
+                if meal_import is None:
+                    break
+                self.run(meal_import, options['batch_size'])
+            return
+
+        if options['resume']:
+            try:
+                meal_import = MealImport.objects.select_related('user__profile').get(id=options['resume'])
+            except MealImport.DoesNotExist:
+                raise CommandError(f"No import {options['resume']}")
+            self.run(meal_import, options['batch_size'])
+            return
+
+        if not options['path'] or not options['user']:
+            raise CommandError("Give a file and --user, or --queued, or --resume IMPORT_ID")
+        try:
+            user = User.objects.select_related('profile').get(username=options['user'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user named {options['user']}")
+        try:
+            meal_import, created = MealImporter.for_file(user, options['path'])
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        if not created:
+            self.stdout.write(f"Import {meal_import.id} of this file exists ({meal_import.status}, "
+                              f"{meal_import.rows_done} rows done)")
+        self.run(meal_import, options['batch_size'])
+
+    def run(self, meal_import, batch_size):
+        if meal_import.status == 'done':
+            self.stdout.write(f"Import {meal_import.id} already finished: {meal_import.meals_created} meals")
+            return
+
+        self.stdout.write(f"Importing {meal_import.file_name} for {meal_import.user.username} "
+                          f"(import {meal_import.id}, from row {meal_import.rows_done + 1})")
+        started = time.monotonic()
+
+        def report(progress):
+            self.stdout.write(f"  {progress.rows_done} rows ({progress.meals_created} meals, "
+                              f"{progress.rows_failed} rejected)")
+
+        try:
+            MealImporter(meal_import, batch_size=batch_size).run(on_batch=report)
+        except Exception as e:
+            raise CommandError(f"Import {meal_import.id} failed at row {meal_import.rows_done + 1}: {e}. "
+                               f"Fix the cause and re-run with --resume {meal_import.id}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Done in {time.monotonic() - started:.1f}s: {meal_import.meals_created} meals created, "
+            f"{meal_import.rows_failed} rows rejected, progress rebuilt for {len(meal_import.dates)} days"
+        ))
+        for row, error in meal_import.errors[:10]:
+            self.stdout.write(f"  row {row}: {error}")
@@ -0,0 +1,151 @@
+import bisect
+import json
+import multiprocessing
+import os
+import time
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from meals.rollups import rebuild_rollups
+from meals.services import ProgressTrackingService
+
+
+def _rebuild_chunk(task):
+    user_ids, start, end, rollups_only = task
+    if rollups_only:
+        return user_ids, 0, rebuild_rollups(user_ids, start, end)
+    return (user_ids, *ProgressTrackingService.rebuild_progress(user_ids, start, end))
+
+
+def _in_ranges(value, ranges):
+    # ranges: sorted, non-overlapping [first, last] pairs
+    i = bisect.bisect_right(ranges, [value, float('inf')]) - 1
+    return i >= 0 and ranges[i][0] <= value <= ranges[i][1]
+
+
+def _parse_date(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        raise CommandError(f"Dates must be YYYY-MM-DD, got {value!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute DailyProgress from Meal for a set of users and a date range, e.g. after "
+        "changing calculate_adherence or repairing meal data. Each chunk of users is one grouped "
+        "aggregate and one upsert; chunks run across a process pool. Finished chunks are recorded "
+        "in a checkpoint file, so an interrupted run continues with --resume. --rollups-only "
+        "leaves DailyProgress alone and rebuilds the weekly/monthly rollups from it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', action='append', dest='users', metavar='USERNAME',
+                            help='Only rebuild this user (repeatable). Default: everyone')
+        parser.add_argument('--start', help='First day to rebuild (YYYY-MM-DD). Default: the beginning')
+        parser.add_argument('--end', help='Last day to rebuild (YYYY-MM-DD). Default: no limit')
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=100, help='Users per aggregate query')
+        parser.add_argument('--checkpoint', default='rebuild_daily_progress.checkpoint.json',
+                            help='File recording finished chunks')
+        parser.add_argument('--resume', action='store_true', help='Skip chunks the checkpoint lists as done')
+        parser.add_argument('--rollups-only', action='store_true',
+                            help='Only rebuild WeeklyProgress/MonthlyProgress from existing days')
+
+    def handle(self, *args, **options):
+        start, end = _parse_date(options['start']), _parse_date(options['end'])
+        if start and end and start > end:
+            raise CommandError("--start must not be after --end")
+
+        users = User.objects.order_by('id')
+        if options['users']:
+            users = users.filter(username__in=options['users'])
+            missing = set(options['users']) - set(users.values_list('username', flat=True))
+            if missing:
+                raise CommandError(f"No user named {', '.join(sorted(missing))}")
+        user_ids = list(users.values_list('id', flat=True))
+
+        # The checkpoint only applies to a run over the same users and dates
+        run_key = {
+            'users': sorted(options['users'] or []),
+            'start': options['start'],
+            'end': options['end'],
+            'rollups_only': options['rollups_only'],
+        }
+        # Finished chunks as [first, last] user id ranges: stays valid if users sign up or leave meanwhile
+        done = []
+        if options['resume']:
+            done = sorted(self._load_checkpoint(options['checkpoint'], run_key))
+            user_ids = [user_id for user_id in user_ids if not _in_ranges(user_id, done)]
+        self._save_checkpoint(options['checkpoint'], run_key, done)
+
+        processes = options['processes']
+        if connection.vendor == 'sqlite' and processes > 1:
+            # SQLite takes one writer at a time; parallel chunks would just fail on the lock
+            self.stdout.write(self.style.WARNING("SQLite: running chunks in a single process"))
+            processes = 1
+
+        size = max(1, options['chunk_size'])
+        tasks = [(user_ids[i:i + size], start, end, options['rollups_only']) for i in range(0, len(user_ids), size)]
+        target = 'weekly/monthly rollups' if options['rollups_only'] else 'DailyProgress'
+        self.stdout.write(
+            f"Rebuilding {target} for {len(user_ids)} users in {len(tasks)} chunks "
+            f"({len(done)} chunks already done), {processes} process(es)"
+        )
+
+        started = time.monotonic()
+        users_done = days = written = 0
+        for chunk, chunk_days, chunk_written in self._run(tasks, processes):
+            done.append([chunk[0], chunk[-1]])
+            users_done += len(chunk)
+            days += chunk_days
+            written += chunk_written
+            self._save_checkpoint(options['checkpoint'], run_key, done)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"  {users_done}/{len(user_ids)} users, {days} days, {written} changed "
+                f"({days / elapsed if elapsed else 0:.0f} days/s)"
+            )
+
+        os.remove(options['checkpoint'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Checked {days} days for {users_done} users in {time.monotonic() - started:.1f}s, "
+            f"{written} rewritten"
+        ))
+
+    def _run(self, tasks, processes):
+        if processes <= 1 or len(tasks) <= 1:
+            for task in tasks:
+                yield _rebuild_chunk(task)
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with context.Pool(processes) as pool:
+            yield from pool.imap_unordered(_rebuild_chunk, tasks)
+
+    @staticmethod
+    def _load_checkpoint(path, run_key):
+        try:
+            with open(path) as fp:
+                checkpoint = json.load(fp)
+        except FileNotFoundError:
+            return []
+        except ValueError:
+            raise CommandError(f"Unreadable checkpoint {path}; delete it to start over")
+        if checkpoint.get('run') != run_key:
+            raise CommandError(
+                f"{path} is from a run with different options; re-run those options or drop --resume"
+            )
+        return checkpoint['done']
+
+    @staticmethod
+    def _save_checkpoint(path, run_key, done):
+        partial = f'{path}.tmp'
+        with open(partial, 'w') as fp:
+            json.dump({'run': run_key, 'done': done}, fp)
+        os.replace(partial, path)
@@ -0,0 +1,86 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from meals.models import DailyProgress, Meal
+from meals.services import ProgressTrackingService
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare DailyProgress rows against a full recompute from Meal and report drift "
+        "left by writes that bypass the Meal signals (QuerySet.update(), bulk imports). "
+        "Pass --fix to rebuild the drifted days."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='How many days back to check')
+        parser.add_argument('--user', help='Only check this username')
+        parser.add_argument('--tolerance', type=float, default=0.01, help='Allowed difference per total')
+        parser.add_argument('--fix', action='store_true', help='Recompute drifted days')
+
+    def handle(self, *args, **options):
+        start = timezone.localdate() - timedelta(days=options['days'])
+        meals = Meal.objects.filter(logged_date__gte=start)
+        progress = DailyProgress.objects.filter(date__gte=start)
+        if options['user']:
+            try:
+                user = User.objects.get(username=options['user'])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']}")
+            meals = meals.filter(user=user)
+            progress = progress.filter(user=user)
+
+        fields = ProgressTrackingService.TOTAL_FIELDS
+        expected = {
+            (row['user_id'], row['logged_date']): row
+            for row in meals.values('user_id', 'logged_date')
+            .annotate(meals_count=Count('id'), **{field: Sum(field) for field in fields})
+        }
+        actual = {
+            (row['user_id'], row['date']): row
+            for row in progress.values('user_id', 'date', 'meals_count', 'is_stale', *fields)
+        }
+
+        drifted = []
+        for key in expected.keys() | actual.keys():
+            want = expected.get(key)
+            have = actual.get(key)
+            if have is None:
+                drifted.append((key, 'missing row'))
+                continue
+            if want is None:
+                want = dict.fromkeys(fields, 0) | {'meals_count': 0}
+            diffs = [
+                f"{field} {have[field]:g} != {want[field] or 0:g}"
+                for field in fields
+                if abs((have[field] or 0) - (want[field] or 0)) > options['tolerance']
+            ]
+            if have['meals_count'] != want['meals_count']:
+                diffs.append(f"meals_count {have['meals_count']} != {want['meals_count']}")
+            if have['is_stale']:
+                diffs.append("marked stale")
+            if diffs:
+                drifted.append((key, ', '.join(diffs)))
+
+        for (user_id, date), detail in sorted(drifted, key=lambda d: (d[0][1], d[0][0])):
+            self.stdout.write(f"  user {user_id} {date}: {detail}")
+
+        checked = len(expected.keys() | actual.keys())
+        if not drifted:
+            self.stdout.write(self.style.SUCCESS(f"{checked} days checked, no drift"))
+            return
+
+        if not options['fix']:
+            self.stdout.write(self.style.WARNING(
+                f"{len(drifted)} of {checked} days drifted; re-run with --fix to rebuild them"
+            ))
+            return
+
+        users = User.objects.select_related('profile').in_bulk({user_id for (user_id, _), _ in drifted})
+        for (user_id, date), _ in drifted:
+            ProgressTrackingService.update_daily_progress(users[user_id], date)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(drifted)} of {checked} days"))
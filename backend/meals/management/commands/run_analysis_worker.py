@@ -0,0 +1,62 @@
+import multiprocessing
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from meals.queue import AnalysisWorker
+
+
+def _work(concurrency, poll_interval, once, imports):
+    worker = AnalysisWorker(concurrency=concurrency, poll_interval=poll_interval, imports=imports)
+    return worker.run(once=once)
+
+
+class Command(BaseCommand):
+    help = (
+        "Process queued meal analyses (AnalysisJob rows). Each process runs up to "
+        "--concurrency analyses at a time; run as many processes or hosts as needed. "
+        "Files uploaded to the import endpoint are imported here too, one per process at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--concurrency', type=int, default=4, help='In-flight analyses per process')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds between polls when idle')
+        parser.add_argument('--once', action='store_true', help='Exit when no job is due')
+        parser.add_argument('--no-imports', action='store_true',
+                            help="Leave uploaded imports to `import_meals --queued`")
+
+    def handle(self, *args, **options):
+        work_args = (options['concurrency'], options['poll_interval'], options['once'], not options['no_imports'])
+        self.stdout.write(
+            f"Analysis worker: {options['processes']} process(es) x {options['concurrency']} concurrent jobs"
+        )
+
+        if options['processes'] <= 1:
+            try:
+                processed = _work(*work_args)
+            except KeyboardInterrupt:
+                return
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs"))
+            return
+
+        # Children must not share the parent's database connections
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        children = [
+            context.Process(target=_work, args=work_args, daemon=True)
+            for _ in range(options['processes'])
+        ]
+        for child in children:
+            child.start()
+
+        try:
+            for child in children:
+                child.join()
+        except KeyboardInterrupt:
+            for child in children:
+                if child.is_alive():
+                    # Interrupted jobs are retried by another worker once their lock expires
+                    child.terminate()
+            for child in children:
+                child.join()
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0002_dailyprogress'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='food',
+            name='usda_id',
+            field=models.CharField(blank=True, db_index=True, max_length=50, null=True),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0003_food_usda_id_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meal',
+            name='analysis_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('complete', 'Complete'), ('failed', 'Failed')], default='complete', help_text='Pending while a background AnalysisJob is queued or running', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='AnalysisJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('attempts', models.PositiveIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+                ('locked_by', models.CharField(blank=True, max_length=64)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('meal', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='analysis_job', to='meals.meal')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'available_at'], name='analysisjob_claim_idx')],
+            },
+        ),
+    ]
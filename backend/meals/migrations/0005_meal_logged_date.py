@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:40
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0004_meal_analysis_job'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='meal',
+            name='logged_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        # Nullable until 0006 has backfilled existing rows
+        migrations.AddField(
+            model_name='meal',
+            name='logged_date',
+            field=models.DateField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,56 @@
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.db import migrations, transaction
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+
+
+def _zone(name):
+    try:
+        return ZoneInfo(name or 'UTC')
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo('UTC')
+
+
+def backfill_logged_date(apps, schema_editor):
+    Meal = apps.get_model('meals', 'Meal')
+    UserProfile = apps.get_model('accounts', 'UserProfile')
+    db = schema_editor.connection.alias
+
+    zones = {
+        user_id: _zone(name)
+        for user_id, name in UserProfile.objects.using(db).values_list('user_id', 'timezone')
+    }
+    utc = ZoneInfo('UTC')
+
+    # Walk the primary key so every batch is a short transaction and an index range scan
+    last_id = 0
+    while True:
+        batch = list(
+            Meal.objects.using(db)
+            .filter(id__gt=last_id, logged_date__isnull=True)
+            .order_by('id')
+            .only('id', 'user_id', 'logged_at')[:BATCH_SIZE]
+        )
+        if not batch:
+            break
+        for meal in batch:
+            meal.logged_date = timezone.localdate(meal.logged_at, timezone=zones.get(meal.user_id, utc))
+        with transaction.atomic(using=db):
+            Meal.objects.using(db).bulk_update(batch, ['logged_date'])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own instead of one transaction over the whole table
+    atomic = False
+
+    dependencies = [
+        ('meals', '0005_meal_logged_date'),
+        ('accounts', '0003_userprofile_timezone'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_logged_date, migrations.RunPython.noop),
+    ]
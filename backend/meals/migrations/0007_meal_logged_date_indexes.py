@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('meals', '0006_backfill_meal_logged_date'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='meal',
+            name='logged_date',
+            field=models.DateField(editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='meal',
+            index=models.Index(fields=['user', 'logged_date'], name='meal_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='meal',
+            index=models.Index(fields=['user', '-logged_at'], name='meal_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recommendation',
+            index=models.Index(fields=['user', '-created_at'], name='rec_user_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0007_meal_logged_date_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyprogress',
+            name='is_stale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
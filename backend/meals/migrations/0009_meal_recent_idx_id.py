@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0008_dailyprogress_is_stale'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='meal',
+            name='meal_user_recent_idx',
+        ),
+        migrations.AddIndex(
+            model_name='meal',
+            index=models.Index(fields=['user', '-logged_at', '-id'], name='meal_user_recent_idx'),
+        ),
+    ]
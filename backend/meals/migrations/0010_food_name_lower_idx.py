@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:49
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0009_meal_recent_idx_id'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='food',
+            index=models.Index(django.db.models.functions.text.Lower('name'), name='food_name_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 20:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('meals', '0010_food_name_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='food',
+            name='aliases',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
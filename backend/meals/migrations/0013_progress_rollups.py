@@ -0,0 +1,86 @@
+# Generated by Django 4.2.7 on 2026-10-17 21:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('meals', '0012_meal_import'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WeeklyProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('days_tracked', models.PositiveIntegerField(default=0)),
+                ('meals_count', models.PositiveIntegerField(default=0)),
+                ('total_calories', models.FloatField(default=0)),
+                ('total_protein', models.FloatField(default=0)),
+                ('total_carbs', models.FloatField(default=0)),
+                ('total_fat', models.FloatField(default=0)),
+                ('total_fiber', models.FloatField(default=0)),
+                ('min_calories', models.FloatField(blank=True, null=True)),
+                ('max_calories', models.FloatField(blank=True, null=True)),
+                ('min_protein', models.FloatField(blank=True, null=True)),
+                ('max_protein', models.FloatField(blank=True, null=True)),
+                ('min_carbs', models.FloatField(blank=True, null=True)),
+                ('max_carbs', models.FloatField(blank=True, null=True)),
+                ('min_fat', models.FloatField(blank=True, null=True)),
+                ('max_fat', models.FloatField(blank=True, null=True)),
+                ('min_fiber', models.FloatField(blank=True, null=True)),
+                ('max_fiber', models.FloatField(blank=True, null=True)),
+                ('adherence_total', models.FloatField(default=0)),
+                ('streak_head', models.PositiveIntegerField(default=0)),
+                ('streak_tail', models.PositiveIntegerField(default=0)),
+                ('streak_longest', models.PositiveIntegerField(default=0)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-period_start'],
+                'unique_together': {('user', 'period_start')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyProgress',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('days_tracked', models.PositiveIntegerField(default=0)),
+                ('meals_count', models.PositiveIntegerField(default=0)),
+                ('total_calories', models.FloatField(default=0)),
+                ('total_protein', models.FloatField(default=0)),
+                ('total_carbs', models.FloatField(default=0)),
+                ('total_fat', models.FloatField(default=0)),
+                ('total_fiber', models.FloatField(default=0)),
+                ('min_calories', models.FloatField(blank=True, null=True)),
+                ('max_calories', models.FloatField(blank=True, null=True)),
+                ('min_protein', models.FloatField(blank=True, null=True)),
+                ('max_protein', models.FloatField(blank=True, null=True)),
+                ('min_carbs', models.FloatField(blank=True, null=True)),
+                ('max_carbs', models.FloatField(blank=True, null=True)),
+                ('min_fat', models.FloatField(blank=True, null=True)),
+                ('max_fat', models.FloatField(blank=True, null=True)),
+                ('min_fiber', models.FloatField(blank=True, null=True)),
+                ('max_fiber', models.FloatField(blank=True, null=True)),
+                ('adherence_total', models.FloatField(default=0)),
+                ('streak_head', models.PositiveIntegerField(default=0)),
+                ('streak_tail', models.PositiveIntegerField(default=0)),
+                ('streak_longest', models.PositiveIntegerField(default=0)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-period_start'],
+                'unique_together': {('user', 'period_start')},
+            },
+        ),
+    ]
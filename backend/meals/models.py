@@ -1,10 +1,18 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Lower
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from accounts.response_cache import invalidate
 
 class Food(models.Model):
     """Food database with nutrition information"""
     name = models.CharField(max_length=200, unique=True)
+    # Other names the food is logged as ("scrambled eggs", "eggs"), matched by the food index
+    aliases = models.JSONField(default=list, blank=True)
     
     # Nutrition per 100g
     calories_per_100g = models.FloatField()
@@ -21,7 +29,7 @@ class Food(models.Model):
     vitamin_c_per_100g = models.FloatField(default=0, help_text="mg")
     
     # Data sources
-    usda_id = models.CharField(max_length=50, null=True, blank=True)
+    usda_id = models.CharField(max_length=50, null=True, blank=True, db_index=True)
     edamam_id = models.CharField(max_length=100, null=True, blank=True)
     
     created_at = models.DateTimeField(auto_now_add=True)
@@ -32,6 +40,10 @@ class Food(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            # Case-insensitive name lookups by the local nutrition engine
+            models.Index(Lower('name'), name='food_name_lower_idx'),
+        ]
 
 class Meal(models.Model):
     """Individual meal logged by user"""
@@ -42,6 +54,12 @@ class Meal(models.Model):
         ('snack', 'Snack'),
     ]
 
+    ANALYSIS_STATUSES = [
+        ('pending', 'Pending'),
+        ('complete', 'Complete'),
+        ('failed', 'Failed'),
+    ]
+
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meals')
     meal_type = models.CharField(max_length=20, choices=MEAL_TYPES)
     description = models.TextField(help_text="User's description of the meal")
@@ -60,16 +78,65 @@ class Meal(models.Model):
         help_text="AI confidence score (0-1)"
     )
     ai_analysis_raw = models.JSONField(null=True, blank=True)
+    analysis_status = models.CharField(
+        max_length=10,
+        choices=ANALYSIS_STATUSES,
+        default='complete',
+        help_text="Pending while a background AnalysisJob is queued or running"
+    )
     
     # Timestamps
-    logged_at = models.DateTimeField(auto_now_add=True)
+    logged_at = models.DateTimeField(default=timezone.now)
+    # logged_at's date in the user's time zone, so day queries can use an index
+    logged_date = models.DateField(editable=False)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.user.username} - {self.meal_type} - {self.logged_at.strftime('%Y-%m-%d')}"
 
+    def _user_profile(self):
+        """The owner's profile if already loaded, else None"""
+        user = self._state.fields_cache.get('user')
+        if user is not None:
+            return user._state.fields_cache.get('profile')
+        return None
+
+    def compute_logged_date(self):
+        from accounts.models import UserProfile
+
+        profile = self._user_profile()
+        if profile is None:
+            profile = UserProfile(
+                timezone=UserProfile.objects.filter(user_id=self.user_id)
+                .values_list('timezone', flat=True).first() or 'UTC'
+            )
+        return profile.local_date(self.logged_at)
+
+    def save(self, *args, **kwargs):
+        loaded = getattr(self, '_loaded_values', {})
+        if (self.logged_date is None
+                or loaded.get('logged_at', self.logged_at) != self.logged_at
+                or loaded.get('user_id', self.user_id) != self.user_id):
+            self.logged_date = self.compute_logged_date()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'logged_date' not in update_fields:
+                kwargs['update_fields'] = list(update_fields) + ['logged_date']
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the row held when loaded, so the DailyProgress signals can apply deltas
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         ordering = ['-logged_at']
+        indexes = [
+            models.Index(fields=['user', 'logged_date'], name='meal_user_date_idx'),
+            # Keyset pagination seeks on (logged_at, id) within a user
+            models.Index(fields=['user', '-logged_at', '-id'], name='meal_user_recent_idx'),
+        ]
 
 class MealFood(models.Model):
     """Individual food items within a meal (parsed by AI)"""
@@ -92,6 +159,74 @@ class MealFood(models.Model):
         self.fat = self.food.fat_per_100g * ratio
         super().save(*args, **kwargs)
 
+class AnalysisJob(models.Model):
+    """Queued background analysis of a pending meal (see meals.queue)"""
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    meal = models.OneToOneField(Meal, on_delete=models.CASCADE, related_name='analysis_job')
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    attempts = models.PositiveIntegerField(default=0)
+
+    # Not claimable before this time (retry backoff)
+    available_at = models.DateTimeField(default=timezone.now)
+    # Visibility timeout: a running job whose lock expires is handed to another worker
+    locked_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=64, blank=True)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='analysisjob_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.id} - meal {self.meal_id} - {self.status}"
+
+class MealImport(models.Model):
+    """Bulk import of meal history from another tracker's export (see meals.importer)"""
+    STATUSES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='meal_imports')
+    path = models.CharField(max_length=500, help_text="CSV/JSON/NDJSON file on the server (optionally .gz)")
+    file_name = models.CharField(max_length=255)
+    # sha256 of the file: the same file imported twice resumes/reports one import
+    checksum = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+
+    # Checkpoint, saved in the same transaction as each batch of meals: resuming skips rows_done
+    rows_done = models.PositiveIntegerField(default=0)
+    meals_created = models.PositiveIntegerField(default=0)
+    rows_failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list, blank=True)  # first few [row, message]
+    dates = models.JSONField(default=list, blank=True)  # days touched; their progress is rebuilt at the end
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'checksum'], name='mealimport_user_file_uniq'),
+        ]
+
+    def __str__(self):
+        return f"Import {self.id} - {self.user.username} - {self.file_name} - {self.status}"
+
 class Recommendation(models.Model):
     """AI-generated recommendations for users"""
     RECOMMENDATION_TYPES = [
@@ -120,6 +255,9 @@ class Recommendation(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='rec_user_recent_idx'),
+        ]
 
 class DailyProgress(models.Model):
     """Track daily nutrition progress"""
@@ -142,6 +280,9 @@ class DailyProgress(models.Model):
     # Metrics
     meals_count = models.PositiveIntegerField(default=0)
     adherence_score = models.FloatField(default=0)  # 0-100%
+
+    # Set by bulk meal writes that skip the Meal signals; cleared by a full recompute
+    is_stale = models.BooleanField(default=False)
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -173,4 +314,126 @@ class DailyProgress(models.Model):
             adherence *= 0.8
         
         self.adherence_score = round(adherence, 1)
-        return self.adherence_score
\ No newline at end of file
+        return self.adherence_score
+
+class ProgressRollup(models.Model):
+    """
+    DailyProgress summed over a calendar period, flagged stale whenever one of its days
+    changes and recomputed by the next read (meals.rollups); long progress ranges read
+    these instead of every day
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    period_start = models.DateField()
+
+    # Over the period's DailyProgress rows ("tracked" days)
+    days_tracked = models.PositiveIntegerField(default=0)
+    meals_count = models.PositiveIntegerField(default=0)
+    total_calories = models.FloatField(default=0)
+    total_protein = models.FloatField(default=0)
+    total_carbs = models.FloatField(default=0)
+    total_fat = models.FloatField(default=0)
+    total_fiber = models.FloatField(default=0)
+    # Daily extremes, for range summaries
+    min_calories = models.FloatField(null=True, blank=True)
+    max_calories = models.FloatField(null=True, blank=True)
+    min_protein = models.FloatField(null=True, blank=True)
+    max_protein = models.FloatField(null=True, blank=True)
+    min_carbs = models.FloatField(null=True, blank=True)
+    max_carbs = models.FloatField(null=True, blank=True)
+    min_fat = models.FloatField(null=True, blank=True)
+    max_fat = models.FloatField(null=True, blank=True)
+    min_fiber = models.FloatField(null=True, blank=True)
+    max_fiber = models.FloatField(null=True, blank=True)
+    adherence_total = models.FloatField(default=0)
+
+    # Adherence streaks (days at or above analytics.STREAK_THRESHOLD) so ranges can join periods:
+    # the run from the first day, the run ending on the last day, and the longest run inside
+    streak_head = models.PositiveIntegerField(default=0)
+    streak_tail = models.PositiveIntegerField(default=0)
+    streak_longest = models.PositiveIntegerField(default=0)
+
+    # Set when a day in the period changed since it was summed; readers use the days and refresh it
+    is_stale = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.user.username} - {self.period_start}"
+
+class WeeklyProgress(ProgressRollup):
+    """Monday-to-Sunday rollup of DailyProgress"""
+
+    class Meta:
+        unique_together = ['user', 'period_start']
+        ordering = ['-period_start']
+
+class MonthlyProgress(ProgressRollup):
+    """Calendar-month rollup of DailyProgress"""
+
+    class Meta:
+        unique_together = ['user', 'period_start']
+        ordering = ['-period_start']
+
+# Keep DailyProgress current as meals are created, edited and deleted
+# (QuerySet.update()/bulk writes bypass these; see `manage.py reconcile_daily_progress`)
+PROGRESS_SOURCE_FIELDS = ('user_id', 'logged_date', 'total_calories', 'total_protein',
+                          'total_carbs', 'total_fat', 'total_fiber')
+
+@receiver(pre_save, sender=Meal)
+def remember_meal_day(sender, instance, raw=False, **kwargs):
+    # Saved without a snapshot of where the row was: look it up, so post_save can fix that day too
+    loaded = getattr(instance, '_loaded_values', None) or {}
+    if raw or instance.pk is None or ('user_id' in loaded and 'logged_date' in loaded):
+        return
+    instance._previous_day = Meal.objects.filter(pk=instance.pk).values_list('user_id', 'logged_date').first()
+
+@receiver(post_save, sender=Meal)
+def update_progress_on_meal_save(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    if raw:
+        return
+    from .services import ProgressTrackingService
+
+    loaded = getattr(instance, '_loaded_values', None)
+    if update_fields is not None:
+        update_fields = set(update_fields) | ({'user_id'} if 'user' in update_fields else set())
+    # Read from __dict__ so deferred fields (not saved either) aren't fetched
+    saved = {
+        field: instance.__dict__[field] for field in PROGRESS_SOURCE_FIELDS
+        if field in instance.__dict__ and (update_fields is None or field in update_fields)
+    }
+    current = {**(loaded or {}), **saved}
+    user = instance._state.fields_cache.get('user')
+
+    old = None if created else ProgressTrackingService.meal_contribution(loaded or {})
+    new = ProgressTrackingService.meal_contribution(current)
+    previous_day = instance.__dict__.pop('_previous_day', None)
+    if not created and old is None:
+        # Saved without a snapshot to diff against: recompute the day instead, and the
+        # day the meal was on before if it moved
+        ProgressTrackingService.update_daily_progress(user or instance.user, instance.logged_date)
+        if loaded and 'user_id' in loaded and 'logged_date' in loaded:
+            previous_day = (loaded['user_id'], loaded['logged_date'])
+        if previous_day and previous_day != (instance.user_id, instance.logged_date):
+            ProgressTrackingService.recompute_day(*previous_day, user=user)
+    else:
+        ProgressTrackingService.apply_meal_change(old, new, user=user)
+
+    for user_id in {instance.user_id, (loaded or {}).get('user_id', instance.user_id)}:
+        invalidate(user_id, 'meals')
+    instance._loaded_values = current
+
+@receiver(post_delete, sender=Meal)
+def update_progress_on_meal_delete(sender, instance, origin=None, **kwargs):
+    # Deleting the user cascades to DailyProgress too; nothing to maintain
+    if not (isinstance(origin, Meal) or getattr(origin, 'model', None) is Meal):
+        return
+    from .services import ProgressTrackingService
+
+    values = {
+        field: instance.__dict__[field] for field in PROGRESS_SOURCE_FIELDS if field in instance.__dict__
+    }
+    old = ProgressTrackingService.meal_contribution({**getattr(instance, '_loaded_values', {}), **values})
+    ProgressTrackingService.apply_meal_change(old, None, user=instance._state.fields_cache.get('user'))
+    invalidate(instance.user_id, 'meals')
@@ -0,0 +1,132 @@
+import base64
+from datetime import datetime
+from typing import List, Optional, Set, Tuple
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+# Columns a meal history row always needs
+MEAL_LIST_FIELDS = (
+    'id', 'user_id', 'meal_type', 'logged_at', 'logged_date',
+    'total_calories', 'total_protein', 'total_carbs', 'total_fat', 'total_fiber',
+    'ai_confidence', 'analysis_status',
+)
+# Large columns: description is in every row unless ?fields= leaves it out,
+# ai_analysis_raw is only loaded with ?include=ai_analysis_raw
+OPTIONAL_FIELDS = ('description', 'ai_analysis_raw')
+DEFAULT_OPTIONAL_FIELDS = ('description',)
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(logged_at: datetime, meal_id: int) -> str:
+    raw = f'{logged_at.isoformat()}|{meal_id}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        logged_at, meal_id = raw.split('|')
+        return datetime.fromisoformat(logged_at), int(meal_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def _names(value: Optional[str]) -> Set[str]:
+    return {name.strip() for name in (value or '').split(',')} - {''}
+
+
+def requested_fields(params) -> List[str]:
+    """Optional columns to load: the default ones ?fields= doesn't leave out, plus ?include=..."""
+    wanted = _names(params.get('fields'))
+    include = _names(params.get('include'))
+    return [
+        name for name in OPTIONAL_FIELDS
+        if name in include or (name in DEFAULT_OPTIONAL_FIELDS and (not wanted or name in wanted))
+    ]
+
+
+def omitted_fields(params, fields) -> List[str]:
+    """Fields of `fields` to leave out of each row: with ?fields=id,logged_at,... all the others"""
+    wanted = _names(params.get('fields'))
+    return [name for name in fields if wanted and name not in wanted]
+
+
+def page_size_from(params, default: int = DEFAULT_PAGE_SIZE) -> int:
+    try:
+        size = int(params.get('page_size', default))
+    except ValueError:
+        size = default
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def keyset_page(queryset, cursor: Optional[str], page_size: int):
+    """
+    One page of meals, newest first, after `cursor`.
+    Seeks on (logged_at, id) instead of OFFSET, so every page is an index range scan
+    of page_size + 1 rows no matter how deep it is; no COUNT(*) either.
+    Returns (meals, next_cursor or None).
+    """
+    queryset = queryset.order_by('-logged_at', '-id')
+    if cursor:
+        logged_at, meal_id = decode_cursor(cursor)
+        queryset = queryset.filter(Q(logged_at__lt=logged_at) | Q(logged_at=logged_at, id__lt=meal_id))
+
+    meals = list(queryset[:page_size + 1])
+    if len(meals) <= page_size:
+        return meals, None
+    meals = meals[:page_size]
+    return meals, encode_cursor(meals[-1].logged_at, meals[-1].id)
+
+
+class MealKeysetPagination(BasePagination):
+    """DRF pagination over keyset_page for MealViewSet"""
+
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            meals, self.next_cursor = keyset_page(
+                queryset, request.query_params.get(self.cursor_query_param), page_size_from(request.query_params)
+            )
+        except InvalidCursor as e:
+            raise NotFound(str(e))
+        return meals
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+def next_page_url(request, next_cursor: Optional[str]) -> Optional[str]:
+    if next_cursor is None:
+        return None
+    url = remove_query_param(request.build_absolute_uri(), 'cursor')
+    return replace_query_param(url, 'cursor', next_cursor)
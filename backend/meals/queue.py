@@ -0,0 +1,251 @@
+import logging
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+from typing import List, Optional
+
+from decouple import config
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from accounts.response_cache import invalidate
+
+from .importer import MealImporter
+from .models import AnalysisJob, Meal
+from .services import MealAnalysisService
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisQueue(ABC):
+    """Interface for queue backends selected with settings.ANALYSIS_QUEUE_BACKEND"""
+
+    @abstractmethod
+    def enqueue(self, meal: Meal):
+        """Arrange for a pending meal to be analyzed once the current transaction commits"""
+
+
+class ImmediateQueue(AnalysisQueue):
+    """Runs the analysis inline; for development and tests without a worker"""
+
+    def enqueue(self, meal: Meal):
+        # After the meal's transaction commits: never hold it open across the AI call
+        transaction.on_commit(lambda: self._analyze(meal))
+
+    def _analyze(self, meal: Meal):
+        try:
+            MealAnalysisService.analyze(meal)
+        except Exception:
+            logger.exception("Inline analysis of meal %s failed", meal.id)
+            Meal.objects.filter(id=meal.id).update(analysis_status='failed', updated_at=timezone.now())
+            invalidate(meal.user_id, 'meals')
+
+
+class DatabaseQueue(AnalysisQueue):
+    """
+    AnalysisJob table used as a queue, so no outside broker is needed.
+    Jobs are claimed with a conditional UPDATE, so any number of workers can poll the
+    same table; a claimed job is invisible to other workers until its lock expires.
+    """
+
+    MAX_ATTEMPTS = config('ANALYSIS_JOB_MAX_ATTEMPTS', default=3, cast=int)
+    VISIBILITY_TIMEOUT = config('ANALYSIS_VISIBILITY_TIMEOUT', default=120, cast=int)  # seconds
+    RETRY_BACKOFF = config('ANALYSIS_RETRY_BACKOFF', default=5, cast=int)  # seconds, doubled per attempt
+    MAX_IN_FLIGHT = config('ANALYSIS_MAX_IN_FLIGHT', default=0, cast=int)  # across all workers, 0 = no cap
+
+    def enqueue(self, meal: Meal):
+        AnalysisJob.objects.create(meal=meal)
+
+    @classmethod
+    def _claimable(cls, now):
+        # Queued and due, or running under a lock that expired (the worker died) with tries left
+        return (
+            Q(status='queued', available_at__lte=now)
+            | Q(status='running', locked_until__lt=now, attempts__lt=cls.MAX_ATTEMPTS)
+        )
+
+    @classmethod
+    def _abandoned(cls, now):
+        # The worker died (or overran its lock) on the last attempt: never handed out again
+        return Q(status='running', locked_until__lt=now, attempts__gte=cls.MAX_ATTEMPTS)
+
+    def fail_abandoned(self, now) -> int:
+        """Fail jobs whose last attempt never finished, and their meals. Returns jobs failed."""
+        failed = 0
+        abandoned = AnalysisJob.objects.filter(self._abandoned(now)).values_list('id', 'meal_id', 'meal__user_id')
+        for job_id, meal_id, user_id in abandoned:
+            with transaction.atomic():
+                if AnalysisJob.objects.filter(self._abandoned(now), id=job_id).update(
+                    status='failed', locked_until=None,
+                    last_error='Worker stopped before finishing the last attempt', updated_at=now,
+                ):
+                    self._fail_meal(meal_id, user_id, now)
+                    failed += 1
+        if failed:
+            logger.warning("Failed %s analysis jobs abandoned on their last attempt", failed)
+        return failed
+
+    def claim(self, worker_id: str, limit: int = 1) -> List[AnalysisJob]:
+        """Lock up to `limit` due jobs for this worker"""
+        now = timezone.now()
+        self.fail_abandoned(now)
+
+        if self.MAX_IN_FLIGHT:
+            # Best-effort cap: concurrent claimers can overshoot it by a few jobs
+            in_flight = AnalysisJob.objects.filter(status='running', locked_until__gte=now).count()
+            limit = min(limit, self.MAX_IN_FLIGHT - in_flight)
+            if limit <= 0:
+                return []
+
+        candidates = list(
+            AnalysisJob.objects.filter(self._claimable(now))
+            .order_by('available_at')
+            .values_list('id', flat=True)[:limit * 2]
+        )
+
+        claimed = []
+        for job_id in candidates:
+            if len(claimed) >= limit:
+                break
+            token = f'{worker_id}:{uuid.uuid4().hex[:8]}'
+            # Only one worker's UPDATE can still match the claimable condition
+            won = AnalysisJob.objects.filter(self._claimable(now), id=job_id).update(
+                status='running',
+                locked_by=token,
+                locked_until=now + timedelta(seconds=self.VISIBILITY_TIMEOUT),
+                attempts=F('attempts') + 1,
+                updated_at=now,
+            )
+            if won:
+                claimed.append(job_id)
+
+        return list(
+            AnalysisJob.objects.filter(id__in=claimed)
+            .select_related('meal__user__profile')
+            .order_by('available_at')
+        )
+
+    def process(self, job: AnalysisJob):
+        """Run a claimed job and record the outcome"""
+        # Mock-estimate fallback only once retries are used up, so transient LLM errors get retried
+        last_attempt = job.attempts >= self.MAX_ATTEMPTS
+        try:
+            # Written only while this worker still holds the job (the lock can expire mid-call)
+            MealAnalysisService.analyze(
+                job.meal, fallback=last_attempt,
+                still_owned=lambda: self._owned(job).select_for_update().exists(),
+            )
+        except Exception as e:
+            logger.warning("Analysis job %s failed (attempt %s): %s", job.id, job.attempts, e)
+            self.fail(job, e)
+        else:
+            self.complete(job)
+
+    def _owned(self, job: AnalysisJob):
+        # A worker whose lock expired must not overwrite the job's new owner
+        return AnalysisJob.objects.filter(id=job.id, locked_by=job.locked_by)
+
+    def complete(self, job: AnalysisJob):
+        self._owned(job).update(
+            status='done', locked_until=None, last_error='', updated_at=timezone.now()
+        )
+
+    def fail(self, job: AnalysisJob, error: Exception):
+        now = timezone.now()
+        with transaction.atomic():
+            if job.attempts >= self.MAX_ATTEMPTS:
+                if self._owned(job).update(
+                    status='failed', locked_until=None, last_error=str(error), updated_at=now
+                ):
+                    self._fail_meal(job.meal_id, job.meal.user_id, now)
+            else:
+                delay = self.RETRY_BACKOFF * (2 ** (job.attempts - 1))
+                self._owned(job).update(
+                    status='queued',
+                    locked_until=None,
+                    available_at=now + timedelta(seconds=delay),
+                    last_error=str(error),
+                    updated_at=now,
+                )
+
+    @staticmethod
+    def _fail_meal(meal_id: int, user_id: int, now):
+        # Nothing to flag, or invalidate, if the meal was deleted meanwhile
+        if Meal.objects.filter(id=meal_id).update(analysis_status='failed', updated_at=now):
+            invalidate(user_id, 'meals')
+
+
+class AnalysisWorker:
+    """
+    Polls a DatabaseQueue and analyzes up to `concurrency` meals at a time on threads.
+    One of those threads also runs uploaded meal imports (MealImport), one at a time.
+    """
+
+    def __init__(self, queue: Optional[DatabaseQueue] = None, concurrency: int = 4,
+                 poll_interval: float = 1.0, worker_id: Optional[str] = None, imports: bool = True):
+        self.queue = queue or DatabaseQueue()
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = worker_id or f'{os.uname().nodename}:{os.getpid()}'
+        self.imports = imports
+        self.processed = 0
+        self.imported = 0
+
+    def _run_job(self, job: AnalysisJob):
+        try:
+            self.queue.process(job)
+        finally:
+            # Worker threads hold their own connections; don't leak them
+            connection.close()
+
+    def _run_import(self, meal_import):
+        try:
+            MealImporter(meal_import).run()
+        except Exception:
+            # Logged and kept on the MealImport by run(); `import_meals --resume` continues it
+            pass
+        finally:
+            connection.close()
+
+    def run(self, once: bool = False) -> int:
+        """Process jobs until interrupted (or, with once=True, until the queue is drained)"""
+        in_flight = set()
+        importing = None
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while True:
+                free = self.concurrency - len(in_flight)
+                if free > 0:
+                    close_old_connections()
+                    for job in self.queue.claim(self.worker_id, limit=free):
+                        in_flight.add(pool.submit(self._run_job, job))
+                # Analyses come first: an import only takes a thread none of them wanted
+                if self.imports and importing not in in_flight and len(in_flight) < self.concurrency:
+                    meal_import = MealImporter.claim_queued()
+                    if meal_import is not None:
+                        importing = pool.submit(self._run_import, meal_import)
+                        in_flight.add(importing)
+
+                if not in_flight:
+                    if once:
+                        return self.processed
+                    time.sleep(self.poll_interval)
+                    continue
+
+                done, in_flight = wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future is importing:
+                        self.imported += 1
+                        continue
+                    if future.exception():
+                        logger.error("Analysis worker job crashed", exc_info=future.exception())
+                    self.processed += 1
+
+
+def get_analysis_queue() -> AnalysisQueue:
+    return import_string(settings.ANALYSIS_QUEUE_BACKEND)()
@@ -0,0 +1,408 @@
+from datetime import date, timedelta
+from itertools import groupby
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .analytics import MACRO_CALORIES, SERIES_FIELDS, STREAK_THRESHOLD, macro_ratios
+from .models import DailyProgress, MonthlyProgress, WeeklyProgress
+
+DAY_FIELDS = ('date', 'meals_count', 'adherence_score', *SERIES_FIELDS)
+
+# Longest range served as week/month buckets in one request
+MAX_ROLLUP_RANGE_DAYS = 5 * 366
+
+
+def week_start(day: date) -> date:
+    return day - timedelta(days=day.weekday())
+
+
+def week_end(start: date) -> date:
+    return start + timedelta(days=6)
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def month_end(start: date) -> date:
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+
+
+# Rollup period -> (model, first day of the period holding a date, last day from the first)
+PERIODS = {
+    'week': (WeeklyProgress, week_start, week_end),
+    'month': (MonthlyProgress, month_start, month_end),
+}
+
+
+class Span:
+    """DailyProgress rows aggregated over the consecutive calendar days start..end"""
+
+    def __init__(self, start: date, end: date):
+        self.start = start
+        self.end = end
+        self.days_tracked = 0
+        self.meals_count = 0
+        self.totals = dict.fromkeys(SERIES_FIELDS.values(), 0.0)
+        self.mins = dict.fromkeys(SERIES_FIELDS.values())
+        self.maxs = dict.fromkeys(SERIES_FIELDS.values())
+        self.adherence_total = 0.0
+        # Adherence streaks: run from the first day, run ending on the last day, longest run
+        self.head = self.tail = self.longest = 0
+
+    @property
+    def length(self) -> int:
+        return (self.end - self.start).days + 1
+
+    @classmethod
+    def from_days(cls, start: date, end: date, rows: Iterable[Dict]) -> 'Span':
+        """From DailyProgress .values(*DAY_FIELDS) rows inside start..end, ordered by date"""
+        span = cls(start, end)
+        previous = start - timedelta(days=1)
+        run = 0
+        for row in rows:
+            span.days_tracked += 1
+            span.meals_count += row['meals_count']
+            span.adherence_total += row['adherence_score']
+            for field, key in SERIES_FIELDS.items():
+                value = row[field]
+                span.totals[key] += value
+                span.mins[key] = value if span.mins[key] is None else min(span.mins[key], value)
+                span.maxs[key] = value if span.maxs[key] is None else max(span.maxs[key], value)
+
+            # Untracked days break a streak like days below the threshold do
+            if row['adherence_score'] < STREAK_THRESHOLD:
+                run = 0
+            elif row['date'] - previous == timedelta(days=1):
+                run += 1
+            else:
+                run = 1
+            if run == (row['date'] - start).days + 1:
+                span.head = run
+            span.longest = max(span.longest, run)
+            previous = row['date']
+        span.tail = run if previous == end else 0
+        return span
+
+    @classmethod
+    def from_rollup(cls, period: str, row: Dict) -> 'Span':
+        """From a WeeklyProgress/MonthlyProgress .values() row"""
+        start = row['period_start']
+        span = cls(start, PERIODS[period][2](start))
+        span.days_tracked = row['days_tracked']
+        span.meals_count = row['meals_count']
+        span.adherence_total = row['adherence_total']
+        for field, key in SERIES_FIELDS.items():
+            span.totals[key] = row[field]
+            span.mins[key] = row[f'min_{key}']
+            span.maxs[key] = row[f'max_{key}']
+        span.head, span.tail, span.longest = row['streak_head'], row['streak_tail'], row['streak_longest']
+        return span
+
+    @classmethod
+    def join(cls, spans: List['Span']) -> 'Span':
+        """One Span for consecutive spans, in order"""
+        joined = cls(spans[0].start, spans[0].start - timedelta(days=1))
+        for span in spans:
+            joined.head = joined.head if joined.head < joined.length else joined.length + span.head
+            joined.longest = max(joined.longest, span.longest, joined.tail + span.head)
+            joined.tail = span.tail if span.tail < span.length else joined.tail + span.length
+            joined.end = span.end
+            joined.days_tracked += span.days_tracked
+            joined.meals_count += span.meals_count
+            joined.adherence_total += span.adherence_total
+            for key, total in span.totals.items():
+                joined.totals[key] += total
+                if span.mins[key] is not None:
+                    joined.mins[key] = span.mins[key] if joined.mins[key] is None else min(joined.mins[key], span.mins[key])
+                    joined.maxs[key] = span.maxs[key] if joined.maxs[key] is None else max(joined.maxs[key], span.maxs[key])
+        return joined
+
+    def rollup_values(self) -> Dict:
+        values = {
+            'days_tracked': self.days_tracked,
+            'meals_count': self.meals_count,
+            'adherence_total': self.adherence_total,
+            'streak_head': self.head,
+            'streak_tail': self.tail,
+            'streak_longest': self.longest,
+        }
+        for field, key in SERIES_FIELDS.items():
+            values[field] = self.totals[key]
+            values[f'min_{key}'] = self.mins[key]
+            values[f'max_{key}'] = self.maxs[key]
+        return values
+
+
+ROLLUP_FIELDS = list(Span(date.min, date.min).rollup_values())
+
+
+def _upsert(period: str, user_id: int, spans: List[Span]):
+    model = PERIODS[period][0]
+    model.objects.bulk_create(
+        [model(user_id=user_id, period_start=span.start, is_stale=False, **span.rollup_values()) for span in spans],
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['user', 'period_start'],
+        update_fields=ROLLUP_FIELDS + ['is_stale', 'updated_at'],
+    )
+
+
+def _period_spans(period: str, starts: Iterable[date], rows: List[Dict]) -> List[Span]:
+    """A Span for each period starting on `starts`, from date-ordered day rows"""
+    _, first_day, end_of = PERIODS[period]
+    rows_by_period = {
+        start: list(period_rows) for start, period_rows in groupby(rows, key=lambda row: first_day(row['date']))
+    }
+    return [Span.from_days(start, end_of(start), rows_by_period.get(start, [])) for start in sorted(starts)]
+
+
+def mark_rollups_stale(user_id: int, dates: Iterable[date]):
+    """
+    Flag the weeks/months holding these days; their next read recomputes them (load_spans).
+    Only rows that change are written: a period already stale is just locked, so a read
+    can't store a sum taken before this write commits. A period with no row yet gets a
+    stale one, for the same reason.
+    """
+    dates = set(dates)
+    now = timezone.now()
+    with transaction.atomic(savepoint=False):
+        for period, (model, first_day, _) in PERIODS.items():
+            starts = {first_day(day) for day in dates}
+            rows = dict(
+                model.objects.select_for_update()
+                .filter(user_id=user_id, period_start__in=starts)
+                .values_list('period_start', 'is_stale')
+            )
+            current = [start for start, stale in rows.items() if not stale]
+            if current:
+                model.objects.filter(user_id=user_id, period_start__in=current).update(is_stale=True, updated_at=now)
+            missing = sorted(starts - rows.keys())
+            if missing:
+                # An upsert: a read may be inserting the period meanwhile
+                model.objects.bulk_create(
+                    [model(user_id=user_id, period_start=start, is_stale=True) for start in missing],
+                    update_conflicts=True,
+                    unique_fields=['user', 'period_start'],
+                    update_fields=['is_stale', 'updated_at'],
+                )
+
+
+def rebuild_rollups(user_ids: List[int], start: Optional[date] = None, end: Optional[date] = None) -> int:
+    """
+    Recompute every week and month of these users that overlaps start..end from one read of
+    their DailyProgress rows; periods whose days are all gone are emptied. Returns rows written.
+    """
+    if start is not None:
+        start = min(week_start(start), month_start(start))
+    if end is not None:
+        end = max(week_end(week_start(end)), month_end(month_start(end)))
+
+    days = DailyProgress.objects.filter(user_id__in=user_ids)
+    if start is not None:
+        days = days.filter(date__gte=start)
+    if end is not None:
+        days = days.filter(date__lte=end)
+    rows_by_user = {
+        user_id: list(rows)
+        for user_id, rows in groupby(
+            days.order_by('user_id', 'date').values('user_id', *DAY_FIELDS).iterator(chunk_size=5000),
+            key=lambda row: row['user_id'],
+        )
+    }
+
+    written = 0
+    for period, (model, first_day, _) in PERIODS.items():
+        existing = model.objects.filter(user_id__in=user_ids)
+        if start is not None:
+            existing = existing.filter(period_start__gte=start)
+        if end is not None:
+            existing = existing.filter(period_start__lte=end)
+        starts = {}
+        for user_id, period_start in existing.values_list('user_id', 'period_start'):
+            starts.setdefault(user_id, set()).add(period_start)
+        for user_id, rows in rows_by_user.items():
+            starts.setdefault(user_id, set()).update(first_day(row['date']) for row in rows)
+
+        for user_id, period_starts in starts.items():
+            spans = _period_spans(period, period_starts, rows_by_user.get(user_id, []))
+            _upsert(period, user_id, spans)
+            written += len(spans)
+    return written
+
+
+def cover(start: date, end: date) -> List[Tuple[str, date, date]]:
+    """
+    start..end as whole months, then whole weeks, then single days, in order:
+    ('month'|'week'|'days', first, last). A year is ~12 months plus a few weeks and days.
+    """
+    pieces = []
+    day = start
+    while day <= end:
+        if day.day == 1 and month_end(day) <= end:
+            pieces.append(('month', day, month_end(day)))
+        elif day.weekday() == 0 and week_end(day) <= end:
+            pieces.append(('week', day, week_end(day)))
+        elif pieces and pieces[-1][0] == 'days':
+            pieces[-1] = ('days', pieces[-1][1], day)
+        else:
+            pieces.append(('days', day, day))
+        day = pieces[-1][2] + timedelta(days=1)
+    return pieces
+
+
+def load_spans(user, pieces: List[Tuple[str, date, date]]) -> List[Span]:
+    """
+    A Span per piece from cover(): months and weeks from their rollups, days from DailyProgress.
+    A rollup that is missing or stale is read from its days instead and stored back for the
+    next read. At most three queries, plus those writes.
+    """
+    spans = {}
+    fallback = []
+    # (period, first day, whether a row exists)
+    recomputed = []
+    for period, (model, _, _) in PERIODS.items():
+        wanted = [(first, last) for kind, first, last in pieces if kind == period]
+        if not wanted:
+            continue
+        rows = {
+            row['period_start']: row
+            for row in model.objects.filter(user=user, period_start__in=[first for first, _ in wanted])
+            .values('period_start', 'is_stale', *ROLLUP_FIELDS)
+        }
+        for first, last in wanted:
+            row = rows.get(first)
+            if row is None or row['is_stale']:
+                fallback.append((first, last))
+                recomputed.append((period, first, row is not None))
+            else:
+                spans[first] = Span.from_rollup(period, row)
+
+    ranges = fallback + [(first, last) for kind, first, last in pieces if kind == 'days']
+    if not ranges:
+        return [spans[first] for _, first, _ in pieces]
+
+    with transaction.atomic():
+        # Periods a write is flagging right now stay stale: their sum may miss it
+        storable = _lock_recomputed(user, recomputed)
+        dates = Q()
+        for first, last in ranges:
+            dates |= Q(date__gte=first, date__lte=last)
+        rows = list(DailyProgress.objects.filter(dates, user=user).order_by('date').values(*DAY_FIELDS))
+        for first, last in ranges:
+            spans[first] = Span.from_days(first, last, [row for row in rows if first <= row['date'] <= last])
+        _store_recomputed(user, storable, spans)
+    return [spans[first] for _, first, _ in pieces]
+
+
+def _lock_recomputed(user, recomputed: List[Tuple[str, date, bool]]) -> List[Tuple[str, date, bool]]:
+    """
+    The recomputed periods this read may store: stale rows it could lock without waiting
+    (mark_rollups_stale holds the lock until its write commits) and missing ones
+    """
+    storable = [(period, first, False) for period, first, exists in recomputed if not exists]
+    for period, (model, _, _) in PERIODS.items():
+        stale = [first for kind, first, exists in recomputed if kind == period and exists]
+        if stale:
+            locked = (
+                model.objects.select_for_update(skip_locked=True)
+                .filter(user=user, period_start__in=stale, is_stale=True)
+                .values_list('period_start', flat=True)
+            )
+            storable += [(period, first, True) for first in locked]
+    return storable
+
+
+def _store_recomputed(user, storable: List[Tuple[str, date, bool]], spans: Dict[date, Span]):
+    """
+    Save rollups load_spans summed from their days, under its locks. A missing one is only
+    inserted if still missing; a write flagging it meanwhile waits for this one to commit.
+    """
+    now = timezone.now()
+    for period, (model, _, _) in PERIODS.items():
+        missing = []
+        for kind, first, exists in sorted(storable):
+            if kind != period:
+                continue
+            values = spans[first].rollup_values()
+            if exists:
+                model.objects.filter(user=user, period_start=first).update(is_stale=False, updated_at=now, **values)
+            else:
+                missing.append(model(user=user, period_start=first, is_stale=False, **values))
+        if missing:
+            model.objects.bulk_create(missing, batch_size=500, ignore_conflicts=True)
+
+
+def _bucket(span: Span) -> Dict:
+    tracked = span.days_tracked or 1
+    return {
+        'start': span.start.isoformat(),
+        'end': span.end.isoformat(),
+        'days_tracked': span.days_tracked,
+        'meals_count': span.meals_count,
+        # Means over tracked days, like the daily summary
+        **{key: round(total / tracked, 1) for key, total in span.totals.items()},
+        'adherence_score': round(span.adherence_total / tracked, 1),
+    }
+
+
+def rollup_report(user, start: date, end: date, granularity: str) -> Dict:
+    """
+    progress_report with one entry per calendar week or month (clipped to start..end)
+    instead of per day. Whole months and weeks come from their rollups and only the
+    ragged edges from DailyProgress, so a year is a few dozen rows instead of 365.
+    """
+    first_day, end_of = PERIODS[granularity][1:]
+    buckets = []
+    day = start
+    while day <= end:
+        last = min(end_of(first_day(day)), end)
+        buckets.append((day, last))
+        day = last + timedelta(days=1)
+
+    # The last day stays its own piece: whether it was tracked decides the current streak
+    pieces = []
+    for first, last in buckets[:-1]:
+        pieces.append(cover(first, last))
+    first, last = buckets[-1]
+    pieces.append(cover(first, last - timedelta(days=1)) + [('days', end, end)])
+
+    spans = load_spans(user, [piece for bucket in pieces for piece in bucket])
+    bucket_spans = []
+    for bucket in pieces:
+        bucket_spans.append(Span.join(spans[:len(bucket)]))
+        last_spans, spans = spans[:len(bucket)], spans[len(bucket):]
+
+    report = {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'granularity': granularity,
+        'progress': [_bucket(span) for span in bucket_spans if span.days_tracked],
+        'summary': None,
+    }
+    total = Span.join(bucket_spans)
+    if not total.days_tracked:
+        return report
+
+    # As adherence_streaks: the current run may end today or, before today's meals, yesterday
+    if last_spans[-1].days_tracked:
+        current = total.tail
+    else:
+        current = Span.join(bucket_spans[:-1] + last_spans[:-1]).tail if total.length > 1 else 0
+
+    summary = {
+        'period_days': total.length,
+        'days_tracked': total.days_tracked,
+        'avg_adherence': round(total.adherence_total / total.days_tracked, 1),
+        'streaks': {'current': current, 'longest': total.longest, 'threshold': STREAK_THRESHOLD},
+        'macro_ratios': macro_ratios({macro: total.totals[macro] for macro in MACRO_CALORIES}),
+    }
+    for key, value in total.totals.items():
+        summary[f'avg_{key}'] = round(value / total.days_tracked, 1)
+        summary[f'min_{key}'] = round(total.mins[key], 1)
+        summary[f'max_{key}'] = round(total.maxs[key], 1)
+    report['summary'] = summary
+    return report
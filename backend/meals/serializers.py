@@ -1,3 +1,4 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
 from .models import Meal, Food, MealFood, Recommendation
 
@@ -18,16 +19,68 @@ class MealFoodSerializer(serializers.ModelSerializer):
 
 class MealSerializer(serializers.ModelSerializer):
     foods = MealFoodSerializer(many=True, read_only=True)
+
+    def __init__(self, *args, **kwargs):
+        # Fields left out of the output, e.g. columns the list query deferred
+        omit = kwargs.pop('omit', ())
+        super().__init__(*args, **kwargs)
+        for name in omit:
+            self.fields.pop(name, None)
     
     class Meta:
         model = Meal
         fields = [
             'id', 'meal_type', 'description', 'logged_at',
             'total_calories', 'total_protein', 'total_carbs', 
-            'total_fat', 'total_fiber', 'ai_confidence', 'foods'
+            'total_fat', 'total_fiber', 'ai_confidence', 'analysis_status', 'foods'
         ]
         read_only_fields = ['logged_at', 'total_calories', 'total_protein', 
-                           'total_carbs', 'total_fat', 'total_fiber', 'ai_confidence']
+                           'total_carbs', 'total_fat', 'total_fiber', 'ai_confidence',
+                           'analysis_status']
+
+# Read-only fast path: the same output as MealSerializer(many=True).data, built as plain
+# dicts straight from the model instances, without DRF's per-field machinery
+_datetime_field = serializers.DateTimeField()
+
+
+def foods_prefetch():
+    """Prefetch for meal.foods (and each food) loading only the columns MealSerializer shows"""
+    meal_food_fields = [name for name in MealFoodSerializer.Meta.fields if name != 'food']
+    food_fields = [f'food__{name}' for name in FoodSerializer.Meta.fields]
+    meal_foods = (
+        MealFood.objects.select_related('food')
+        .only('meal_id', 'food_id', *meal_food_fields, *food_fields)
+        .order_by('id')
+    )
+    return Prefetch('foods', queryset=meal_foods)
+
+
+def _food_data(food):
+    return {name: getattr(food, name) for name in FoodSerializer.Meta.fields}
+
+
+def _meal_food_data(meal_food):
+    return {
+        name: _food_data(meal_food.food) if name == 'food' else getattr(meal_food, name)
+        for name in MealFoodSerializer.Meta.fields
+    }
+
+
+def meal_list_data(meals, omit=()):
+    """MealSerializer output for `meals`, which should come with foods_prefetch()"""
+    fields = [name for name in MealSerializer.Meta.fields if name not in omit]
+    data = []
+    for meal in meals:
+        row = {}
+        for name in fields:
+            if name == 'foods':
+                row[name] = [_meal_food_data(meal_food) for meal_food in meal.foods.all()]
+            elif name == 'logged_at':
+                row[name] = _datetime_field.to_representation(meal.logged_at)
+            else:
+                row[name] = getattr(meal, name)
+        data.append(row)
+    return data
 
 class MealCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -1,21 +1,43 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from decouple import config
+from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models import Sum
+from django.utils.dateparse import parse_datetime
+from django.db import connection, transaction
+from django.db.models import Case, Count, DecimalField, F, FloatField, Sum, Value, When
+from django.db.models.functions import Cast, Greatest, Least, Round
+from django.db.models.lookups import GreaterThan
 from datetime import timedelta
-from .models import Meal, DailyProgress
+from accounts.response_cache import invalidate
+from .models import Meal, MealFood, DailyProgress
+from .rollups import mark_rollups_stale, rebuild_rollups
+
+logger = logging.getLogger(__name__)
 
 class ProgressTrackingService:
     """Service to calculate and track daily progress"""
+
+    # Meal columns summed into DailyProgress (same names on both models)
+    TOTAL_FIELDS = ('total_calories', 'total_protein', 'total_carbs', 'total_fat', 'total_fiber')
     
     @staticmethod
     def update_daily_progress(user, date=None):
-        """Calculate and update daily progress for a given date"""
+        """
+        Recompute a day's progress from all of its meals.
+        Meal signals keep rows current incrementally; this is the full rebuild used for repairs.
+        """
+        # Get user's goals
+        profile = user.profile
+        
         if date is None:
-            date = timezone.now().date()
+            date = profile.local_date()
         
         # Get all meals for the day
         meals = Meal.objects.filter(
             user=user,
-            logged_at__date=date
+            logged_date=date
         )
         
         # Calculate totals
@@ -25,11 +47,9 @@ class ProgressTrackingService:
             total_carbs=Sum('total_carbs'),
             total_fat=Sum('total_fat'),
             total_fiber=Sum('total_fiber'),
+            meals_count=Count('id'),
         )
         
-        # Get user's goals
-        profile = user.profile
-        
         # Create or update daily progress
         progress, created = DailyProgress.objects.update_or_create(
             user=user,
@@ -44,19 +64,265 @@ class ProgressTrackingService:
                 'goal_protein': profile.daily_protein_goal,
                 'goal_carbs': profile.daily_carbs_goal,
                 'goal_fat': profile.daily_fat_goal,
-                'meals_count': meals.count(),
+                'meals_count': totals['meals_count'],
+                'is_stale': False,
             }
         )
         
         progress.calculate_adherence()
         progress.save()
+        mark_rollups_stale(user.id, [date])
+        invalidate(user.id, 'progress')
         
         return progress
     
+    @classmethod
+    def meal_contribution(cls, values):
+        """
+        (user_id, date, totals) a meal adds to DailyProgress, from a dict of its field values.
+        None when a needed field wasn't loaded (deferred).
+        """
+        if 'user_id' not in values or values.get('logged_date') is None:
+            return None
+        if any(field not in values for field in cls.TOTAL_FIELDS):
+            return None
+        return (
+            values['user_id'],
+            values['logged_date'],
+            tuple(values[field] or 0 for field in cls.TOTAL_FIELDS),
+        )
+
+    @classmethod
+    def apply_meal_change(cls, old, new, user=None):
+        """
+        Move a meal's contribution from `old` to `new` (either may be None for a
+        create/delete) with F() updates instead of re-aggregating the day
+        """
+        if old and new and old[:2] == new[:2]:
+            deltas = tuple(n - o for n, o in zip(new[2], old[2]))
+            if any(deltas):
+                cls.apply_delta(new[0], new[1], deltas, 0, user=user, create=False)
+            return
+
+        if old:
+            cls.apply_delta(old[0], old[1], tuple(-v for v in old[2]), -1, user=user, create=False)
+        if new:
+            cls.apply_delta(new[0], new[1], new[2], 1, user=user)
+
+    @staticmethod
+    def _goals(user_id, user=None):
+        """The profile's goals, without a query when the profile is already loaded"""
+        from accounts.models import UserProfile
+
+        if user is not None and user.id == user_id and 'profile' in user._state.fields_cache:
+            profile = user._state.fields_cache['profile']
+            return {
+                'goal_calories': profile.daily_calorie_goal,
+                'goal_protein': profile.daily_protein_goal,
+                'goal_carbs': profile.daily_carbs_goal,
+                'goal_fat': profile.daily_fat_goal,
+            }
+
+        goals = UserProfile.objects.filter(user_id=user_id).values(
+            goal_calories=F('daily_calorie_goal'),
+            goal_protein=F('daily_protein_goal'),
+            goal_carbs=F('daily_carbs_goal'),
+            goal_fat=F('daily_fat_goal'),
+        ).first()
+        return goals or {'goal_calories': None, 'goal_protein': None, 'goal_carbs': None, 'goal_fat': None}
+
+    @staticmethod
+    def adherence_expression(calories, protein, goal_calories, goal_protein):
+        """DailyProgress.calculate_adherence as a SQL expression over the updated totals"""
+        cal_adherence = Least(Value(100.0), calories * Value(100.0 / goal_calories))
+        protein_adherence = Value(100.0)
+        if goal_protein:
+            protein_adherence = Least(Value(100.0), protein * Value(100.0 / goal_protein))
+
+        adherence = (cal_adherence + protein_adherence) / Value(2.0)
+        adherence = Case(
+            # Penalize if going too far over calorie goal
+            When(GreaterThan(calories, Value(goal_calories * 1.2)), then=adherence * Value(0.8)),
+            default=adherence,
+            output_field=FloatField(),
+        )
+        # Round() with a precision needs numeric on PostgreSQL
+        return Cast(
+            Round(Cast(adherence, DecimalField(max_digits=12, decimal_places=4)), 1),
+            FloatField(),
+        )
+
+    @classmethod
+    def apply_delta(cls, user_id, date, deltas, meals_delta, user=None, create=True):
+        """
+        Add meal totals to one day's DailyProgress row atomically.
+        A missing row is rebuilt from the day's meals, for additions only; a delta alone can't.
+        """
+        goals = cls._goals(user_id, user)
+        updates = {
+            field: F(field) + Value(float(delta))
+            for field, delta in zip(cls.TOTAL_FIELDS, deltas)
+        }
+        updates['meals_count'] = Greatest(F('meals_count') + Value(meals_delta), Value(0))
+        updates.update(goals)
+        updates['updated_at'] = timezone.now()
+        if goals['goal_calories']:
+            # Without a calorie goal calculate_adherence leaves the score alone; so do we
+            updates['adherence_score'] = cls.adherence_expression(
+                updates['total_calories'], updates['total_protein'],
+                goals['goal_calories'], goals['goal_protein'],
+            )
+
+        if DailyProgress.objects.filter(user_id=user_id, date=date).update(**updates):
+            mark_rollups_stale(user_id, [date])
+            invalidate(user_id, 'progress')
+            return
+        if create:
+            # No row yet, or one removed since: the day may hold other meals, so sum them all
+            cls.recompute_day(user_id, date, user=user)
+
+    @classmethod
+    def recompute_day(cls, user_id, date, user=None):
+        """update_daily_progress by user id, reusing `user` when it is that user"""
+        if user is None or user.id != user_id:
+            user = User.objects.select_related('profile').filter(id=user_id).first()
+            if user is None:
+                return None
+        return cls.update_daily_progress(user, date)
+
+    @staticmethod
+    def mark_stale(user_id, dates):
+        """Flag days whose meals changed without the Meal signals (bulk writes)"""
+        dates = list(dates)
+        DailyProgress.objects.filter(user_id=user_id, date__in=dates).update(
+            is_stale=True, updated_at=timezone.now()
+        )
+        mark_rollups_stale(user_id, dates)
+        # Called because meals were written in bulk: cached meal lists are out of date too
+        invalidate(user_id, 'meals', 'progress')
+
+    # Columns a rebuild writes; created_at is left alone on existing rows
+    REBUILT_FIELDS = TOTAL_FIELDS + (
+        'goal_calories', 'goal_protein', 'goal_carbs', 'goal_fat',
+        'meals_count', 'adherence_score', 'is_stale', 'updated_at',
+    )
+
+    @classmethod
+    def rebuild_progress(cls, user_ids, start=None, end=None):
+        """
+        update_daily_progress for many users and days at once: one grouped aggregate over
+        their meals, one read of their goals and existing days, one upsert. Days that have
+        a row but no meals any more are zeroed, as a per-day rebuild would; rows that
+        already hold the right values are left alone. Weekly/monthly rollups are rebuilt
+        when anything changed. Returns (days checked, rows written).
+        """
+        from accounts.models import UserProfile
+
+        meals = Meal.objects.filter(user_id__in=user_ids)
+        existing = DailyProgress.objects.filter(user_id__in=user_ids)
+        if start is not None:
+            meals = meals.filter(logged_date__gte=start)
+            existing = existing.filter(date__gte=start)
+        if end is not None:
+            meals = meals.filter(logged_date__lte=end)
+            existing = existing.filter(date__lte=end)
+
+        totals = {
+            (row.pop('user_id'), row.pop('logged_date')): row
+            for row in meals.order_by().values('user_id', 'logged_date').annotate(
+                meals_count=Count('id'),
+                **{field: Sum(field) for field in cls.TOTAL_FIELDS}
+            )
+        }
+        # Compared on REBUILT_FIELDS minus updated_at: rows that come out the same aren't written
+        compared = cls.REBUILT_FIELDS[:-1]
+        current = {
+            (row[0], row[1]): row[2:]
+            for row in existing.values_list('user_id', 'date', *compared)
+        }
+        days = set(totals).union(current)
+        if not days:
+            return 0, 0
+
+        goals = {
+            row.pop('user_id'): row
+            for row in UserProfile.objects.filter(user_id__in=user_ids).values(
+                'user_id',
+                goal_calories=F('daily_calorie_goal'),
+                goal_protein=F('daily_protein_goal'),
+                goal_carbs=F('daily_carbs_goal'),
+                goal_fat=F('daily_fat_goal'),
+            )
+        }
+        no_goals = dict.fromkeys(('goal_calories', 'goal_protein', 'goal_carbs', 'goal_fat'))
+        empty_day = dict.fromkeys(cls.TOTAL_FIELDS, 0) | {'meals_count': 0}
+
+        rows = []
+        for user_id, date in days:
+            day = totals.get((user_id, date), empty_day)
+            progress = DailyProgress(
+                user_id=user_id,
+                date=date,
+                meals_count=day['meals_count'],
+                **{field: day[field] or 0 for field in cls.TOTAL_FIELDS},
+                **goals.get(user_id, no_goals),
+            )
+            # The model's own formula, so a changed calculate_adherence is what gets applied
+            progress.calculate_adherence()
+            if current.get((user_id, date)) != tuple(getattr(progress, field) for field in compared):
+                rows.append(progress)
+
+        DailyProgress.objects.bulk_create(
+            rows,
+            batch_size=1000,
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=list(cls.REBUILT_FIELDS),
+        )
+        if rows:
+            rebuild_rollups(user_ids, start, end)
+        for user_id in {progress.user_id for progress in rows}:
+            invalidate(user_id, 'progress')
+        return len(days), len(rows)
+
+    @classmethod
+    def get_daily_totals(cls, user, date):
+        """
+        The day's totals from its DailyProgress row, or from one aggregate over the
+        day's meals when the row is missing or stale. `source` says which was used.
+        """
+        row = DailyProgress.objects.filter(user=user, date=date).values(
+            'meals_count', 'updated_at', 'is_stale', *cls.TOTAL_FIELDS
+        ).first()
+        if row and not row['is_stale']:
+            row['source'] = 'rollup'
+            row['as_of'] = row['updated_at']
+            return row
+
+        totals = Meal.objects.filter(user=user, logged_date=date).aggregate(
+            meals_count=Count('id'),
+            **{field: Sum(field) for field in cls.TOTAL_FIELDS}
+        )
+        for field in cls.TOTAL_FIELDS:
+            totals[field] = totals[field] or 0
+        totals['source'] = 'aggregate'
+        totals['as_of'] = timezone.now()
+        return totals
+
+    @staticmethod
+    def get_daily_progress(user, date=None):
+        """The day's DailyProgress row, kept current by the Meal signals"""
+        if date is None:
+            date = user.profile.local_date()
+        progress = DailyProgress.objects.filter(user=user, date=date).first()
+        if progress is None:
+            progress = ProgressTrackingService.update_daily_progress(user, date)
+        return progress
+
     @staticmethod
     def get_weekly_progress(user):
         """Get progress for the last 7 days"""
-        today = timezone.now().date()
+        today = user.profile.local_date()
         week_ago = today - timedelta(days=7)
         
         progress_records = DailyProgress.objects.filter(
@@ -70,7 +336,7 @@ class ProgressTrackingService:
     @staticmethod
     def get_monthly_progress(user):
         """Get progress for the last 30 days"""
-        today = timezone.now().date()
+        today = user.profile.local_date()
         month_ago = today - timedelta(days=30)
         
         progress_records = DailyProgress.objects.filter(
@@ -83,27 +349,178 @@ class ProgressTrackingService:
     
     @staticmethod
     def get_progress_summary(user, days=7):
-        """Get summary statistics for the period"""
-        today = timezone.now().date()
-        start_date = today - timedelta(days=days)
-        
-        progress_records = DailyProgress.objects.filter(
-            user=user,
-            date__gte=start_date,
-            date__lte=today
-        )
-        
-        if not progress_records.exists():
-            return None
-        
-        avg_calories = progress_records.aggregate(avg=Sum('total_calories'))['avg'] / days
-        avg_protein = progress_records.aggregate(avg=Sum('total_protein'))['avg'] / days
-        avg_adherence = progress_records.aggregate(avg=Sum('adherence_score'))['avg'] / days
-        
+        """Get summary statistics for the period (see meals.analytics for the full report)"""
+        from .analytics import progress_for_last_days
+        return progress_for_last_days(user, days)['summary']
+
+class MealAnalysisService:
+    """Fill in a meal's nutrition from the parser + AI and roll it into DailyProgress"""
+
+    BATCH_MAX_ITEMS = config('MEAL_BATCH_MAX_ITEMS', default=100, cast=int)
+    # Analyses in flight at once per batch request (each may be an OpenAI round trip)
+    BATCH_CONCURRENCY = config('MEAL_BATCH_CONCURRENCY', default=4, cast=int)
+
+    @staticmethod
+    def meal_fields(analysis, parsed_foods):
+        """Meal columns for an analysis result"""
         return {
-            'period_days': days,
-            'avg_calories': round(avg_calories, 1) if avg_calories else 0,
-            'avg_protein': round(avg_protein, 1) if avg_protein else 0,
-            'avg_adherence': round(avg_adherence, 1) if avg_adherence else 0,
-            'days_tracked': progress_records.count(),
-        }
\ No newline at end of file
+            'total_calories': analysis['calories'],
+            'total_protein': analysis['protein'],
+            'total_carbs': analysis['carbs'],
+            'total_fat': analysis['fat'],
+            'total_fiber': analysis['fiber'],
+            'ai_confidence': analysis['confidence_score'],
+            'ai_analysis_raw': {'analysis': analysis, 'parsed_foods': parsed_foods},
+        }
+
+    @staticmethod
+    def meal_foods(meal, analysis):
+        """Unsaved MealFood rows for the foods the local engine resolved (none for LLM answers)"""
+        return [
+            MealFood(
+                meal=meal,
+                food_id=item['food_id'],
+                quantity_grams=item['quantity_grams'],
+                calories=item['calories'],
+                protein=item['protein'],
+                carbs=item['carbs'],
+                fat=item['fat'],
+            )
+            for item in analysis.get('foods', ())
+        ]
+
+    @staticmethod
+    def save_foods(meal, analysis):
+        # Values are already scaled, so skip MealFood.save() and its per-row Food lookup
+        MealFood.objects.bulk_create(MealAnalysisService.meal_foods(meal, analysis))
+
+    @staticmethod
+    def analyze(meal, fallback=True, still_owned=None):
+        """
+        Analyze a saved (pending) meal in place and update the day's progress.
+        With fallback=False an OpenAI failure raises so the caller can retry.
+        The result is only written while the meal is still pending (and, for queue workers,
+        while still_owned() says the job lock is held); otherwise returns None without writing,
+        so two workers on one meal can't both add its totals to the day.
+        """
+        from nutrition.meal_parser import MealParser
+        from nutrition.ai_service import NutritionAI
+
+        parsed_foods = MealParser.parse_meal(meal.description)
+        analysis = NutritionAI().analyze_meal(meal.description, parsed_foods, fallback=fallback)
+
+        fields = MealAnalysisService.meal_fields(analysis, parsed_foods)
+        fields['analysis_status'] = 'complete'
+        for field, value in fields.items():
+            setattr(meal, field, value)
+        with transaction.atomic():
+            # Row lock: a second analysis of this meal waits here, then sees it's no longer pending
+            pending = Meal.objects.select_for_update().filter(id=meal.id, analysis_status='pending').exists()
+            if not pending or (still_owned is not None and not still_owned()):
+                logger.info("Meal %s was analyzed elsewhere; dropping this result", meal.id)
+                return None
+            # The Meal post_save signal adds the new totals to the day's progress
+            meal.save(update_fields=list(fields) + ['updated_at'])
+            meal.foods.all().delete()
+            MealAnalysisService.save_foods(meal, analysis)
+
+        progress = ProgressTrackingService.get_daily_progress(meal.user, meal.logged_date)
+        return analysis, parsed_foods, progress
+
+    @staticmethod
+    def _batch_meal(user, item):
+        """Unsaved Meal for one batch item, or raises ValueError with the reason"""
+        if not isinstance(item, dict):
+            raise ValueError('Each meal must be an object')
+        description = str(item.get('description') or '').strip()
+        if not description:
+            raise ValueError('Meal description required')
+        meal_type = item.get('meal_type') or 'snack'
+        if meal_type not in dict(Meal.MEAL_TYPES):
+            raise ValueError(f'Unknown meal_type: {meal_type}')
+
+        logged_at = timezone.now()
+        if item.get('logged_at'):
+            logged_at = parse_datetime(str(item['logged_at']))
+            if logged_at is None:
+                raise ValueError('logged_at must be an ISO 8601 timestamp')
+            if timezone.is_naive(logged_at):
+                # Wall-clock time where the user is
+                logged_at = timezone.make_aware(logged_at, user.profile.tzinfo)
+
+        meal = Meal(user=user, description=description, meal_type=meal_type, logged_at=logged_at)
+        # bulk_create skips Meal.save(), which would fill this in
+        meal.logged_date = meal.compute_logged_date()
+        return meal
+
+    @staticmethod
+    def _analyze_in_thread(description, parsed_foods):
+        from nutrition.ai_service import NutritionAI
+
+        try:
+            return NutritionAI().analyze_meal(description, parsed_foods)
+        finally:
+            # Pool threads hold their own connections (local engine lookups); don't leak them
+            connection.close()
+
+    @classmethod
+    def analyze_batch(cls, user, items):
+        """
+        Analyze and save many meals for one user: parsing and analysis share the parser memo
+        and result caches and run BATCH_CONCURRENCY at a time, meals and their foods are
+        written with bulk_create, and each affected day's progress is recomputed once.
+        Returns one result per item, in order; invalid or failed items don't stop the rest.
+        """
+        from nutrition.meal_parser import MealParser
+
+        results = [None] * len(items)
+        meals = {}
+        for index, item in enumerate(items):
+            try:
+                meals[index] = cls._batch_meal(user, item)
+            except ValueError as e:
+                results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+
+        indexes = list(meals)
+        parsed = MealParser.parse_many(meals[index].description for index in indexes)
+        with ThreadPoolExecutor(max_workers=max(1, cls.BATCH_CONCURRENCY)) as pool:
+            futures = [
+                pool.submit(cls._analyze_in_thread, meals[index].description, parsed_foods)
+                for index, parsed_foods in zip(indexes, parsed)
+            ]
+
+        analyses = {}
+        for index, parsed_foods, future in zip(indexes, parsed, futures):
+            try:
+                analysis = future.result()
+            except Exception as e:
+                results[index] = {'index': index, 'status': 'error', 'error': str(e)}
+                del meals[index]
+                continue
+            for field, value in cls.meal_fields(analysis, parsed_foods).items():
+                setattr(meals[index], field, value)
+            analyses[index] = analysis
+
+        with transaction.atomic():
+            created = Meal.objects.bulk_create(list(meals.values()))
+            MealFood.objects.bulk_create([
+                meal_food
+                for index, meal in zip(meals, created)
+                for meal_food in cls.meal_foods(meal, analyses[index])
+            ])
+            # bulk_create sends no Meal signals: rebuild each affected day once
+            for day in sorted({meal.logged_date for meal in created}):
+                ProgressTrackingService.update_daily_progress(user, day)
+            invalidate(user.id, 'meals')
+
+        for index, meal in zip(meals, created):
+            analysis = analyses[index]
+            results[index] = {
+                'index': index,
+                'status': 'created',
+                'meal_id': meal.id,
+                'logged_at': meal.logged_at.isoformat(),
+                'analysis': {key: analysis[key] for key in ('calories', 'protein', 'carbs', 'fat', 'fiber')},
+                'confidence_score': analysis['confidence_score'],
+            }
+        return results
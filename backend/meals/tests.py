@@ -1,3 +1,625 @@
-from django.test import TestCase
+import os
+import tempfile
+import uuid
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.handlers.asgi import ASGIHandler
+from django.http import HttpResponseNotFound
+from django.conf import settings
+from django.db.models import Count, Sum
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from accounts.models import UserProfile
+from config.middleware import AsyncWhiteNoiseMiddleware
+
+from .analytics import progress_report
+from .importer import MealImporter
+from .models import AnalysisJob, DailyProgress, Food, Meal, MealFood, MealImport, MonthlyProgress, WeeklyProgress
+from .queue import AnalysisQueue, AnalysisWorker, DatabaseQueue
+from .rollups import PERIODS, mark_rollups_stale, rebuild_rollups, rollup_report
+from .serializers import MealSerializer, foods_prefetch, meal_list_data
+from .views import MealViewSet
+
+
+class MealViewSetQueryTests(TestCase):
+    """Listing meals costs the same number of queries whatever the page size"""
+
+    # One for the page of meals, one for their foods joined to Food
+    LIST_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('eater', password='pw12345xyz')
+        foods = [
+            Food.objects.create(name=name, calories_per_100g=calories, protein_per_100g=protein)
+            for name, calories, protein in [('rice', 130, 2.7), ('chicken', 165, 31), ('broccoli', 34, 2.8)]
+        ]
+        for i in range(25):
+            meal = Meal.objects.create(user=cls.user, meal_type='lunch', description=f'meal {i}')
+            for food in foods[:1 + i % 3]:
+                MealFood.objects.create(meal=meal, food=food, quantity_grams=100 + i)
+
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def _get(self, params=None, action='list', **kwargs):
+        request = self.factory.get('/api/meals/', params or {})
+        force_authenticate(request, self.user)
+        return MealViewSet.as_view({'get': action})(request, **kwargs)
+
+    def test_list_query_count_is_independent_of_page_size(self):
+        for page_size in (1, 5, 20):
+            with self.subTest(page_size=page_size), self.assertNumQueries(self.LIST_QUERIES):
+                response = self._get({'page_size': page_size})
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_later_pages_cost_the_same(self):
+        response = self._get({'page_size': 10})
+        cursor = response.data['next'].split('cursor=')[1].split('&')[0]
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self._get({'page_size': 10, 'cursor': cursor})
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_retrieve_prefetches_foods(self):
+        meal = Meal.objects.filter(user=self.user).order_by('id').last()
+        with self.assertNumQueries(self.LIST_QUERIES):
+            response = self._get(action='retrieve', pk=meal.pk)
+        self.assertEqual(len(response.data['foods']), meal.foods.count())
+
+    def test_fast_path_matches_serializer(self):
+        meals = Meal.objects.filter(user=self.user).order_by('-logged_at', '-id').prefetch_related(foods_prefetch())
+        for omit in ((), ('description',)):
+            with self.subTest(omit=omit):
+                expected = MealSerializer(meals, many=True, omit=omit).data
+                self.assertEqual(meal_list_data(meals, omit=omit), expected)
+
+    def test_list_includes_description_by_default(self):
+        self.assertEqual(self._get({'page_size': 1}).data['results'][0]['description'], 'meal 24')
+
+    def test_fields_trims_the_list(self):
+        with self.assertNumQueries(1):
+            response = self._get({'fields': 'id,logged_at,total_calories'})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'logged_at', 'total_calories'})
+
+    def test_json_list_includes_description_unless_trimmed(self):
+        self.client.force_login(self.user)
+        row = self.client.get('/api/meals/', {'page_size': 1}, secure=True).json()['results'][0]
+        self.assertEqual(row['description'], 'meal 24')
+        row = self.client.get('/api/meals/', {'page_size': 1, 'fields': 'id,total_calories'}, secure=True).json()['results'][0]
+        self.assertEqual(set(row), {'id', 'total_calories'})
+
+
+class AsgiMiddlewareTests(SimpleTestCase):
+    """Under ASGI every middleware runs async, so the async analyze view never holds a thread"""
+
+    def test_every_middleware_is_async_capable(self):
+        for path in settings.MIDDLEWARE:
+            with self.subTest(middleware=path):
+                self.assertTrue(getattr(import_string(path), 'async_capable', False))
+
+    @override_settings(DEBUG=True)
+    def test_asgi_handler_builds_an_async_chain(self):
+        # Django reports each sync middleware it has to adapt, under DEBUG only
+        with self.assertNoLogs('django.request', 'DEBUG'):
+            handler = ASGIHandler()
+        self.assertTrue(iscoroutinefunction(handler._middleware_chain))
+
+    def test_static_files_are_served_async(self):
+        middleware = AsyncWhiteNoiseMiddleware(self._not_found)
+        middleware.add_file_to_dictionary('/static/app.css', __file__)
+        request = RequestFactory().get('/static/app.css')
+        response = async_to_sync(middleware)(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(async_to_sync(middleware)(RequestFactory().get('/api/')).status_code, 404)
+
+    @staticmethod
+    async def _not_found(request):
+        return HttpResponseNotFound()
+
+
+class DatabaseQueueTests(TestCase):
+    """Claiming, retrying and failing AnalysisJobs"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('queued', password='pw12345xyz')
+
+    def setUp(self):
+        self.queue = DatabaseQueue()
+        self.meal = Meal.objects.create(user=self.user, meal_type='lunch', description='rice', analysis_status='pending')
+        self.job = AnalysisJob.objects.create(meal=self.meal)
+
+    def _expire_locks(self):
+        AnalysisJob.objects.filter(status='running').update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_claimed_job_is_invisible_to_other_workers(self):
+        self.assertEqual([job.id for job in self.queue.claim('a')], [self.job.id])
+        self.assertEqual(self.queue.claim('b'), [])
+
+    def test_expired_lock_is_reclaimed(self):
+        first, = self.queue.claim('a')
+        self._expire_locks()
+        second, = self.queue.claim('b')
+        self.assertEqual(second.attempts, 2)
+
+        # The first worker finishing late doesn't touch the job the second one now owns
+        self.queue.complete(first)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'running')
+        self.assertTrue(self.job.locked_by.startswith('b:'))
+
+    @mock.patch('meals.queue.MealAnalysisService.analyze', side_effect=RuntimeError('LLM down'))
+    def test_failed_attempt_is_retried_after_a_backoff(self, analyze):
+        job, = self.queue.claim('a')
+        before = timezone.now()
+        self.queue.process(job)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, 'queued')
+        self.assertEqual(self.job.last_error, 'LLM down')
+        self.assertGreaterEqual(self.job.available_at, before + timedelta(seconds=self.queue.RETRY_BACKOFF))
+        self.assertEqual(self.queue.claim('a'), [])
+
+        AnalysisJob.objects.update(available_at=timezone.now())
+        job, = self.queue.claim('a')
+        self.queue.process(job)
+        self.job.refresh_from_db()
+        self.assertGreaterEqual(self.job.available_at, timezone.now() + timedelta(seconds=self.queue.RETRY_BACKOFF * 2 - 1))
+
+    @mock.patch('meals.queue.MealAnalysisService.analyze', side_effect=RuntimeError('LLM down'))
+    def test_last_attempt_fails_the_job_and_meal(self, analyze):
+        for attempt in range(1, self.queue.MAX_ATTEMPTS + 1):
+            AnalysisJob.objects.update(available_at=timezone.now())
+            job, = self.queue.claim('a')
+            self.queue.process(job)
+            # Only the last attempt may answer with the mock estimate
+            self.assertEqual(analyze.call_args.kwargs['fallback'], attempt == self.queue.MAX_ATTEMPTS)
+
+        self.job.refresh_from_db()
+        self.meal.refresh_from_db()
+        self.assertEqual(self.job.status, 'failed')
+        self.assertEqual(self.meal.analysis_status, 'failed')
+
+    def test_job_abandoned_on_its_last_attempt_fails(self):
+        # Its worker died every time (a poison meal): don't hand it out forever
+        for _ in range(self.queue.MAX_ATTEMPTS):
+            self.assertEqual(len(self.queue.claim('a')), 1)
+            self._expire_locks()
+
+        self.assertEqual(self.queue.claim('b'), [])
+        self.job.refresh_from_db()
+        self.meal.refresh_from_db()
+        self.assertEqual((self.job.status, self.job.attempts), ('failed', self.queue.MAX_ATTEMPTS))
+        self.assertEqual(self.meal.analysis_status, 'failed')
+
+    def test_racing_claims_are_exclusive(self):
+        for i in range(5):
+            meal = Meal.objects.create(user=self.user, meal_type='lunch', description=f'meal {i}', analysis_status='pending')
+            AnalysisJob.objects.create(meal=meal)
+        other_worker = []
+        new_token = uuid.uuid4
+
+        def claim_in_between():
+            # Worker b claims after worker a read its candidates but before a's UPDATEs
+            if not other_worker:
+                other_worker.append([])
+                other_worker[0].extend(job.id for job in DatabaseQueue().claim('b', limit=3))
+            return new_token()
+
+        with mock.patch('meals.queue.uuid.uuid4', side_effect=claim_in_between):
+            claimed = [job.id for job in self.queue.claim('a', limit=6)]
+
+        self.assertEqual(len(other_worker[0]), 3)
+        self.assertFalse(set(claimed) & set(other_worker[0]))
+        self.assertEqual(len(claimed) + 3, AnalysisJob.objects.filter(status='running').count())
+        self.assertEqual(AnalysisJob.objects.filter(status='running').count(), 6)
+
+    def test_queue_backends_implement_enqueue(self):
+        with self.assertRaises(TypeError):
+            AnalysisQueue()
+
+
+
+class DailyProgressSignalTests(TestCase):
+    """Meal signals keep DailyProgress equal to a full recompute of each day"""
+
+    MACROS = ('total_calories', 'total_protein', 'total_carbs', 'total_fat', 'total_fiber')
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('tracker', password='pw12345xyz')
+        UserProfile.objects.filter(user=cls.user).update(daily_calorie_goal=2000, daily_protein_goal=100)
+
+    def setUp(self):
+        self.user.refresh_from_db()
+        self.today = datetime(2024, 3, 14, 12, tzinfo=dt_timezone.utc)
+
+    def _meal(self, calories, when=None, **kwargs):
+        values = dict(zip(self.MACROS, (calories, calories / 20, calories / 8, calories / 30, 2)))
+        return Meal.objects.create(
+            user=self.user, meal_type='lunch', description='meal', logged_at=when or self.today, **values, **kwargs
+        )
+
+    def assertMatchesRecompute(self):
+        expected = {
+            row.pop('logged_date'): row
+            for row in Meal.objects.filter(user=self.user).values('logged_date')
+            .annotate(meals_count=Count('id'), **{field: Sum(field) for field in self.MACROS})
+        }
+        rows = {row.date: row for row in DailyProgress.objects.filter(user=self.user)}
+        for day in expected.keys() | rows.keys():
+            with self.subTest(day=day):
+                want = expected.get(day) or dict.fromkeys(self.MACROS, 0) | {'meals_count': 0}
+                row = rows[day]
+                self.assertEqual(row.meals_count, want['meals_count'])
+                for field in self.MACROS:
+                    self.assertAlmostEqual(getattr(row, field), want[field] or 0)
+                recomputed = DailyProgress(goal_calories=2000, goal_protein=100, **{f: want[f] or 0 for f in self.MACROS})
+                self.assertAlmostEqual(row.adherence_score, recomputed.calculate_adherence())
+
+    def test_create(self):
+        self._meal(600)
+        self._meal(900)
+        self.assertMatchesRecompute()
+        self.assertEqual(DailyProgress.objects.get(user=self.user).meals_count, 2)
+
+    def test_update_on_the_same_day(self):
+        meal = self._meal(600)
+        self._meal(900)
+        meal.total_calories = 1500
+        meal.total_protein = 80
+        meal.save()
+        self.assertMatchesRecompute()
+
+    def test_update_moving_the_meal_to_another_day(self):
+        meal = self._meal(600)
+        self._meal(900)
+        meal = Meal.objects.get(id=meal.id)
+        meal.logged_at = self.today - timedelta(days=1)
+        meal.total_calories = 700
+        meal.save()
+        self.assertMatchesRecompute()
+        self.assertEqual(DailyProgress.objects.get(user=self.user, date=meal.logged_date).meals_count, 1)
+
+    def test_update_without_a_snapshot_fixes_the_old_day(self):
+        meal = self._meal(600)
+        self._meal(900)
+        # Built by hand, not loaded: the signal has no previous values to diff against
+        moved = Meal(**{field.attname: getattr(meal, field.attname) for field in Meal._meta.concrete_fields})
+        moved.logged_at = self.today + timedelta(days=2)
+        moved.logged_date = None
+        moved.save()
+        self.assertMatchesRecompute()
+
+    def test_update_with_only_some_fields_loaded(self):
+        meal = self._meal(600)
+        meal = Meal.objects.only('id', 'user', 'logged_date', 'logged_at', 'total_calories').get(id=meal.id)
+        meal.total_calories = 400
+        meal.save(update_fields=['total_calories'])
+        self.assertMatchesRecompute()
+
+    def test_delete(self):
+        first = self._meal(600)
+        self._meal(900)
+        first.delete()
+        self.assertMatchesRecompute()
+        Meal.objects.filter(user=self.user).delete()
+        self.assertMatchesRecompute()
+        self.assertEqual(DailyProgress.objects.get(user=self.user).meals_count, 0)
+
+    def test_missing_row_is_rebuilt_from_every_meal(self):
+        self._meal(600)
+        DailyProgress.objects.filter(user=self.user).delete()
+        self._meal(900)
+        self.assertMatchesRecompute()
+        self.assertEqual(DailyProgress.objects.get(user=self.user).meals_count, 2)
+
+    def test_reconcile_repairs_drift(self):
+        today = timezone.now()
+        meal = self._meal(600, when=today)
+        self._meal(900, when=today - timedelta(days=1))
+        # Bulk writes bypass the signals
+        Meal.objects.filter(id=meal.id).update(total_calories=1200)
+        DailyProgress.objects.filter(user=self.user, date=meal.logged_date - timedelta(days=1)).update(meals_count=5)
+
+        out = StringIO()
+        call_command('reconcile_daily_progress', '--user', 'tracker', stdout=out)
+        self.assertIn('2 of 2 days drifted', out.getvalue())
+        call_command('reconcile_daily_progress', '--user', 'tracker', '--fix', stdout=out)
+        self.assertMatchesRecompute()
+        call_command('reconcile_daily_progress', '--user', 'tracker', stdout=out)
+        self.assertIn('2 days checked, no drift', out.getvalue())
+
+
+class RollupReportTests(TestCase):
+    """Week and month buckets read from rollups agree with progress_report over the same days"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('charter', password='pw12345xyz')
+        first = date(2023, 1, 1)
+        rows = []
+        for i in range(400):
+            # Gaps break streaks; scores straddle the streak threshold
+            if i % 9 == 4 or i % 31 == 17:
+                continue
+            rows.append(DailyProgress(
+                user=cls.user, date=first + timedelta(days=i),
+                total_calories=1500 + i * 37 % 900, total_protein=40 + i * 13 % 120,
+                total_carbs=150 + i * 7 % 100, total_fat=50 + i * 3 % 40, total_fiber=10 + i % 25,
+                meals_count=1 + i % 4, adherence_score=[95, 85, 60, 100, 80, 79, 90][i % 7],
+                goal_calories=2000,
+            ))
+        DailyProgress.objects.bulk_create(rows)
+
+    def assertMatchesDays(self, start, end, granularity):
+        report = rollup_report(self.user, start, end, granularity)
+        daily = progress_report(self.user, start, end)
+        self.assertEqual(report['summary'], daily['summary'])
+
+        first_day = PERIODS[granularity][1]
+        buckets = {}
+        for day in daily['progress']:
+            buckets.setdefault(first_day(date.fromisoformat(day['date'])), []).append(day)
+        self.assertEqual(len(report['progress']), len(buckets))
+        for bucket, (period, days) in zip(report['progress'], sorted(buckets.items())):
+            with self.subTest(bucket=bucket['start']):
+                self.assertEqual(bucket['start'], max(period, start).isoformat())
+                self.assertEqual(bucket['days_tracked'], len(days))
+                self.assertEqual(bucket['meals_count'], sum(day['meals_count'] for day in days))
+                for key in ('calories', 'protein', 'carbs', 'fat', 'fiber', 'adherence_score'):
+                    self.assertEqual(bucket[key], round(sum(day[key] for day in days) / len(days), 1))
+
+    def assertMatchesForRanges(self):
+        ranges = {
+            'full year': (date(2023, 1, 1), date(2023, 12, 31)),
+            'partial range': (date(2023, 2, 15), date(2023, 8, 9)),
+            'single day': (date(2023, 6, 14), date(2023, 6, 14)),
+            'untracked day': (date(2023, 1, 5), date(2023, 1, 5)),
+            'week and month boundaries': (date(2023, 3, 29), date(2023, 4, 4)),
+            'year boundary': (date(2023, 12, 20), date(2024, 1, 20)),
+        }
+        for name, (start, end) in ranges.items():
+            for granularity in PERIODS:
+                with self.subTest(name, granularity=granularity):
+                    self.assertMatchesDays(start, end, granularity)
+
+    def test_missing_rollups_are_summed_from_days(self):
+        self.assertMatchesForRanges()
+        # Stored by those reads, and read back the same
+        self.assertTrue(WeeklyProgress.objects.filter(user=self.user, is_stale=False).exists())
+        self.assertTrue(MonthlyProgress.objects.filter(user=self.user, is_stale=False).exists())
+        self.assertMatchesForRanges()
+
+    def test_rebuilt_rollups(self):
+        rebuild_rollups([self.user.id])
+        self.assertFalse(WeeklyProgress.objects.filter(user=self.user, is_stale=True).exists())
+        self.assertMatchesForRanges()
+
+    def test_stale_rollups_are_recomputed_on_read(self):
+        rebuild_rollups([self.user.id])
+        day = date(2023, 5, 10)
+        DailyProgress.objects.filter(user=self.user, date=day).update(total_calories=4000, adherence_score=0)
+        mark_rollups_stale(self.user.id, [day])
+        week = WeeklyProgress.objects.get(user=self.user, period_start=date(2023, 5, 8))
+        month = MonthlyProgress.objects.get(user=self.user, period_start=date(2023, 5, 1))
+        self.assertTrue(week.is_stale and month.is_stale)
+
+        self.assertMatchesDays(date(2023, 1, 1), date(2023, 12, 31), 'week')
+        self.assertMatchesDays(date(2023, 1, 1), date(2023, 12, 31), 'month')
+        week.refresh_from_db()
+        month.refresh_from_db()
+        self.assertFalse(week.is_stale or month.is_stale)
+        self.assertEqual(month.max_calories, 4000)
+
+    def test_marking_only_writes_rows_that_change(self):
+        rebuild_rollups([self.user.id], date(2023, 5, 1), date(2023, 5, 31))
+        stale_week = date(2023, 5, 8)
+        WeeklyProgress.objects.filter(user=self.user, period_start=stale_week).update(is_stale=True)
+        stamped = WeeklyProgress.objects.get(user=self.user, period_start=stale_week).updated_at
+
+        mark_rollups_stale(self.user.id, [date(2023, 5, 10), date(2023, 5, 16), date(2023, 6, 2)])
+        self.assertEqual(WeeklyProgress.objects.get(user=self.user, period_start=stale_week).updated_at, stamped)
+        self.assertEqual(
+            set(WeeklyProgress.objects.filter(user=self.user, is_stale=True).values_list('period_start', flat=True)),
+            {stale_week, date(2023, 5, 15), date(2023, 5, 29)},
+        )
+        self.assertEqual(
+            set(MonthlyProgress.objects.filter(user=self.user, is_stale=True).values_list('period_start', flat=True)),
+            {date(2023, 5, 1), date(2023, 6, 1)},
+        )
+
+    def test_meal_writes_flag_their_periods(self):
+        rebuild_rollups([self.user.id])
+        UserProfile.objects.filter(user=self.user).update(daily_calorie_goal=2000)
+        Meal.objects.create(
+            user=self.user, meal_type='lunch', description='meal', total_calories=800,
+            logged_at=datetime(2023, 7, 4, 12, tzinfo=dt_timezone.utc),
+        )
+        self.assertTrue(WeeklyProgress.objects.get(user=self.user, period_start=date(2023, 7, 3)).is_stale)
+        self.assertTrue(MonthlyProgress.objects.get(user=self.user, period_start=date(2023, 7, 1)).is_stale)
+        self.assertMatchesDays(date(2023, 6, 1), date(2023, 8, 31), 'week')
+
+
+class MealImporterTests(TestCase):
+    """Imports skip bad rows, resume after an interruption and leave progress rebuilt"""
+
+    CSV = (
+        'Date,Meal,Food,Calories,Protein\n'
+        '2024-02-01,breakfast,Oatmeal,350,12\n'
+        '2024-02-01 19:30,dinner,Salmon and rice,700,45\n'
+        '\n'
+        ',,,,\n'
+        '2024-02-02,brunch,Waffles,500,8\n'
+        'yesterday,lunch,Soup,200,5\n'
+        '2024-02-02,lunch,Soup,-5,5\n'
+        '2024-02-03,snack,Apple,,\n'
+        '2024-02-03,lunch,Sandwich,450,abc\n'
+    )
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('importer', password='pw12345xyz')
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'export.csv')
+        with open(self.path, 'w') as fp:
+            fp.write(self.CSV)
+        self.meal_import, _ = MealImporter.for_file(self.user, self.path)
+
+    def assertImported(self, meal_import):
+        self.assertEqual(meal_import.status, 'done')
+        self.assertEqual((meal_import.rows_done, meal_import.meals_created, meal_import.rows_failed), (8, 3, 5))
+        # Numbered by data row; the empty line isn't one
+        self.assertEqual(meal_import.errors, [
+            [3, 'logged_at required'],
+            [4, 'Unknown meal_type: brunch'],
+            [5, "Unreadable date 'yesterday'; use ISO 8601"],
+            [6, 'total_calories must not be negative'],
+            [8, 'total_protein must be a number'],
+        ])
+        self.assertEqual(meal_import.dates, ['2024-02-01', '2024-02-03'])
+        self.assertEqual(Meal.objects.filter(user=self.user).count(), 3)
+
+        # Rows without nutrients are left for the analysis workers
+        apple = Meal.objects.get(user=self.user, description='Apple')
+        self.assertEqual(apple.analysis_status, 'pending')
+        self.assertEqual(list(AnalysisJob.objects.values_list('meal_id', flat=True)), [apple.id])
+
+        progress = {row.date: row for row in DailyProgress.objects.filter(user=self.user)}
+        self.assertEqual(set(progress), {date(2024, 2, 1), date(2024, 2, 3)})
+        self.assertEqual(progress[date(2024, 2, 1)].meals_count, 2)
+        self.assertEqual(progress[date(2024, 2, 1)].total_calories, 1050)
+        self.assertEqual(progress[date(2024, 2, 1)].total_protein, 57)
+        self.assertFalse(any(row.is_stale for row in progress.values()))
+
+    def test_import_reports_rejected_rows(self):
+        self.assertImported(MealImporter(self.meal_import, batch_size=3).run())
+
+    def test_interrupted_import_resumes_after_the_last_batch(self):
+        def interrupt(progress):
+            raise RuntimeError('worker stopped')
+
+        with self.assertRaises(RuntimeError), self.assertLogs('meals.importer', 'ERROR'):
+            MealImporter(self.meal_import, batch_size=3).run(on_batch=interrupt)
+        meal_import = MealImport.objects.get(id=self.meal_import.id)
+        self.assertEqual((meal_import.status, meal_import.rows_done), ('failed', 3))
+        self.assertEqual(Meal.objects.filter(user=self.user).count(), 2)
+
+        # The same file maps to the same import, which picks up at row 4
+        meal_import, created = MealImporter.for_file(self.user, self.path)
+        self.assertFalse(created)
+        self.assertImported(MealImporter(meal_import, batch_size=3).run())
+
+
+class AnalysisWorkerImportTests(TransactionTestCase):
+    """Uploads are imported by the analysis workers, on their threads (so committed data)"""
+
+    def test_queued_import_is_run(self):
+        user = User.objects.create_user('uploader', password='pw12345xyz')
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'export.csv')
+        with open(path, 'w') as fp:
+            fp.write('date,meal,food,calories\n2024-02-01,lunch,Soup,200\n2024-02-02,lunch,Apple,\n')
+        meal_import, _ = MealImporter.for_file(user, path)
+
+        with mock.patch.object(DatabaseQueue, 'claim', return_value=[]):
+            worker = AnalysisWorker(concurrency=2, poll_interval=0.01)
+            worker.run(once=True)
+
+        meal_import.refresh_from_db()
+        self.assertEqual(worker.imported, 1)
+        self.assertEqual((meal_import.status, meal_import.meals_created), ('done', 2))
+        self.assertEqual(AnalysisJob.objects.filter(meal__user=user).count(), 1)
+        self.assertEqual(DailyProgress.objects.get(user=user, date=date(2024, 2, 1)).total_calories, 200)
+
+    def test_imports_can_be_left_to_the_command(self):
+        with mock.patch.object(DatabaseQueue, 'claim', return_value=[]), \
+                mock.patch.object(MealImporter, 'claim_queued') as claim_queued:
+            AnalysisWorker(poll_interval=0.01, imports=False).run(once=True)
+        claim_queued.assert_not_called()
+
+
+class ConditionalGetTests(TestCase):
+    """Polled views answer a matching If-None-Match with 304 until the user's data changes"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('poller', password='pw12345xyz')
+        cls.meal = Meal.objects.create(user=cls.user, meal_type='lunch', description='rice', total_calories=200)
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def get(self, url='/api/meals/', etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, secure=True, **headers)
+
+    def etag(self, url='/api/meals/'):
+        response = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_matching_etag_is_not_modified(self):
+        for url in ('/api/meals/', '/api/meals/daily_summary/', '/api/meals/progress/weekly/'):
+            with self.subTest(url=url):
+                etag = self.etag(url)
+                response = self.get(url, etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(self.get(url, '"stale"').status_code, 200)
+
+    def test_etag_changes_with_meal_writes(self):
+        urls = ('/api/meals/', '/api/meals/daily_summary/', '/api/meals/progress/weekly/')
+        etags = {url: self.etag(url) for url in urls}
+
+        def assertChanged(write):
+            for url in urls:
+                with self.subTest(write=write, url=url):
+                    etag = self.etag(url)
+                    self.assertNotEqual(etag, etags[url])
+                    self.assertEqual(self.get(url, etags[url]).status_code, 200)
+                    etags[url] = etag
+
+        meal = Meal.objects.create(user=self.user, meal_type='dinner', description='pasta', total_calories=600)
+        assertChanged('create')
+        meal.total_calories = 650
+        meal.save()
+        assertChanged('update')
+        meal.delete()
+        assertChanged('delete')
+
+    def test_etag_changes_when_background_analysis_completes(self):
+        queue = DatabaseQueue()
+        meal = Meal.objects.create(user=self.user, meal_type='dinner', description='chicken and rice',
+                                   analysis_status='pending')
+        queue.enqueue(meal)
+        etags = {url: self.etag(url) for url in ('/api/meals/', '/api/meals/daily_summary/')}
+
+        job, = queue.claim('worker')
+        queue.process(job)
+
+        meal.refresh_from_db()
+        self.assertEqual(meal.analysis_status, 'complete')
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.get(url, etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_other_users_writes_keep_the_etag(self):
+        etag = self.etag()
+        other = User.objects.create_user('neighbour', password='pw12345xyz')
+        Meal.objects.create(user=other, meal_type='lunch', description='soup')
+        self.assertEqual(self.get(etag=etag).status_code, 304)
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
@@ -6,10 +7,18 @@ router = DefaultRouter()
 router.register(r'', views.MealViewSet, basename='meal')
 router.register(r'recommendations', views.RecommendationViewSet, basename='recommendation')
 
+analyze_view = views.analyze_meal_json_async if settings.ASYNC_VIEWS else views.analyze_meal_json
+
 urlpatterns = [
-    path('analyze/', views.analyze_meal_json, name='analyze_meal'),
+    path('analyze/', analyze_view, name='analyze_meal'),
+    path('analyze/batch/', views.analyze_meal_batch_json, name='analyze_meal_batch'),
+    path('<int:meal_id>/analysis/', views.meal_analysis_status_json, name='meal_analysis_status'),
     path('daily_summary/', views.daily_summary_json, name='daily_summary'),
     path('progress/weekly/', views.progress_weekly_json, name='progress_weekly'),
     path('progress/monthly/', views.progress_monthly_json, name='progress_monthly'),
+    path('progress/', views.progress_range_json, name='progress_range'),
+    path('export/', views.export_history, name='export_history'),
+    path('import/', views.import_meals_json, name='import_meals'),
+    path('import/<int:import_id>/', views.meal_import_status_json, name='meal_import_status'),
     path('', views.meals_list_json, name='meals_list'),
 ]
\ No newline at end of file
@@ -1,19 +1,29 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 import logging
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.utils import timezone
 from datetime import datetime, timedelta
 from django.utils.decorators import method_decorator
-from .models import Meal, Recommendation
+from .conditional import daily_summary_etag, meals_list_etag, progress_etag
+from .models import Meal, MealFood, MealImport, Recommendation
+from .pagination import (
+    MEAL_LIST_FIELDS, InvalidCursor, MealKeysetPagination, keyset_page, next_page_url,
+    omitted_fields, page_size_from, requested_fields,
+)
 from .serializers import (
     MealSerializer, 
     MealCreateSerializer, 
-    RecommendationSerializer
+    RecommendationSerializer,
+    foods_prefetch,
+    meal_list_data,
 )
-from django.contrib.sessions.models import Session
+from accounts.authentication import aget_session_user, get_session_user
+from accounts.response_cache import cached_payload
 
 # Add logger
 logger = logging.getLogger(__name__)
@@ -21,9 +31,34 @@ logger = logging.getLogger(__name__)
 class MealViewSet(viewsets.ModelViewSet):
     serializer_class = MealSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = MealKeysetPagination
 
     def get_queryset(self):
-        return Meal.objects.filter(user=self.request.user).order_by('-logged_at')
+        meals = Meal.objects.filter(user=self.request.user).order_by('-logged_at', '-id')
+        if self.action != 'list':
+            return meals.prefetch_related(foods_prefetch())
+        # The full row by default; ?fields=id,logged_at,... trims it, and the columns and
+        # prefetch behind it. ai_analysis_raw is never serialized
+        omit = self._omitted_fields()
+        if 'foods' not in omit:
+            meals = meals.prefetch_related(foods_prefetch())
+        return meals.only(*MEAL_LIST_FIELDS, *(() if 'description' in omit else ('description',)))
+
+    def _omitted_fields(self):
+        return tuple(omitted_fields(self.request.query_params, MealSerializer.Meta.fields))
+
+    def get_serializer(self, *args, **kwargs):
+        if self.action == 'list':
+            kwargs['omit'] = self._omitted_fields()
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        # Read-only, so skip MealSerializer and build the page as plain dicts
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(meal_list_data(queryset, omit=self._omitted_fields()))
+        return self.get_paginated_response(meal_list_data(page, omit=self._omitted_fields()))
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -34,37 +69,95 @@ class MealViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
+def _parse_analyze_body(request):
+    """Returns (description, meal_type, error_response)"""
+    import json
+    try:
+        data = json.loads(request.body)
+        meal_description = data.get('description', '').strip()
+        meal_type = data.get('meal_type', 'snack')
+    except json.JSONDecodeError:
+        return None, None, JsonResponse({'error': 'Invalid JSON'}, status=400)
+    
+    if not meal_description:
+        return None, None, JsonResponse({'error': 'Meal description required'}, status=400)
+    
+    return meal_description, meal_type, None
+
+
+def _wants_background(request):
+    """Queue the analysis when configured to, or when the client sends `Prefer: respond-async`"""
+    from django.conf import settings
+    return settings.ANALYZE_IN_BACKGROUND or 'respond-async' in request.headers.get('Prefer', '')
+
+
+def _queue_analysis(user, meal_description, meal_type):
+    """Create the pending meal and its queued analysis together, or neither"""
+    from django.db import transaction
+    from .queue import get_analysis_queue
+
+    with transaction.atomic():
+        meal = Meal.objects.create(
+            user=user,
+            description=meal_description,
+            meal_type=meal_type,
+            analysis_status='pending'
+        )
+        get_analysis_queue().enqueue(meal)
+    return meal
+
+
+def _accepted_response(request, meal):
+    from django.urls import reverse
+    status_url = request.build_absolute_uri(reverse('meal_analysis_status', args=[meal.id]))
+    response = JsonResponse({
+        'meal_id': meal.id,
+        'status': meal.analysis_status,
+        'status_url': status_url,
+    }, status=202)
+    response['Location'] = status_url
+    return response
+
+
+def _analysis_response(meal, analysis, parsed_foods, progress):
+    return JsonResponse({
+        'meal_id': meal.id,
+        'analysis': {
+            'calories': analysis['calories'],
+            'protein': analysis['protein'],
+            'carbs': analysis['carbs'],
+            'fat': analysis['fat'],
+            'fiber': analysis['fiber'],
+        },
+        'recommendations': analysis['recommendations'],
+        'confidence_score': analysis['confidence_score'],
+        'parsed_foods': parsed_foods,
+        'daily_progress': {
+            'total_calories': progress.total_calories,
+            'goal_calories': progress.goal_calories,
+            'adherence_score': progress.adherence_score,
+        }
+    }, status=201)
+
+
 @csrf_exempt
 def analyze_meal_json(request):
     if request.method == 'POST':
         # Authentication
-        user = None
-        sessionid = request.COOKIES.get('sessionid')
-        
-        if sessionid:
-            from django.contrib.sessions.models import Session
-            from django.contrib.auth.models import User
-            try:
-                session = Session.objects.get(session_key=sessionid)
-                user_id = session.get_decoded().get('_auth_user_id')
-                if user_id:
-                    user = User.objects.get(id=user_id)
-            except (Session.DoesNotExist, User.DoesNotExist):
-                pass
+        user = get_session_user(request, select_profile=True)
         
         if not user:
             return JsonResponse({'error': 'Authentication required'}, status=401)
         
-        import json
-        try:
-            data = json.loads(request.body)
-            meal_description = data.get('description', '').strip()
-            meal_type = data.get('meal_type', 'snack')
-        except json.JSONDecodeError:
-            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        meal_description, meal_type, error = _parse_analyze_body(request)
+        if error:
+            return error
         
-        if not meal_description:
-            return JsonResponse({'error': 'Meal description required'}, status=400)
+        from .services import MealAnalysisService, ProgressTrackingService
+
+        if _wants_background(request):
+            meal = _queue_analysis(user, meal_description, meal_type)
+            return _accepted_response(request, meal)
         
         try:
             # Parse meal into food items
@@ -83,23 +176,143 @@ def analyze_meal_json(request):
                 user=user,
                 description=meal_description,
                 meal_type=meal_type,
-                total_calories=analysis['calories'],
-                total_protein=analysis['protein'],
-                total_carbs=analysis['carbs'],
-                total_fat=analysis['fat'],
-                total_fiber=analysis['fiber'],
-                ai_confidence=analysis['confidence_score']
+                **MealAnalysisService.meal_fields(analysis, parsed_foods)
             )
+            MealAnalysisService.save_foods(meal, analysis)
 
-             # Update daily progress
-            from .services import ProgressTrackingService
-            from django.utils import timezone
+            # Daily progress was updated by the Meal post_save signal
+            progress = ProgressTrackingService.get_daily_progress(user, meal.logged_date)
             
-            today = timezone.now().date()
-            progress = ProgressTrackingService.update_daily_progress(user, today)
+            return _analysis_response(meal, analysis, parsed_foods, progress)
             
-            return JsonResponse({
-                'meal_id': meal.id,
+        except Exception as e:
+            print(f"Error: {str(e)}")
+            return JsonResponse({'error': str(e)}, status=500)
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+
+async def analyze_meal_json_async(request):
+    """
+    analyze_meal_json for ASGI deployments (config/asgi.py): the USDA/OpenAI round trip
+    awaits on the event loop instead of holding a worker thread
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+    # Profile comes along so the progress signal doesn't need another query
+    user = await aget_session_user(request, select_profile=True)
+    if not user:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    meal_description, meal_type, error = _parse_analyze_body(request)
+    if error:
+        return error
+
+    from asgiref.sync import sync_to_async
+    from .services import MealAnalysisService, ProgressTrackingService
+
+    if _wants_background(request):
+        meal = await sync_to_async(_queue_analysis)(user, meal_description, meal_type)
+        return _accepted_response(request, meal)
+
+    try:
+        from nutrition.meal_parser import MealParser
+        from nutrition.ai_service import NutritionAI
+
+        parsed_foods = MealParser.parse_meal(meal_description)
+
+        analysis = await NutritionAI().aanalyze_meal(meal_description, parsed_foods)
+
+        meal = await Meal.objects.acreate(
+            user=user,
+            description=meal_description,
+            meal_type=meal_type,
+            **MealAnalysisService.meal_fields(analysis, parsed_foods)
+        )
+        await MealFood.objects.abulk_create(MealAnalysisService.meal_foods(meal, analysis))
+
+        progress = await sync_to_async(ProgressTrackingService.get_daily_progress)(user, meal.logged_date)
+
+        return _analysis_response(meal, analysis, parsed_foods, progress)
+
+    except Exception as e:
+        logger.exception("Async meal analysis failed")
+        return JsonResponse({'error': str(e)}, status=500)
+
+# csrf_exempt() would wrap the coroutine in a sync view on Django 4.2
+analyze_meal_json_async.csrf_exempt = True
+
+
+
+@csrf_exempt
+def analyze_meal_batch_json(request):
+    """Analyze up to MEAL_BATCH_MAX_ITEMS meals in one request: {"meals": [{description, meal_type, logged_at}]}"""
+    if request.method == 'POST':
+        import json
+        from .services import MealAnalysisService
+
+        # Authentication
+        user = get_session_user(request, select_profile=True)
+        
+        if not user:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        
+        try:
+            items = json.loads(request.body).get('meals')
+        except (json.JSONDecodeError, AttributeError):
+            return JsonResponse({'error': 'Invalid JSON'}, status=400)
+        
+        if not isinstance(items, list) or not items:
+            return JsonResponse({'error': 'meals must be a non-empty list'}, status=400)
+        if len(items) > MealAnalysisService.BATCH_MAX_ITEMS:
+            return JsonResponse(
+                {'error': f'At most {MealAnalysisService.BATCH_MAX_ITEMS} meals per request'}, status=400
+            )
+        
+        results = MealAnalysisService.analyze_batch(user, items)
+        created = sum(result['status'] == 'created' for result in results)
+        
+        # 201 when everything was saved, 207 for partial success, 400 when nothing was
+        status = 201 if created == len(results) else 207 if created else 400
+        return JsonResponse({
+            'created': created,
+            'failed': len(results) - created,
+            'results': results,
+        }, status=status)
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+
+@csrf_exempt
+def meal_analysis_status_json(request, meal_id):
+    """Poll target for analyses queued with a 202 from analyze_meal_json"""
+    if request.method == 'GET':
+        # Authentication
+        user = get_session_user(request)
+        
+        if not user:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        
+        meal = (
+            Meal.objects.filter(user=user, id=meal_id)
+            .select_related('analysis_job')
+            .only('id', 'analysis_status', 'ai_analysis_raw', 'analysis_job__attempts', 'analysis_job__last_error')
+            .first()
+        )
+        if meal is None:
+            return JsonResponse({'error': 'Meal not found'}, status=404)
+        
+        job = getattr(meal, 'analysis_job', None)
+        data = {
+            'meal_id': meal.id,
+            'status': meal.analysis_status,
+            'attempts': job.attempts if job else 0,
+        }
+        
+        if meal.analysis_status == 'complete' and meal.ai_analysis_raw:
+            analysis = meal.ai_analysis_raw['analysis']
+            data.update({
                 'analysis': {
                     'calories': analysis['calories'],
                     'protein': analysis['protein'],
@@ -109,104 +322,184 @@ def analyze_meal_json(request):
                 },
                 'recommendations': analysis['recommendations'],
                 'confidence_score': analysis['confidence_score'],
-                'parsed_foods': parsed_foods,
-                'parsed_foods': parsed_foods,
-                'daily_progress': {
-                    'total_calories': progress.total_calories,
-                    'goal_calories': progress.goal_calories,
-                    'adherence_score': progress.adherence_score,
-                }
-            }, status=201)
-            
-        except Exception as e:
-            print(f"Error: {str(e)}")
-            return JsonResponse({'error': str(e)}, status=500)
+                'parsed_foods': meal.ai_analysis_raw['parsed_foods'],
+            })
+        elif meal.analysis_status == 'failed' and job:
+            data['error'] = job.last_error
+        
+        return JsonResponse(data)
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 
-
 # @action(detail=False, methods=['get'])
 @csrf_exempt
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=daily_summary_etag)
 def daily_summary_json(request):
     if request.method == 'GET':
-        # Manual session authentication
-        user = None
-        sessionid = request.COOKIES.get('sessionid')
+        # Authentication
+        user = get_session_user(request, select_profile=True)
+        
+        if not user:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
         
-        if sessionid:
-            from django.contrib.sessions.models import Session
-            from django.contrib.auth.models import User
+        from .services import ProgressTrackingService
+        today = user.profile.local_date()
+        if request.GET.get('date'):
             try:
-                session = Session.objects.get(session_key=sessionid)
-                user_id = session.get_decoded().get('_auth_user_id')
-                if user_id:
-                    user = User.objects.get(id=user_id)
-            except (Session.DoesNotExist, User.DoesNotExist):
-                pass
+                today = datetime.strptime(request.GET['date'], '%Y-%m-%d').date()
+            except ValueError:
+                return JsonResponse({'error': 'date must be YYYY-MM-DD'}, status=400)
+        
+        def summary():
+            # One indexed (user, date) lookup on the rollup; aggregates meals only if it's missing/stale
+            totals = ProgressTrackingService.get_daily_totals(user, today)
+            return {
+                'date': today.isoformat(),
+                'meals_count': totals['meals_count'],
+                'totals': {
+                    'calories': round(totals['total_calories'], 1),
+                    'protein': round(totals['total_protein'], 1),
+                    'carbs': round(totals['total_carbs'], 1),
+                    'fat': round(totals['total_fat'], 1),
+                },
+                'source': totals['source'],
+                'as_of': totals['as_of'].isoformat(),
+            }
+        
+        return JsonResponse(cached_payload(user, 'daily_summary', ('meals', 'progress'), summary, today))
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+# Columns of a meals_list_json row besides description; ?fields= picks among them
+LIST_ROW_FIELDS = (
+    'id', 'meal_type', 'logged_at', 'total_calories', 'total_protein', 'ai_confidence', 'analysis_status',
+)
+
+@csrf_exempt
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=meals_list_etag)
+def meals_list_json(request):
+    if request.method == 'GET':
+        # Authentication
+        user = get_session_user(request)
         
         if not user:
             return JsonResponse({'error': 'Authentication required'}, status=401)
         
-        from django.utils import timezone
-        today = timezone.now().date()
+        include = requested_fields(request.GET)
+        omit = omitted_fields(request.GET, LIST_ROW_FIELDS)
+        cursor = request.GET.get('cursor')
+        page_size = page_size_from(request.GET)
         
-        meals_today = Meal.objects.filter(user=user, logged_at__date=today)
+        def page():
+            meals = Meal.objects.filter(user=user).only(*MEAL_LIST_FIELDS, *include)
+            meals, next_cursor = keyset_page(meals, cursor, page_size)
+            meals_data = []
+            for meal in meals:
+                meal_data = {name: getattr(meal, name) for name in LIST_ROW_FIELDS if name not in omit}
+                if 'logged_at' in meal_data:
+                    meal_data['logged_at'] = meal.logged_at.isoformat()
+                for name in include:
+                    meal_data[name] = getattr(meal, name)
+                meals_data.append(meal_data)
+            return {'results': meals_data, 'next_cursor': next_cursor}
         
-        total_calories = sum(meal.total_calories or 0 for meal in meals_today)
-        total_protein = sum(meal.total_protein or 0 for meal in meals_today)
-        total_carbs = sum(meal.total_carbs or 0 for meal in meals_today)
-        total_fat = sum(meal.total_fat or 0 for meal in meals_today)
+        try:
+            # The first page is the dashboard's recent meals; deeper pages aren't worth caching
+            data = page() if cursor else cached_payload(user, 'recent_meals', ('meals',), page, page_size, include, omit)
+        except InvalidCursor as e:
+            return JsonResponse({'error': str(e)}, status=400)
         
-        return JsonResponse({
-            'date': today.isoformat(),
-            'meals_count': meals_today.count(),
-            'totals': {
-                'calories': round(total_calories, 1),
-                'protein': round(total_protein, 1),
-                'carbs': round(total_carbs, 1),
-                'fat': round(total_fat, 1),
-            }
-        })
+        return JsonResponse({**data, 'next': next_page_url(request, data['next_cursor'])})
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 @csrf_exempt
-def meals_list_json(request):
+def export_history(request):
+    """Stream the user's full history: ?dataset=meals|foods|progress&format=csv|ndjson&gzip=1"""
     if request.method == 'GET':
-        # Manual session authentication
-        user = None
-        sessionid = request.COOKIES.get('sessionid')
+        # Authentication
+        user = get_session_user(request)
         
-        if sessionid:
-            from django.contrib.sessions.models import Session
-            from django.contrib.auth.models import User
-            try:
-                session = Session.objects.get(session_key=sessionid)
-                user_id = session.get_decoded().get('_auth_user_id')
-                if user_id:
-                    user = User.objects.get(id=user_id)
-            except (Session.DoesNotExist, User.DoesNotExist):
-                pass
+        if not user:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        
+        from .export import content_type, export_filename, export_options, iter_export
+        
+        try:
+            options = export_options(request.GET)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        response = StreamingHttpResponse(
+            iter_export(user=user, **options),
+            content_type=content_type(options['fmt'], options['compress']),
+        )
+        response['Content-Disposition'] = f'attachment; filename="{export_filename(**options)}"'
+        response['Cache-Control'] = 'no-store'
+        return response
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+def _import_data(meal_import):
+    return {
+        'import_id': meal_import.id,
+        'file_name': meal_import.file_name,
+        'status': meal_import.status,
+        'rows_done': meal_import.rows_done,
+        'meals_created': meal_import.meals_created,
+        'rows_failed': meal_import.rows_failed,
+        'errors': meal_import.errors[:20],
+        'created_at': meal_import.created_at.isoformat(),
+        'finished_at': meal_import.finished_at.isoformat() if meal_import.finished_at else None,
+    }
+
+@csrf_exempt
+def import_meals_json(request):
+    """Upload another tracker's export (multipart 'file': CSV, JSON or NDJSON, optionally .gz)"""
+    if request.method == 'POST':
+        # Authentication
+        user = get_session_user(request)
         
         if not user:
             return JsonResponse({'error': 'Authentication required'}, status=401)
         
-        meals = Meal.objects.filter(user=user).order_by('-logged_at')[:10]  # Last 10 meals
-        
-        meals_data = []
-        for meal in meals:
-            meals_data.append({
-                'id': meal.id,
-                'meal_type': meal.meal_type,
-                'description': meal.description,
-                'logged_at': meal.logged_at.isoformat(),
-                'total_calories': meal.total_calories,
-                'total_protein': meal.total_protein,
-                'ai_confidence': meal.ai_confidence,
-            })
+        upload = request.FILES.get('file')
+        if upload is None:
+            return JsonResponse({'error': 'Upload a file as multipart field "file"'}, status=400)
         
-        return JsonResponse({'results': meals_data})
+        from django.urls import reverse
+        from .importer import MealImporter
+        
+        try:
+            meal_import, created = MealImporter.save_upload(user, upload)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        
+        # Imported by the analysis workers (or `manage.py import_meals --queued`); the same file again maps to the same import
+        status_url = request.build_absolute_uri(reverse('meal_import_status', args=[meal_import.id]))
+        response = JsonResponse({**_import_data(meal_import), 'status_url': status_url}, status=202 if created else 200)
+        response['Location'] = status_url
+        return response
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+@csrf_exempt
+def meal_import_status_json(request, import_id):
+    if request.method == 'GET':
+        # Authentication
+        user = get_session_user(request)
+        
+        if not user:
+            return JsonResponse({'error': 'Authentication required'}, status=401)
+        
+        meal_import = MealImport.objects.filter(user=user, id=import_id).first()
+        if meal_import is None:
+            return JsonResponse({'error': 'Import not found'}, status=404)
+        
+        return JsonResponse(_import_data(meal_import))
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
@@ -225,96 +518,79 @@ class RecommendationViewSet(viewsets.ReadOnlyModelViewSet):
         return Response({'status': 'marked as read'})
     
 
+def _progress_json(request, days):
+    # Authentication
+    user = get_session_user(request, select_profile=True)
+    
+    if not user:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+    
+    from .analytics import progress_for_last_days
+    report = cached_payload(
+        user, 'progress', ('progress',), lambda: progress_for_last_days(user, days),
+        days, user.profile.local_date(),
+    )
+    return JsonResponse(report)
+
 @csrf_exempt
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=progress_etag(days=7))
 def progress_weekly_json(request):
     if request.method == 'GET':
-        # Authentication
-        user = None
-        sessionid = request.COOKIES.get('sessionid')
-        
-        if sessionid:
-            from django.contrib.sessions.models import Session
-            from django.contrib.auth.models import User
-            try:
-                session = Session.objects.get(session_key=sessionid)
-                user_id = session.get_decoded().get('_auth_user_id')
-                if user_id:
-                    user = User.objects.get(id=user_id)
-            except (Session.DoesNotExist, User.DoesNotExist):
-                pass
-        
-        if not user:
-            return JsonResponse({'error': 'Authentication required'}, status=401)
-        
-        from .services import ProgressTrackingService
-        
-        progress_records = ProgressTrackingService.get_weekly_progress(user)
-        summary = ProgressTrackingService.get_progress_summary(user, days=7)
-        
-        data = {
-            'progress': [
-                {
-                    'date': p.date.isoformat(),
-                    'calories': p.total_calories,
-                    'protein': p.total_protein,
-                    'carbs': p.total_carbs,
-                    'fat': p.total_fat,
-                    'goal_calories': p.goal_calories,
-                    'adherence_score': p.adherence_score,
-                    'meals_count': p.meals_count,
-                }
-                for p in progress_records
-            ],
-            'summary': summary
-        }
-        
-        return JsonResponse(data)
+        return _progress_json(request, days=7)
     
     return JsonResponse({'error': 'Method not allowed'}, status=405)
 
 @csrf_exempt
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=progress_etag(days=30))
 def progress_monthly_json(request):
     if request.method == 'GET':
-        # Authentication (same as above)
-        user = None
-        sessionid = request.COOKIES.get('sessionid')
-        
-        if sessionid:
-            from django.contrib.sessions.models import Session
-            from django.contrib.auth.models import User
-            try:
-                session = Session.objects.get(session_key=sessionid)
-                user_id = session.get_decoded().get('_auth_user_id')
-                if user_id:
-                    user = User.objects.get(id=user_id)
-            except (Session.DoesNotExist, User.DoesNotExist):
-                pass
+        return _progress_json(request, days=30)
+    
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+@csrf_exempt
+def progress_range_json(request):
+    """
+    Series and summary for ?start=YYYY-MM-DD&end=YYYY-MM-DD (inclusive), per day or per
+    calendar week/month with ?granularity=day|week|month (default auto, by range length)
+    """
+    if request.method == 'GET':
+        # Authentication
+        user = get_session_user(request, select_profile=True)
         
         if not user:
             return JsonResponse({'error': 'Authentication required'}, status=401)
         
-        from .services import ProgressTrackingService
+        from datetime import date
+        from .analytics import MAX_RANGE_DAYS, progress_report
+        from .rollups import MAX_ROLLUP_RANGE_DAYS, rollup_report
         
-        progress_records = ProgressTrackingService.get_monthly_progress(user)
-        summary = ProgressTrackingService.get_progress_summary(user, days=30)
+        try:
+            end = date.fromisoformat(request.GET['end']) if 'end' in request.GET else user.profile.local_date()
+            start = date.fromisoformat(request.GET['start']) if 'start' in request.GET else end - timedelta(days=7)
+        except ValueError:
+            return JsonResponse({'error': 'Dates must be YYYY-MM-DD'}, status=400)
         
-        data = {
-            'progress': [
-                {
-                    'date': p.date.isoformat(),
-                    'calories': p.total_calories,
-                    'protein': p.total_protein,
-                    'carbs': p.total_carbs,
-                    'fat': p.total_fat,
-                    'goal_calories': p.goal_calories,
-                    'adherence_score': p.adherence_score,
-                    'meals_count': p.meals_count,
-                }
-                for p in progress_records
-            ],
-            'summary': summary
-        }
+        if start > end:
+            return JsonResponse({'error': 'start must not be after end'}, status=400)
         
-        return JsonResponse(data)
+        granularity = request.GET.get('granularity', 'auto')
+        if granularity == 'auto':
+            # About 90 points at most: days for a quarter, weeks up to two years, then months
+            span = (end - start).days
+            granularity = 'day' if span <= 93 else 'week' if span <= 731 else 'month'
+        if granularity not in ('day', 'week', 'month'):
+            return JsonResponse({'error': 'granularity must be auto, day, week or month'}, status=400)
+        
+        if granularity == 'day':
+            if (end - start).days > MAX_RANGE_DAYS:
+                return JsonResponse({'error': f'Range is limited to {MAX_RANGE_DAYS} days'}, status=400)
+            return JsonResponse({**progress_report(user, start, end), 'granularity': 'day'})
+        
+        if (end - start).days > MAX_ROLLUP_RANGE_DAYS:
+            return JsonResponse({'error': f'Range is limited to {MAX_ROLLUP_RANGE_DAYS} days'}, status=400)
+        return JsonResponse(rollup_report(user, start, end, granularity))
     
-    return JsonResponse({'error': 'Method not allowed'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Method not allowed'}, status=405)
@@ -1,27 +1,100 @@
-import openai
 from decouple import config
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
+import copy
 import json
+import math
+
+from asgiref.sync import sync_to_async
+
+from .cache import MISSING, TwoTierCache
+from .http_client import get_async_http_client, get_http_client
+from .local_engine import LocalNutritionEngine
 
 class NutritionAI:
     """AI-powered nutrition analysis with togglable real/mock data"""
     
     USE_REAL_AI = config('USE_OPENAI', default=False, cast=bool)
     OPENAI_API_KEY = config('OPENAI_API_KEY', default='')
+    OPENAI_API_BASE = config('OPENAI_API_BASE', default='https://api.openai.com/v1')
+    OPENAI_TIMEOUT = config('OPENAI_TIMEOUT', default=30, cast=float)
+    MODEL = "gpt-3.5-turbo"
+    # Bump when the prompt in _openai_request changes, so old answers stop matching
+    PROMPT_VERSION = 1
+
+    # OpenAI answers keyed on the canonical parsed foods, shared by every user
+    RESULT_CACHE_VERSION = config('AI_CACHE_VERSION', default='1')  # change to drop every cached answer
+    RESULT_CACHE_QUANTITY_BUCKET = config('AI_CACHE_QUANTITY_BUCKET', default=25, cast=int)  # grams
+    cache = TwoTierCache(
+        'nutrition-ai',
+        max_entries=config('AI_CACHE_MAX_ENTRIES', default=5000, cast=int),
+        ttl=config('AI_CACHE_TTL', default=60 * 60 * 24 * 7, cast=int),
+        alias=config('AI_CACHE_ALIAS', default='default'),
+    )
     
-    def __init__(self):
-        if self.USE_REAL_AI and self.OPENAI_API_KEY:
-            openai.api_key = self.OPENAI_API_KEY
+    def analyze_meal(self, description: str, parsed_foods: List[Dict] = None, fallback: bool = True) -> Dict:
+        """
+        Analyze meal and return nutrition data.
+        Foods that all resolve to Food rows are computed locally; only the rest go to the LLM.
+        With fallback=False, OpenAI errors are raised instead of answered with the mock estimate.
+        """
+        local = LocalNutritionEngine.analyze(parsed_foods)
+        if local is not None:
+            return local
+
+        if self.USE_REAL_AI:
+            cache_key = self.result_cache_key(parsed_foods)
+            if cache_key is not None:
+                cached = self.cache.get(cache_key)
+                if cached is not MISSING:
+                    return copy.deepcopy(cached)
+            return self._analyze_with_openai(description, parsed_foods, fallback, cache_key)
+        else:
+            return self._analyze_mock(description, parsed_foods)
     
-    def analyze_meal(self, description: str, parsed_foods: List[Dict] = None) -> Dict:
-        """Analyze meal and return nutrition data"""
+    async def aanalyze_meal(self, description: str, parsed_foods: List[Dict] = None, fallback: bool = True) -> Dict:
+        """Async variant of analyze_meal for ASGI views"""
+        local = await sync_to_async(LocalNutritionEngine.analyze)(parsed_foods)
+        if local is not None:
+            return local
+
         if self.USE_REAL_AI:
-            return self._analyze_with_openai(description, parsed_foods)
+            cache_key = self.result_cache_key(parsed_foods)
+            if cache_key is not None:
+                cached = await self.cache.aget(cache_key)
+                if cached is not MISSING:
+                    return copy.deepcopy(cached)
+            return await self._aanalyze_with_openai(description, parsed_foods, fallback, cache_key)
         else:
             return self._analyze_mock(description, parsed_foods)
+
+    @classmethod
+    def result_cache_key(cls, parsed_foods: Optional[List[Dict]]) -> Optional[Tuple]:
+        """
+        Same key for the same foods in any order and wording case, with quantities rounded
+        to RESULT_CACHE_QUANTITY_BUCKET grams. None (don't cache) when nothing was parsed,
+        since the answer would then depend on the free-text description alone.
+        """
+        if not parsed_foods:
+            return None
+        bucket = cls.RESULT_CACHE_QUANTITY_BUCKET
+        foods = sorted(
+            (' '.join(item['food'].lower().split()), max(bucket, round(item['quantity_grams'] / bucket) * bucket))
+            for item in parsed_foods
+        )
+        return ('analysis', cls.MODEL, cls.PROMPT_VERSION, cls.RESULT_CACHE_VERSION, tuple(foods))
+
+    @classmethod
+    def cache_stats(cls) -> Dict:
+        stats = cls.cache.stats()
+        stats['version'] = cls.RESULT_CACHE_VERSION
+        stats['top_entries'] = [
+            {'foods': [list(food) for food in key[-1]], 'hits': hits}
+            for key, hits in cls.cache.local.most_hit()
+        ]
+        return stats
     
-    def _analyze_with_openai(self, description: str, parsed_foods: List[Dict]) -> Dict:
-        """Real OpenAI analysis"""
+    def _openai_request(self, description: str, parsed_foods: List[Dict]) -> Dict:
+        """Chat completion request shared by the sync and async paths"""
         prompt = f"""Analyze this meal and provide detailed nutrition information:
 
 Meal description: {description}
@@ -36,23 +109,98 @@ Provide a JSON response with:
 
 Format as valid JSON."""
 
-        try:
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[
+        return {
+            'url': f"{self.OPENAI_API_BASE}/chat/completions",
+            'headers': {"Authorization": f"Bearer {self.OPENAI_API_KEY}"},
+            'json': {
+                "model": self.MODEL,
+                "messages": [
                     {"role": "system", "content": "You are a certified nutritionist providing meal analysis."},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.3,
-                max_tokens=500
-            )
-            
-            content = response.choices[0].message.content
-            return json.loads(content)
+                "temperature": 0.3,
+                "max_tokens": 500,
+            },
+            'timeout': self.OPENAI_TIMEOUT,
+        }
+
+    # Keys every analysis carries; the numeric ones are coerced to floats
+    NUMERIC_KEYS = ('calories', 'protein', 'carbs', 'fat', 'fiber', 'confidence_score')
+
+    @classmethod
+    def _parse_completion(cls, response) -> Dict:
+        response.raise_for_status()
+        content = response.json()['choices'][0]['message']['content']
+        return cls._validate_analysis(json.loads(content))
+
+    @classmethod
+    def _validate_analysis(cls, analysis) -> Dict:
+        """
+        The model's answer with numbers as floats, or ValueError when it doesn't have the
+        analysis shape; callers treat that like an API error, so it is never cached
+        """
+        if not isinstance(analysis, dict):
+            raise ValueError(f"Expected a JSON object, got {type(analysis).__name__}")
+        missing = [key for key in cls.NUMERIC_KEYS + ('recommendations',) if key not in analysis]
+        if missing:
+            raise ValueError(f"Analysis is missing {', '.join(missing)}")
+
+        validated = dict(analysis)
+        for key in cls.NUMERIC_KEYS:
+            value = analysis[key]
+            # 350 and "350" are fine; "about 350", true and null are not
+            try:
+                number = math.nan if isinstance(value, bool) else float(value)
+            except (TypeError, ValueError):
+                number = math.nan
+            if not math.isfinite(number) or number < 0:
+                raise ValueError(f"Analysis {key} is not a non-negative number: {value!r}")
+            validated[key] = number
+
+        recommendations = analysis['recommendations']
+        if isinstance(recommendations, str):
+            recommendations = [recommendations]
+        if not isinstance(recommendations, list) or not all(isinstance(tip, str) for tip in recommendations):
+            raise ValueError("Analysis recommendations is not a list of strings")
+        validated['recommendations'] = recommendations
+        return validated
+
+    def _analyze_with_openai(self, description: str, parsed_foods: List[Dict], fallback: bool = True,
+                             cache_key: Optional[Tuple] = None) -> Dict:
+        """Real OpenAI analysis"""
+        try:
+            # Goes through the shared client: pooled connections, retries on 429/5xx,
+            # and a circuit breaker that sends us straight to the mock fallback
+            response = get_http_client().post(**self._openai_request(description, parsed_foods))
+            analysis = self._parse_completion(response)
             
         except Exception as e:
             print(f"OpenAI API error: {e}")
+            if not fallback:
+                raise
+            return self._analyze_mock(description, parsed_foods)
+
+        # Only real answers are cached, never the mock fallback
+        if cache_key is not None:
+            self.cache.set(cache_key, copy.deepcopy(analysis))
+        return analysis
+
+    async def _aanalyze_with_openai(self, description: str, parsed_foods: List[Dict], fallback: bool = True,
+                                    cache_key: Optional[Tuple] = None) -> Dict:
+        """Real OpenAI analysis without holding a worker thread during the round trip"""
+        try:
+            response = await get_async_http_client().post(**self._openai_request(description, parsed_foods))
+            analysis = self._parse_completion(response)
+
+        except Exception as e:
+            print(f"OpenAI API error: {e}")
+            if not fallback:
+                raise
             return self._analyze_mock(description, parsed_foods)
+
+        if cache_key is not None:
+            await self.cache.aset(cache_key, copy.deepcopy(analysis))
+        return analysis
     
     def _analyze_mock(self, description: str, parsed_foods: List[Dict]) -> Dict:
         """Mock analysis based on parsed foods and keywords"""
@@ -78,7 +226,19 @@ Format as valid JSON."""
             fiber += 3
             calories += 30
         
-        # Generate recommendations
+        return {
+            'calories': calories,
+            'protein': protein,
+            'carbs': carbs,
+            'fat': fat,
+            'fiber': fiber,
+            'recommendations': self.recommendations_for(protein, carbs, fiber),
+            'confidence_score': 0.75
+        }
+
+    @staticmethod
+    def recommendations_for(protein: float, carbs: float, fiber: float) -> List[str]:
+        """Rule-based tips from a meal's macros (grams)"""
         recommendations = []
         if protein < 25:
             recommendations.append("Consider adding more protein for muscle maintenance")
@@ -89,13 +249,4 @@ Format as valid JSON."""
         
         if not recommendations:
             recommendations.append("Well-balanced meal with good macro distribution")
-        
-        return {
-            'calories': calories,
-            'protein': protein,
-            'carbs': carbs,
-            'fat': fat,
-            'fiber': fiber,
-            'recommendations': recommendations,
-            'confidence_score': 0.75
-        }
\ No newline at end of file
+        return recommendations
\ No newline at end of file
@@ -0,0 +1,269 @@
+import random
+import re
+import statistics
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional, Sequence
+
+from .food_index import FoodIndex
+from .meal_parser import MealParser
+
+
+class LegacyMealParser:
+    """The split/re.search MealParser this module benchmarks against (kept verbatim)"""
+
+    PORTION_PATTERNS = MealParser.PORTION_PATTERNS
+    SEPARATORS = MealParser.SEPARATORS
+
+    @classmethod
+    def parse_meal(cls, description: str) -> List[Dict]:
+        items = []
+
+        parts = [description]
+        for sep in cls.SEPARATORS:
+            new_parts = []
+            for part in parts:
+                new_parts.extend(part.split(sep))
+            parts = new_parts
+
+        for part in parts:
+            part = part.strip()
+            if not part:
+                continue
+
+            food_item = cls._parse_food_item(part)
+            if food_item:
+                items.append(food_item)
+
+        return items
+
+    @classmethod
+    def _parse_food_item(cls, text: str) -> Optional[Dict]:
+        text = text.lower().strip()
+
+        quantity_grams = 100
+        food_name = text
+
+        for pattern, (unit, grams_per_unit) in cls.PORTION_PATTERNS.items():
+            match = re.search(pattern, text)
+            if match:
+                amount = float(match.group(1))
+                quantity_grams = amount * grams_per_unit
+                food_name = re.sub(pattern, '', text).strip()
+                break
+
+        food_name = cls._clean_food_name(food_name)
+
+        if not food_name:
+            return None
+
+        return {
+            'food': food_name,
+            'quantity_grams': round(quantity_grams, 1)
+        }
+
+    @classmethod
+    def _clean_food_name(cls, name: str) -> str:
+        remove_words = ['a', 'an', 'the', 'some', 'of']
+        words = name.split()
+        words = [w for w in words if w not in remove_words]
+        return ' '.join(words).strip()
+
+
+MEAL_CORPUS = [
+    "2 eggs and toast",
+    "oatmeal with berries",
+    "200g grilled chicken breast, 1 cup brown rice and steamed broccoli",
+    "Greek yogurt with honey and 1 tbsp chia seeds",
+    "3 slices whole wheat bread with 2 tbsp peanut butter",
+    "a banana",
+    "Caesar salad with grilled chicken; 1 glass of orange juice",
+    "6 oz salmon, 1.5 cups quinoa, asparagus",
+    "2 chicken breasts with a side of fries",
+    "1 serving pad thai",
+    "Coffee with milk and 2 tsp sugar",
+    "Big Mac, medium fries and a Coke",
+    "1 lb ground beef tacos with cheese and salsa",
+    "protein shake with 1 scoop whey, 1 cup almond milk and a banana",
+    "2 pieces of sushi, miso soup, edamame",
+    "leftover pizza (2 slices)",
+    "Turkey sandwich on rye with lettuce, tomato and mustard",
+    "bowl of cereal with skim milk",
+    "apple and 30g almonds",
+    "spaghetti bolognese with parmesan\nside salad\nglass of red wine",
+    "3 pcs fried chicken and coleslaw",
+    "Smoothie: 1 cup spinach, 1 cup frozen mango, 0.5 cup Greek yogurt",
+    "burrito bowl with rice, black beans, chicken, guacamole and sour cream",
+    "2 scrambled eggs with spinach and feta, 1 slice sourdough",
+    "chicken tikka masala with naan and basmati rice",
+]
+
+RECIPE_CORPUS = [
+    """Homemade lasagna (ate 1 serving out of 8):
+1 lb ground beef
+1 onion, diced
+3 cloves garlic
+24 oz marinara sauce
+12 lasagna noodles
+15 oz ricotta cheese
+2 cups shredded mozzarella
+0.5 cup grated parmesan
+1 egg
+2 tbsp olive oil
+1 tsp dried oregano; 1 tsp dried basil; salt and pepper""",
+    """Chicken curry from my mum's recipe - 2 lbs chicken thighs, 2 tbsp vegetable oil,
+1 large onion, 4 cloves garlic, 1 tbsp grated ginger, 2 tbsp curry powder, 1 tsp cumin,
+1 tsp turmeric, 14 oz coconut milk, 1 cup chicken stock, 2 tomatoes, 1 cup basmati rice,
+a handful of fresh coriander and juice of 1 lime. I had about 2 servings with 1 naan""",
+    """Overnight oats x5 for meal prep:
+2.5 cups rolled oats
+2.5 cups almond milk
+1.25 cups Greek yogurt
+5 tbsp chia seeds
+5 tsp honey
+2 cups mixed berries
+0.5 cup chopped walnuts
+Had one jar with 1 sliced banana and some cinnamon""",
+]
+
+BENCHMARK_CORPUS = MEAL_CORPUS + RECIPE_CORPUS
+
+
+def _measure(parse: Callable, corpus: List[str], iterations: int) -> Dict:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        for description in corpus:
+            parse(description)
+    elapsed = time.perf_counter() - started
+
+    # Allocation profile of a single pass over the corpus
+    tracemalloc.start()
+    for description in corpus:
+        parse(description)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    parses = iterations * len(corpus)
+    return {
+        'parses': parses,
+        'seconds': round(elapsed, 4),
+        'parses_per_sec': round(parses / elapsed) if elapsed else 0,
+        'peak_alloc_bytes': peak,
+        'retained_bytes': current,
+    }
+
+
+def run_parser_benchmark(iterations: int = 200, corpus: Optional[List[str]] = None) -> Dict:
+    """Compare the compiled tokenizer (memo bypassed) against the legacy parser and check they agree"""
+    corpus = corpus or BENCHMARK_CORPUS
+    mismatches = [
+        description for description in corpus
+        if MealParser._parse_description(description) != LegacyMealParser.parse_meal(description)
+    ]
+
+    return {
+        'corpus_size': len(corpus),
+        'corpus_chars': sum(len(d) for d in corpus),
+        'mismatches': mismatches,
+        'legacy': _measure(LegacyMealParser.parse_meal, corpus, iterations),
+        'tokenizer': _measure(MealParser._parse_description, corpus, iterations),
+    }
+
+
+# Building blocks for synthetic USDA-style food names ("Chicken, breast, grilled, skinless")
+FOOD_BASES = [
+    'chicken', 'beef', 'pork', 'turkey', 'salmon', 'tuna', 'cod', 'shrimp', 'egg', 'tofu',
+    'rice', 'pasta', 'bread', 'oats', 'quinoa', 'potato', 'sweet potato', 'corn', 'beans', 'lentils',
+    'broccoli', 'spinach', 'kale', 'carrot', 'tomato', 'onion', 'pepper', 'mushroom', 'zucchini', 'lettuce',
+    'apple', 'banana', 'orange', 'strawberries', 'blueberries', 'mango', 'grapes', 'pear', 'peach', 'pineapple',
+    'milk', 'yogurt', 'cheese', 'butter', 'cream', 'almonds', 'walnuts', 'peanut butter', 'honey', 'chocolate',
+]
+FOOD_PARTS = [
+    'breast', 'thigh', 'wing', 'ground', 'loin', 'fillet', 'whole', 'white', 'brown', 'wheat',
+    'rolled', 'baby', 'cherry', 'greek', 'cheddar', 'mozzarella', 'skim', 'reduced fat', 'dark', 'wild',
+]
+FOOD_PREPARATIONS = [
+    'raw', 'cooked', 'grilled', 'roasted', 'boiled', 'steamed', 'fried', 'baked', 'canned', 'frozen',
+    'dried', 'smoked', 'scrambled', 'mashed', 'sauteed', 'braised', 'poached', 'pickled', 'toasted', 'plain',
+]
+FOOD_QUALIFIERS = [
+    'skinless', 'boneless', 'with salt', 'without salt', 'drained', 'unsweetened', 'sweetened',
+    'low sodium', 'organic', 'enriched', 'fat free', 'lean only', 'with skin', 'in oil', 'in water',
+]
+
+
+def synthetic_food_names(count: int, seed: int = 0) -> List[str]:
+    """`count` distinct USDA-style names"""
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        words = [rng.choice(FOOD_BASES).capitalize(), rng.choice(FOOD_PARTS), rng.choice(FOOD_PREPARATIONS)]
+        for _ in range(rng.randint(0, 3)):
+            words.append(rng.choice(FOOD_QUALIFIERS))
+        name = ', '.join(dict.fromkeys(words))
+        if name in names:
+            name = f'{name}, {rng.randint(1, 10 ** 6)}'
+        names.add(name)
+    return sorted(names)
+
+
+def food_index_queries(count: int, seed: int = 0) -> List[str]:
+    """What MealParser hands the index: the benchmark corpus's food names, plus typo'd variants"""
+    rng = random.Random(seed)
+    parsed = [item['food'] for description in MEAL_CORPUS for item in MealParser.parse_meal(description)]
+    queries = []
+    while len(queries) < count:
+        query = rng.choice(parsed)
+        if len(query) > 4 and rng.random() < 0.3:
+            i = rng.randrange(len(query) - 1)
+            query = query[:i] + query[i + 1] + query[i] + query[i + 2:]
+        queries.append(query)
+    return queries
+
+
+def _index_rows(names: Sequence[str]):
+    return ((food_id, name, []) for food_id, name in enumerate(names, start=1))
+
+
+def run_food_index_benchmark(sizes: Sequence[int] = (10000, 100000, 400000), queries: int = 500,
+                             seed: int = 0) -> List[Dict]:
+    """Build time, memory and query latency of FoodIndex over synthetic tables of each size"""
+    query_set = food_index_queries(queries, seed)
+    results = []
+    for size in sizes:
+        names = synthetic_food_names(size, seed)
+
+        index = FoodIndex()
+        started = time.perf_counter()
+        index.build(_index_rows(names))
+        build_seconds = time.perf_counter() - started
+
+        # Memory of a second build, traced separately so tracing doesn't skew the timing
+        tracemalloc.start()
+        traced = FoodIndex()
+        traced.build(_index_rows(names))
+        index_bytes, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del traced
+
+        latencies = []
+        matched = 0
+        for query in query_set:
+            started = time.perf_counter()
+            hits = index.search(query, limit=5)
+            latencies.append((time.perf_counter() - started) * 1e6)
+            matched += bool(hits)
+        latencies.sort()
+
+        results.append({
+            'foods': size,
+            'build_seconds': round(build_seconds, 2),
+            'index_bytes': index_bytes,
+            'stats': index.stats(),
+            'queries': len(query_set),
+            'matched': matched,
+            'p50_us': round(statistics.median(latencies), 1),
+            'p99_us': round(latencies[int(len(latencies) * 0.99) - 1], 1),
+            'max_us': round(latencies[-1], 1),
+        })
+    return results
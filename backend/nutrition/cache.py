@@ -0,0 +1,180 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from django.core.cache import caches
+
+
+MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process LRU cache with size-bounded eviction and optional TTL"""
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._entry_hits = {}  # key -> hits since the entry was set
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self._entry_hits.pop(key, None)
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            self._entry_hits[key] = self._entry_hits.get(key, 0) + 1
+            return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        if ttl is not None and ttl <= 0:
+            # Expired on arrival, as timeout=0 is for Django's caches: keep neither it nor an older copy
+            self.delete(key)
+            return
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            self._entry_hits[key] = 0
+            while len(self._data) > self.max_entries:
+                evicted, _ = self._data.popitem(last=False)
+                self._entry_hits.pop(evicted, None)
+                self.evictions += 1
+
+    def delete(self, key: Hashable):
+        with self._lock:
+            self._data.pop(key, None)
+            self._entry_hits.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._entry_hits.clear()
+
+    def entry_hits(self, key: Hashable) -> int:
+        return self._entry_hits.get(key, 0)
+
+    def most_hit(self, limit: int = 10) -> List[Tuple[Hashable, int]]:
+        """(key, hits) for the most reused entries"""
+        with self._lock:
+            entries = list(self._entry_hits.items())
+        return sorted(entries, key=lambda entry: entry[1], reverse=True)[:limit]
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else 0,
+        }
+
+
+class TwoTierCache:
+    """
+    Per-process LRU in front of a shared Django cache.
+    Values are wrapped before going to the shared tier so cached None/[] results
+    (negative entries) can be told apart from misses. The wrapper also carries the
+    entry's expiry (wall clock), so a copy pulled into the local tier expires with it.
+    """
+
+    def __init__(self, name: str, max_entries: int = 1024, ttl: int = 3600,
+                 negative_ttl: int = 300, alias: str = 'default'):
+        self.name = name
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.alias = alias
+        self.local = LRUCache(max_entries=max_entries, ttl=ttl)
+        self.shared_hits = 0
+        self.shared_misses = 0
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def make_key(self, key: Hashable) -> str:
+        digest = hashlib.sha1(json.dumps(key, default=str).encode()).hexdigest()
+        return f'{self.name}:{digest}'
+
+    def get(self, key: Hashable, default: Any = MISSING) -> Any:
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        wrapped = self.shared.get(self.make_key(key))
+        if wrapped is None:
+            self.shared_misses += 1
+            return default
+
+        self.shared_hits += 1
+        self._fill_local(key, wrapped)
+        return wrapped[0]
+
+    def set(self, key: Hashable, value: Any):
+        ttl = self.negative_ttl if self._is_negative(value) else self.ttl
+        self.local.set(key, value, ttl=ttl)
+        self.shared.set(self.make_key(key), (value, time.time() + ttl), timeout=ttl)
+
+    async def aget(self, key: Hashable, default: Any = MISSING) -> Any:
+        value = self.local.get(key, MISSING)
+        if value is not MISSING:
+            return value
+
+        wrapped = await self.shared.aget(self.make_key(key))
+        if wrapped is None:
+            self.shared_misses += 1
+            return default
+
+        self.shared_hits += 1
+        self._fill_local(key, wrapped)
+        return wrapped[0]
+
+    async def aset(self, key: Hashable, value: Any):
+        ttl = self.negative_ttl if self._is_negative(value) else self.ttl
+        self.local.set(key, value, ttl=ttl)
+        await self.shared.aset(self.make_key(key), (value, time.time() + ttl), timeout=ttl)
+
+    def delete(self, key: Hashable):
+        self.local.delete(key)
+        self.shared.delete(self.make_key(key))
+
+    def _fill_local(self, key: Hashable, wrapped: Tuple):
+        value, expires_at = wrapped
+        # Expires with the shared entry; one already due (or clocks disagree) isn't kept
+        self.local.set(key, value, ttl=expires_at - time.time())
+
+    @staticmethod
+    def _is_negative(value: Any) -> bool:
+        return value is None or value == []
+
+    def stats(self) -> Dict:
+        return {
+            'local': self.local.stats(),
+            'shared_hits': self.shared_hits,
+            'shared_misses': self.shared_misses,
+            'ttl': self.ttl,
+            'negative_ttl': self.negative_ttl,
+        }
@@ -0,0 +1,281 @@
+import csv
+import io
+import json
+import os
+import zipfile
+from itertools import groupby
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from meals.models import Food
+
+
+# FDC nutrient ids mapped to Food columns, in order of preference.
+# Foundation foods often only report Atwater energy (2047/2048) instead of 1008.
+FIELD_NUTRIENT_IDS = {
+    'calories_per_100g': (1008, 2047, 2048),
+    'protein_per_100g': (1003,),
+    'carbs_per_100g': (1005, 1050),
+    'fat_per_100g': (1004,),
+    'fiber_per_100g': (1079,),
+    'sugar_per_100g': (2000, 1063),
+    'sodium_per_100g': (1093,),
+    'calcium_per_100g': (1087,),
+    'iron_per_100g': (1089,),
+    'vitamin_c_per_100g': (1162,),
+}
+
+TRACKED_NUTRIENT_IDS = frozenset(
+    nutrient_id for ids in FIELD_NUTRIENT_IDS.values() for nutrient_id in ids
+)
+
+NUTRIENT_FIELDS = list(FIELD_NUTRIENT_IDS)
+
+# CLI data type -> (food.csv data_type, JSON dataType)
+DATA_TYPES = {
+    'foundation': ('foundation_food', 'Foundation'),
+    'sr_legacy': ('sr_legacy_food', 'SR Legacy'),
+    'survey': ('survey_fndds_food', 'Survey (FNDDS)'),
+}
+
+NAME_MAX_LENGTH = Food._meta.get_field('name').max_length
+
+READ_CHUNK_SIZE = 64 * 1024
+
+
+def build_record(fdc_id, description: str, amounts: Dict[int, float]) -> Optional[Dict]:
+    """Map FDC nutrient amounts (per 100g) onto Food columns"""
+    description = (description or '').strip()
+    if not description:
+        return None
+
+    record = {
+        'usda_id': str(fdc_id),
+        'name': description[:NAME_MAX_LENGTH],
+    }
+    for field, nutrient_ids in FIELD_NUTRIENT_IDS.items():
+        value = 0.0
+        for nutrient_id in nutrient_ids:
+            if amounts.get(nutrient_id) is not None:
+                value = float(amounts[nutrient_id])
+                break
+        record[field] = round(value, 3)
+    return record
+
+
+def iter_json_array(fp: TextIO, chunk_size: int = READ_CHUNK_SIZE) -> Iterator[Dict]:
+    """
+    Yield the objects of the first JSON array in a file one at a time.
+    Only the current object is held in memory, so multi-GB FDC exports
+    ({"FoundationFoods": [...]}, {"SRLegacyFoods": [...]}, ...) stream in constant memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    eof = False
+
+    def fill():
+        nonlocal buf, eof
+        chunk = fp.read(chunk_size)
+        if chunk:
+            buf += chunk
+        else:
+            eof = True
+
+    # Seek to the opening bracket of the array
+    while '[' not in buf:
+        if eof:
+            return
+        fill()
+    buf = buf[buf.index('[') + 1:]
+
+    while True:
+        stripped = buf.lstrip(' \t\r\n,')
+        if not stripped:
+            if eof:
+                raise ValueError('Unexpected end of JSON array')
+            buf = ''
+            fill()
+            continue
+        buf = stripped
+        if buf[0] == ']':
+            return
+        try:
+            obj, end = decoder.raw_decode(buf)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            fill()
+            continue
+        buf = buf[end:]
+        yield obj
+
+
+def iter_json_records(fp: TextIO, data_types: Iterable[str]) -> Iterator[Dict]:
+    """Stream Food records from an FDC JSON download"""
+    wanted = {DATA_TYPES[t][1] for t in data_types}
+    for food in iter_json_array(fp):
+        if food.get('dataType') and food['dataType'] not in wanted:
+            continue
+        amounts = {}
+        for nutrient in food.get('foodNutrients', []):
+            nutrient_id = (nutrient.get('nutrient') or {}).get('id')
+            if nutrient_id in TRACKED_NUTRIENT_IDS and nutrient.get('amount') is not None:
+                amounts[nutrient_id] = nutrient['amount']
+        record = build_record(food.get('fdcId'), food.get('description'), amounts)
+        if record:
+            yield record
+
+
+def iter_csv_records(food_fp: TextIO, food_nutrient_fp: TextIO,
+                     data_types: Iterable[str]) -> Iterator[Dict]:
+    """
+    Stream Food records from an FDC CSV download (food.csv + food_nutrient.csv).
+    food_nutrient.csv is ordered by fdc_id in FDC releases, so nutrients are
+    grouped per food on the fly; only the descriptions of the selected data
+    types are kept in memory, never the nutrient rows.
+    """
+    wanted = {DATA_TYPES[t][0] for t in data_types}
+    descriptions = {}
+    for row in csv.DictReader(food_fp):
+        if row.get('data_type') in wanted:
+            descriptions[row['fdc_id']] = row.get('description', '')
+
+    rows = csv.DictReader(food_nutrient_fp)
+    for fdc_id, group in groupby(rows, key=lambda row: row['fdc_id']):
+        description = descriptions.get(fdc_id)
+        if description is None:
+            continue
+        amounts = {}
+        for row in group:
+            try:
+                nutrient_id = int(row['nutrient_id'])
+            except (TypeError, ValueError):
+                continue
+            if nutrient_id in TRACKED_NUTRIENT_IDS and row.get('amount') not in (None, ''):
+                amounts[nutrient_id] = float(row['amount'])
+        record = build_record(fdc_id, description, amounts)
+        if record:
+            yield record
+
+
+def _open_text(binary_fp) -> TextIO:
+    return io.TextIOWrapper(binary_fp, encoding='utf-8-sig', newline='')
+
+
+def iter_source_records(path: str, data_types: Iterable[str]) -> Iterator[Dict]:
+    """
+    Stream Food records from an FDC download: a .json file, a directory
+    holding food.csv/food_nutrient.csv, or the original .zip of either
+    """
+    data_types = list(data_types)
+
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'food.csv'), encoding='utf-8-sig', newline='') as food_fp, \
+                open(os.path.join(path, 'food_nutrient.csv'), encoding='utf-8-sig', newline='') as nutrient_fp:
+            yield from iter_csv_records(food_fp, nutrient_fp, data_types)
+        return
+
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            members = {os.path.basename(name): name for name in archive.namelist()}
+            json_members = [name for name in archive.namelist() if name.endswith('.json')]
+            if json_members:
+                with archive.open(json_members[0]) as fp:
+                    yield from iter_json_records(_open_text(fp), data_types)
+            elif 'food.csv' in members and 'food_nutrient.csv' in members:
+                with archive.open(members['food.csv']) as food_fp, \
+                        archive.open(members['food_nutrient.csv']) as nutrient_fp:
+                    yield from iter_csv_records(_open_text(food_fp), _open_text(nutrient_fp), data_types)
+            else:
+                raise ValueError(f'{path}: no FDC JSON or CSV files found in archive')
+        return
+
+    with open(path, encoding='utf-8-sig') as fp:
+        yield from iter_json_records(fp, data_types)
+
+
+class FoodImporter:
+    """Upsert FDC records into the Food table in batches, skipping unchanged rows"""
+
+    COMPARED_FIELDS = ['name'] + NUTRIENT_FIELDS
+
+    def __init__(self, batch_size: int = 2000, dry_run: bool = False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.stats = {'created': 0, 'adopted': 0, 'updated': 0, 'unchanged': 0, 'renamed': 0}
+
+    def run(self, records: Iterable[Dict], on_batch=None) -> Dict:
+        batch = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= self.batch_size:
+                self.import_batch(batch)
+                batch = []
+                if on_batch:
+                    on_batch(self.stats)
+        if batch:
+            self.import_batch(batch)
+            if on_batch:
+                on_batch(self.stats)
+        return self.stats
+
+    def import_batch(self, records: List[Dict]):
+        # Later records win when FDC repeats an id inside the batch
+        by_id = {record['usda_id']: record for record in records}
+
+        existing = Food.objects.filter(
+            Q(usda_id__in=by_id.keys()) | Q(name__in=[r['name'] for r in by_id.values()])
+        ).values('id', 'usda_id', *self.COMPARED_FIELDS)
+        existing_by_id = {}
+        owner_by_name = {}
+        for row in existing:
+            if row['usda_id']:
+                existing_by_id[row['usda_id']] = row
+            owner_by_name[row['name']] = row['usda_id']
+
+        to_create = {}
+        to_update = []
+        for usda_id, record in by_id.items():
+            current = existing_by_id.get(usda_id)
+            # FDC descriptions are not unique across datasets; keep both foods. A new record
+            # adopts a hand-entered food (no usda_id) of the same name, but an existing row
+            # can't be renamed onto one, so it is suffixed like any other collision
+            taken = record['name'] in owner_by_name
+            owner = owner_by_name.get(record['name'])
+            renamed = taken and owner != usda_id and (bool(owner) or current is not None)
+            if renamed:
+                suffix = f' [{usda_id}]'
+                record['name'] = record['name'][:NAME_MAX_LENGTH - len(suffix)] + suffix
+            owner_by_name[record['name']] = usda_id
+
+            if current is not None and all(current[f] == record[f] for f in self.COMPARED_FIELDS):
+                self.stats['unchanged'] += 1
+                continue
+
+            if current is None:
+                # Written by the same upsert, but the row already existed
+                self.stats['adopted' if taken and not renamed else 'created'] += 1
+                to_create[record['name']] = record
+            else:
+                self.stats['updated'] += 1
+                to_update.append(Food(id=current['id'], updated_at=timezone.now(), **record))
+            if renamed:
+                self.stats['renamed'] += 1
+
+        if self.dry_run:
+            return
+
+        with transaction.atomic():
+            if to_update:
+                Food.objects.bulk_update(to_update, self.COMPARED_FIELDS + ['updated_at'])
+            if to_create:
+                # Adopt hand-entered foods with the same name instead of failing on the unique name
+                Food.objects.bulk_create(
+                    [Food(**record) for record in to_create.values()],
+                    update_conflicts=True,
+                    unique_fields=['name'],
+                    update_fields=['usda_id', 'updated_at'] + NUTRIENT_FIELDS,
+                )
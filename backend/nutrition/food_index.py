@@ -0,0 +1,416 @@
+import heapq
+import logging
+import re
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from decouple import config
+from django.db.models import Count, Max
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+NON_WORD_RE = re.compile(r'[^a-z0-9]+')
+EMPTY_POSTINGS = array('I')
+
+
+def normalize(name: str) -> str:
+    """Lowercase words separated by single spaces: "Chicken, breast (grilled)" -> "chicken breast grilled\""""
+    return ' '.join(NON_WORD_RE.split(name.lower())).strip()
+
+
+def trigrams(text: str) -> frozenset:
+    """pg_trgm-style trigrams of normalized text: each word padded with two spaces in front, one behind"""
+    grams = set()
+    for word in text.split():
+        padded = f'  {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a: frozenset, b: frozenset) -> float:
+    """Shared trigrams over all trigrams (pg_trgm similarity)"""
+    if not a or not b:
+        return 0.0
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared)
+
+
+class _IndexState:
+    """Everything a search reads, swapped as one object so a rebuild never shows half an index"""
+
+    def __init__(self):
+        self.entries: List[Optional[Tuple[int, str, Tuple[int, ...]]]] = []  # (food id, name, word ids)
+        self.entries_by_food: Dict[int, List[int]] = {}
+        self.removed = 0
+        # Vocabulary, with a trigram index over it for fuzzy word matches
+        self.word_ids: Dict[str, int] = {}
+        self.word_grams: List[frozenset] = []
+        # trigram -> (trigram counts, word ids): the words holding it, fewest trigrams first
+        self.grams: Dict[str, Tuple[array, array]] = {}
+        self.word_entries: List[int] = []  # live entries per word, to visit rare words first
+        # Per word: entry length in words -> entry ids, so short (closer) names are visited first
+        self.postings: List[Dict[int, array]] = []
+        self.max_length = 0
+
+    def word_id(self, word: str) -> int:
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = self.word_ids[word] = len(self.word_grams)
+            self.word_grams.append(trigrams(word))
+            self.word_entries.append(0)
+            self.postings.append({})
+            size = len(self.word_grams[word_id])
+            for gram in self.word_grams[word_id]:
+                sizes, word_ids = self.grams.setdefault(gram, (array('I'), array('I')))
+                at = bisect_right(sizes, size)
+                sizes.insert(at, size)
+                word_ids.insert(at, word_id)
+        return word_id
+
+    def add(self, food_id: int, names: Iterable[str]):
+        entry_ids = self.entries_by_food.setdefault(food_id, [])
+        for name in dict.fromkeys(names):
+            word_ids = tuple(sorted({self.word_id(word) for word in normalize(name).split()}))
+            if not word_ids:
+                continue
+            entry_id = len(self.entries)
+            self.entries.append((food_id, name, word_ids))
+            entry_ids.append(entry_id)
+            length = len(word_ids)
+            self.max_length = max(self.max_length, length)
+            for word_id in word_ids:
+                self.word_entries[word_id] += 1
+                self.postings[word_id].setdefault(length, array('I')).append(entry_id)
+
+    def remove(self, food_id: int):
+        for entry_id in self.entries_by_food.pop(food_id, ()):
+            for word_id in self.entries[entry_id][2]:
+                self.word_entries[word_id] -= 1
+            # Postings keep the id until compaction; searches skip removed entries
+            self.entries[entry_id] = None
+            self.removed += 1
+
+    def live_names(self) -> Dict[int, List[str]]:
+        names = {}
+        for entry in self.entries:
+            if entry is not None:
+                names.setdefault(entry[0], []).append(entry[1])
+        return names
+
+
+class FoodIndex:
+    """
+    In-process inverted index over Food.name and Food.aliases, with trigram fuzzy matching.
+    Query words are matched to vocabulary words by trigram similarity (plurals, typos), and
+    names are scored by fuzzy word overlap: matched weight / (query words + name words - matched).
+    Postings are split by name length and visited shortest first, rarest word first, and a
+    search stops once no unvisited name can beat its results, so only a few names are
+    scored however large the table is (never more than MAX_SCANNED).
+    """
+
+    # Vocabulary words each query word may match, and how close they must be
+    WORD_MATCHES = 3
+    WORD_MIN_SIMILARITY = 0.4
+    KNOWN_WORD_MIN_SIMILARITY = 0.6
+    # Names looked at per search, at most
+    MAX_SCANNED = config('FOOD_INDEX_MAX_SCANNED', default=2000, cast=int)
+    # Removed entries, as a share of all entries, before the index is rebuilt
+    COMPACT_RATIO = 0.25
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = _IndexState()
+
+    def __len__(self):
+        return len(self._state.entries_by_food)
+
+    def build(self, foods: Iterable[Tuple[int, str, List[str]]]):
+        """Index (id, name, aliases) rows, replacing the current contents"""
+        state = _IndexState()
+        for food_id, name, aliases in foods:
+            state.add(food_id, [name, *(aliases or ())])
+        with self._lock:
+            self._state = state
+
+    def upsert(self, food_id: int, name: str, aliases: Optional[List[str]] = None):
+        with self._lock:
+            self._state.remove(food_id)
+            self._state.add(food_id, [name, *(aliases or ())])
+            self._maybe_compact()
+
+    def remove(self, food_id: int):
+        with self._lock:
+            self._state.remove(food_id)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        state = self._state
+        if state.removed > self.COMPACT_RATIO * max(len(state.entries), 1):
+            compacted = _IndexState()
+            for food_id, names in state.live_names().items():
+                compacted.add(food_id, names)
+            self._state = compacted
+
+    def _similar_words(self, state: _IndexState, word: str) -> Dict[int, float]:
+        """Vocabulary word id -> similarity for the closest live words to `word`"""
+        word_id = state.word_ids.get(word)
+        known = word_id is not None and state.word_entries[word_id]
+        if known and len(word) < 4:
+            # Short words have too few trigrams to fuzz on
+            return {word_id: 1.0}
+
+        # A word the vocabulary knows only pulls in near spellings (plurals), not every lookalike
+        min_similarity = self.KNOWN_WORD_MIN_SIMILARITY if known else self.WORD_MIN_SIMILARITY
+        grams = trigrams(word)
+        # Similarity is at most min(A, B) / max(A, B) for A and B trigrams, so only words of a
+        # comparable size can reach the minimum ("2" shares a trigram with every "2..." word)
+        smallest, largest = len(grams) * min_similarity, len(grams) / min_similarity
+        hits = Counter()
+        for gram in grams:
+            if gram in state.grams:
+                sizes, word_ids = state.grams[gram]
+                hits.update(word_ids[bisect_left(sizes, smallest):bisect_right(sizes, largest)])
+        scored = [
+            (similarity(grams, state.word_grams[candidate]), candidate)
+            for candidate, _ in hits.most_common(self.WORD_MATCHES * 4)
+            if state.word_entries[candidate]
+        ]
+        return {
+            candidate: score
+            for score, candidate in heapq.nlargest(self.WORD_MATCHES, scored)
+            if score >= min_similarity
+        }
+
+    def search(self, query: str, limit: int = 5, min_score: float = 0.3) -> List[Dict]:
+        """Best matching foods as {'food_id', 'name', 'score'}, highest score first; one hit per food"""
+        query_words = list(dict.fromkeys(normalize(query).split()))
+        if not query_words:
+            return []
+
+        state = self._state
+        wanted = len(query_words)
+        # vocabulary word -> [(query word position, similarity)]
+        word_hits: Dict[int, List[Tuple[int, float]]] = {}
+        best_per_word = []
+        for position, word in enumerate(query_words):
+            similar = self._similar_words(state, word)
+            for word_id, score in similar.items():
+                word_hits.setdefault(word_id, []).append((position, score))
+            if similar:
+                best_per_word.append(max(similar.values()))
+        if not word_hits:
+            return []
+        best_per_word.sort(reverse=True)
+        # Every query word matched exactly one vocabulary word, and no two the same one
+        exact_words = len(word_hits) == len(best_per_word) and all(
+            len(hits) == 1 and hits[0][1] == 1.0 for hits in word_hits.values()
+        )
+        hit_ids = frozenset(word_hits)
+
+        def bound(length, weights):
+            # Highest score a name of `length` words matching at most these query words could reach
+            matched = min(length, len(weights))
+            return sum(weights[:matched]) / (wanted + length - matched)
+
+        # Rarest vocabulary words first; suffix_weights[j]: best similarity per query word that
+        # only words j.. can still contribute, for names not in any rarer word's postings
+        sources = sorted(word_hits, key=state.word_entries.__getitem__)
+        suffix_weights = []
+        covered = {}
+        for word_id in reversed(sources):
+            for position, score in word_hits[word_id]:
+                covered[position] = max(covered.get(position, 0), score)
+            suffix_weights.append(sorted(covered.values(), reverse=True))
+        suffix_weights.reverse()
+
+        entries = state.entries
+        best = {}  # food id -> (score, entry id)
+        floor = min_score  # score to beat: min_score, or the limit-th best once there are enough
+        scanned = 0
+
+        def hopeless(reachable):
+            # Once the results are full, a tie can't get in either
+            return reachable < floor or (len(best) >= limit and reachable <= floor)
+        for length in range(1, state.max_length + 1):
+            if length >= len(best_per_word) and hopeless(bound(length, best_per_word)):
+                break  # the bound only falls from here
+
+            # Count query-word hits per name at this length in C (Counter over uint32 arrays).
+            # Once names only the remaining (commoner) words match can't reach the floor, those
+            # words only add to names already counted, so candidates stay few and counts exact
+            hits = Counter()
+            for word_id, weights in zip(sources, suffix_weights):
+                postings = state.postings[word_id].get(length, EMPTY_POSTINGS)
+                if hopeless(bound(length, weights)):
+                    if not hits:
+                        break
+                    hits.update(hits.keys() & postings)
+                else:
+                    hits.update(postings)
+
+            # Most hits first: score exactly until the hit count can't beat the floor
+            reachable = {}
+            for entry_id, count in hits.most_common():
+                if count not in reachable:
+                    reachable[count] = bound(length, best_per_word[:count])
+                if hopeless(reachable[count]) or scanned >= self.MAX_SCANNED:
+                    break
+                entry = entries[entry_id]
+                if entry is None:
+                    continue
+                scanned += 1
+
+                if exact_words:
+                    score = count / (wanted + length - count)
+                else:
+                    positions = {}
+                    for entry_word in hit_ids.intersection(entry[2]):
+                        for position, score in word_hits[entry_word]:
+                            if score > positions.get(position, 0):
+                                positions[position] = score
+                    score = sum(positions.values()) / (wanted + length - len(positions))
+                food_id = entry[0]
+                if not hopeless(score) and score > best.get(food_id, (0, None))[0]:
+                    best[food_id] = (score, entry_id)
+                    if len(best) >= limit:
+                        floor = heapq.nlargest(limit, (score for score, _ in best.values()))[-1]
+
+        results = heapq.nlargest(limit, best.items(), key=lambda item: item[1][0])
+        return [
+            {'food_id': food_id, 'name': entries[entry_id][1], 'score': round(score, 3)}
+            for food_id, (score, entry_id) in results
+        ]
+
+    def stats(self) -> Dict:
+        state = self._state
+        return {
+            'foods': len(state.entries_by_food),
+            'entries': len(state.entries) - state.removed,
+            'removed_entries': state.removed,
+            'words': len(state.word_ids),
+            'postings': sum(len(ids) for by_length in state.postings for ids in by_length.values()),
+        }
+
+
+class FoodIndexService:
+    """
+    The process-wide FoodIndex over the Food table: built in the background at server
+    start (warm()) or, in processes that don't warm it, on first use; updated by Food
+    save/delete signals in this process, and re-synced every REFRESH_SECONDS so writes
+    from other processes and bulk imports, which send no signals, show up too.
+    """
+
+    REFRESH_SECONDS = config('FOOD_INDEX_REFRESH_SECONDS', default=30, cast=int)
+    PRELOAD = config('FOOD_INDEX_PRELOAD', default=True, cast=bool)
+    MIN_SCORE = config('FOOD_INDEX_MIN_SCORE', default=0.45, cast=float)
+
+    index = FoodIndex()
+    _built = False
+    _build_lock = threading.Lock()
+    _warming = None  # warm()'s build thread
+    _synced_at = 0.0  # monotonic time of the last sync
+    _high_water = None  # latest Food.updated_at indexed
+    _count = 0
+
+    @staticmethod
+    def _rows(queryset):
+        return queryset.values_list('id', 'name', 'aliases').iterator(chunk_size=5000)
+
+    @classmethod
+    def _watermark(cls):
+        from meals.models import Food
+
+        return Food.objects.aggregate(count=Count('id'), updated=Max('updated_at'))
+
+    @classmethod
+    def build(cls):
+        from meals.models import Food
+
+        started = time.perf_counter()
+        mark = cls._watermark()
+        cls.index.build(cls._rows(Food.objects.order_by('id')))
+        cls._count, cls._high_water = mark['count'], mark['updated']
+        cls._synced_at = time.monotonic()
+        cls._built = True
+        logger.info("Food index built: %s foods in %.2fs", len(cls.index), time.perf_counter() - started)
+
+    @classmethod
+    def sync(cls):
+        """Pick up rows changed since the last build/sync; rebuild if rows were deleted elsewhere"""
+        from meals.models import Food
+
+        mark = cls._watermark()
+        cls._synced_at = time.monotonic()
+        if mark['updated'] == cls._high_water and mark['count'] == cls._count:
+            return
+
+        changed = Food.objects.all()
+        if cls._high_water is not None:
+            changed = changed.filter(updated_at__gt=cls._high_water)
+        for food_id, name, aliases in cls._rows(changed):
+            cls.index.upsert(food_id, name, aliases)
+        cls._high_water = mark['updated']
+
+        cls._count = mark['count']
+        if len(cls.index) != mark['count']:
+            cls.build()
+
+    @classmethod
+    def _build_once(cls):
+        with cls._build_lock:
+            if not cls._built:
+                cls.build()
+
+    @classmethod
+    def get_index(cls) -> Optional[FoodIndex]:
+        """The index, or None while warm()'s build runs: requests don't wait for (or repeat) it"""
+        if not cls._built:
+            if cls._warming is not None and cls._warming.is_alive():
+                return None
+            cls._build_once()
+        elif time.monotonic() - cls._synced_at > cls.REFRESH_SECONDS:
+            with cls._build_lock:
+                if time.monotonic() - cls._synced_at > cls.REFRESH_SECONDS:
+                    cls.sync()
+        return cls.index
+
+    @classmethod
+    def search(cls, query: str, limit: int = 5, min_score: Optional[float] = None) -> List[Dict]:
+        """Matches from the index; none until it is built, so callers keep their exact-match results"""
+        index = cls.get_index()
+        if index is None:
+            return []
+        return index.search(query, limit=limit, min_score=cls.MIN_SCORE if min_score is None else min_score)
+
+    @classmethod
+    def warm(cls):
+        """Build the index in the background when the server starts (config/wsgi.py, config/asgi.py)"""
+        if cls.PRELOAD and not cls._built:
+            cls._warming = threading.Thread(target=cls._build_once, name='food-index-build', daemon=True)
+            cls._warming.start()
+
+    @classmethod
+    def stats(cls) -> Dict:
+        stats = cls.index.stats()
+        stats['built'] = cls._built
+        stats['warming'] = cls._warming is not None and cls._warming.is_alive()
+        return stats
+
+
+@receiver(post_save, sender='meals.Food')
+def index_food_on_save(sender, instance, **kwargs):
+    # Before the first build there is nothing to update: the build reads the table
+    if FoodIndexService._built:
+        FoodIndexService.index.upsert(instance.id, instance.name, instance.aliases)
+
+
+@receiver(post_delete, sender='meals.Food')
+def unindex_food_on_delete(sender, instance, **kwargs):
+    if FoodIndexService._built:
+        FoodIndexService.index.remove(instance.id)
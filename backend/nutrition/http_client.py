@@ -0,0 +1,372 @@
+import asyncio
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from decouple import config
+from requests.adapters import HTTPAdapter
+
+
+class HTTPClientError(Exception):
+    """Base class for errors raised before a request reaches the upstream"""
+
+
+class CircuitOpenError(HTTPClientError):
+    """The upstream host failed repeatedly; callers should use their fallback path"""
+
+
+class PoolExhaustedError(HTTPClientError):
+    """No connection slot for the host became free within the timeout"""
+
+
+class CircuitBreaker:
+    """Closed -> open after N consecutive failures -> half-open probe after a cool-down"""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> Tuple[bool, bool]:
+        """(allowed, probe): probe when this call took the half-open probe slot and must end it"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True, False
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.HALF_OPEN and not self._probing:
+                # Let exactly one request through to test the upstream
+                self._probing = True
+                return True, True
+            return False, False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release_probe(self):
+        """End a half-open probe that produced no verdict, so the next request can probe"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+
+class HostStats:
+    """Request counters and latency percentiles over the most recent calls to a host"""
+
+    def __init__(self, window: int = 500):
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.short_circuited = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, elapsed_ms: float, error: bool = False):
+        with self._lock:
+            self.requests += 1
+            self.errors += int(error)
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+            self.recent.append(elapsed_ms)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            recent = sorted(self.recent)
+            requests_count = self.requests
+
+            def percentile(p):
+                if not recent:
+                    return 0
+                return round(recent[min(len(recent) - 1, int(len(recent) * p))], 1)
+
+            return {
+                'requests': requests_count,
+                'errors': self.errors,
+                'retries': self.retries,
+                'short_circuited': self.short_circuited,
+                'avg_ms': round(self.total_ms / requests_count, 1) if requests_count else 0,
+                'p50_ms': percentile(0.50),
+                'p95_ms': percentile(0.95),
+                'max_ms': round(self.max_ms, 1),
+            }
+
+
+class HostState:
+    """Everything the client keeps per upstream host"""
+
+    def __init__(self, pool_maxsize: int, failure_threshold: int, reset_timeout: float):
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.stats = HostStats()
+        self.slots = threading.BoundedSemaphore(pool_maxsize)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize, pool_block=True)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+
+class HTTPClient:
+    """
+    Shared HTTP client for upstream APIs (USDA, OpenAI).
+    Keeps a keep-alive connection pool per host, caps concurrent requests per host,
+    retries 429/5xx and connection errors with jittered exponential backoff, and
+    trips a per-host circuit breaker so callers fail fast to their local fallback.
+    """
+
+    RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+    POOL_MAXSIZE = config('HTTP_POOL_MAXSIZE', default=10, cast=int)
+    MAX_RETRIES = config('HTTP_MAX_RETRIES', default=2, cast=int)
+    BACKOFF_BASE = config('HTTP_BACKOFF_BASE', default=0.25, cast=float)
+    BACKOFF_MAX = config('HTTP_BACKOFF_MAX', default=4.0, cast=float)
+    BREAKER_FAILURES = config('HTTP_BREAKER_FAILURES', default=5, cast=int)
+    BREAKER_RESET_SECONDS = config('HTTP_BREAKER_RESET_SECONDS', default=30, cast=float)
+
+    def __init__(self, pool_maxsize: Optional[int] = None, max_retries: Optional[int] = None,
+                 failure_threshold: Optional[int] = None, reset_timeout: Optional[float] = None):
+        self.pool_maxsize = pool_maxsize or self.POOL_MAXSIZE
+        self.max_retries = self.MAX_RETRIES if max_retries is None else max_retries
+        self.failure_threshold = failure_threshold or self.BREAKER_FAILURES
+        self.reset_timeout = self.BREAKER_RESET_SECONDS if reset_timeout is None else reset_timeout
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def host_state(self, host: str) -> HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            with self._lock:
+                state = self._hosts.get(host)
+                if state is None:
+                    state = HostState(self.pool_maxsize, self.failure_threshold, self.reset_timeout)
+                    self._hosts[host] = state
+        return state
+
+    def backoff_delay(self, attempt: int, response: Optional[requests.Response] = None) -> float:
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), self.BACKOFF_MAX)
+        # Full jitter: spreads retries from many workers instead of synchronizing them
+        return random.uniform(0, min(self.BACKOFF_MAX, self.BACKOFF_BASE * (2 ** attempt)))
+
+    def request(self, method: str, url: str, timeout: float = 5, **kwargs) -> requests.Response:
+        host = urlsplit(url).netloc
+        state = self.host_state(host)
+
+        allowed, probe = state.breaker.allow_request()
+        if not allowed:
+            state.stats.short_circuited += 1
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        try:
+            return self._send(state, host, method, url, timeout, **kwargs)
+        finally:
+            if probe:
+                # No-op after record_success/record_failure; frees a probe that ended otherwise
+                state.breaker.release_probe()
+
+    def _send(self, state: HostState, host: str, method: str, url: str, timeout: float,
+              **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            if not state.slots.acquire(timeout=timeout):
+                # Our own pool is saturated; says nothing about the upstream's health
+                raise PoolExhaustedError(f"No free connection to {host} after {timeout}s")
+
+            started = time.perf_counter()
+            response = None
+            try:
+                response = state.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                state.stats.record((time.perf_counter() - started) * 1000, error=True)
+                if attempt >= self.max_retries:
+                    state.breaker.record_failure()
+                    raise
+            except Exception:
+                # Not retried (bad encoding, redirect loop, a hook), but still a failed call
+                state.stats.record((time.perf_counter() - started) * 1000, error=True)
+                state.breaker.record_failure()
+                raise
+            finally:
+                state.slots.release()
+
+            if response is not None:
+                retryable = response.status_code in self.RETRY_STATUSES
+                state.stats.record((time.perf_counter() - started) * 1000, error=retryable)
+                if not retryable or attempt >= self.max_retries:
+                    if retryable:
+                        state.breaker.record_failure()
+                    else:
+                        state.breaker.record_success()
+                    return response
+
+            time.sleep(self.backoff_delay(attempt, response))
+            attempt += 1
+            state.stats.retries += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request('POST', url, **kwargs)
+
+    def stats(self) -> Dict:
+        return {
+            host: dict(state.stats.snapshot(), circuit=state.breaker.state)
+            for host, state in list(self._hosts.items())
+        }
+
+
+class AsyncHTTPClient:
+    """
+    asyncio counterpart of HTTPClient for async views under config/asgi.py.
+    Shares circuit breakers and latency stats with the sync client, so both paths see
+    the same upstream health; connections and concurrency slots are per event loop.
+    """
+
+    def __init__(self, sync_client: HTTPClient, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.sync_client = sync_client
+        self.transport = transport
+        self._loops = weakref.WeakKeyDictionary()  # loop -> (httpx.AsyncClient, {host: Semaphore})
+
+    def _loop_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loops.get(loop)
+        if state is None:
+            limits = httpx.Limits(max_keepalive_connections=self.sync_client.pool_maxsize)
+            state = (httpx.AsyncClient(limits=limits, transport=self.transport), {})
+            self._loops[loop] = state
+        return state
+
+    async def aclose(self):
+        """Close the running loop's connections (ASGI lifespan shutdown, see config/asgi.py)"""
+        state = self._loops.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state[0].aclose()
+
+    async def request(self, method: str, url: str, timeout: float = 5, **kwargs) -> httpx.Response:
+        client = self.sync_client
+        host = urlsplit(url).netloc
+        state = client.host_state(host)
+
+        allowed, probe = state.breaker.allow_request()
+        if not allowed:
+            state.stats.short_circuited += 1
+            raise CircuitOpenError(f"Circuit open for {host}")
+
+        try:
+            return await self._send(state, host, method, url, timeout, **kwargs)
+        finally:
+            if probe:
+                # Also reached on cancellation (CancelledError), which no except clause sees
+                state.breaker.release_probe()
+
+    async def _send(self, state: HostState, host: str, method: str, url: str, timeout: float,
+                    **kwargs) -> httpx.Response:
+        client = self.sync_client
+        http, slots = self._loop_state()
+        if host not in slots:
+            slots[host] = asyncio.Semaphore(client.pool_maxsize)
+
+        attempt = 0
+        while True:
+            try:
+                await asyncio.wait_for(slots[host].acquire(), timeout)
+            except TimeoutError:
+                # Our own pool is saturated; says nothing about the upstream's health
+                raise PoolExhaustedError(f"No free connection to {host} after {timeout}s") from None
+
+            started = time.perf_counter()
+            response = None
+            try:
+                async with asyncio.timeout(timeout):
+                    response = await http.request(method, url, timeout=timeout, **kwargs)
+            except (httpx.TransportError, TimeoutError):
+                state.stats.record((time.perf_counter() - started) * 1000, error=True)
+                if attempt >= client.max_retries:
+                    state.breaker.record_failure()
+                    raise
+            except Exception:
+                # Other httpx.HTTPErrors (decoding, redirects, ...): not retried, still a failure
+                state.stats.record((time.perf_counter() - started) * 1000, error=True)
+                state.breaker.record_failure()
+                raise
+            finally:
+                slots[host].release()
+
+            if response is not None:
+                retryable = response.status_code in client.RETRY_STATUSES
+                state.stats.record((time.perf_counter() - started) * 1000, error=retryable)
+                if not retryable or attempt >= client.max_retries:
+                    if retryable:
+                        state.breaker.record_failure()
+                    else:
+                        state.breaker.record_success()
+                    return response
+
+            await asyncio.sleep(client.backoff_delay(attempt, response))
+            attempt += 1
+            state.stats.retries += 1
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('GET', url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request('POST', url, **kwargs)
+
+
+_client = None
+_async_client = None
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HTTPClient:
+    """Process-wide client, so every caller shares the same pools and breakers"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = HTTPClient()
+    return _client
+
+
+def get_async_http_client() -> AsyncHTTPClient:
+    global _async_client
+    if _async_client is None:
+        sync_client = get_http_client()
+        with _client_lock:
+            if _async_client is None:
+                _async_client = AsyncHTTPClient(sync_client)
+    return _async_client
+
+
+async def close_async_http_client():
+    """Close the async client's connections on the running loop, if it was ever used"""
+    if _async_client is not None:
+        await _async_client.aclose()
@@ -0,0 +1,165 @@
+from typing import Dict, List, Optional, Tuple
+
+from decouple import config
+from django.db.models import Q
+from django.db.models.functions import Length, Lower
+
+from .cache import MISSING, LRUCache
+from .food_index import FoodIndexService
+
+NUTRIENTS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+
+
+class LocalNutritionEngine:
+    """
+    Nutrition from the Food table: each parsed item is resolved to a Food row and its
+    *_per_100g values scaled by quantity_grams. No network; returns None when an item
+    can't be resolved so the caller can fall back to the LLM.
+    """
+
+    ENABLED = config('LOCAL_ANALYSIS_ENABLED', default=True, cast=bool)
+
+    # Match quality per resolution step; the meal's confidence is the gram-weighted mean
+    EXACT_MATCH = 1.0
+    VARIANT_MATCH = 0.95  # singular/plural of the parsed name
+    PREFIX_MATCH = 0.75  # "egg" -> "Egg, whole, raw"
+    # Fuzzy matches (typos, reordered words, aliases) score FUZZY_MATCH * the index's similarity
+    FUZZY_MATCH = 0.9
+    # Index similarity a fuzzy match needs to count; below it the item goes to the LLM
+    # ("grilled chicken thigh" is only 0.5 like "Chicken, breast, grilled")
+    FUZZY_MIN_SCORE = config('LOCAL_ANALYSIS_FUZZY_MIN_SCORE', default=0.7, cast=float)
+    # Portions like "2 slices" are estimates, so even exact matches stay below 1
+    MAX_CONFIDENCE = 0.9
+
+    # Resolved name -> (food, quality); short TTL so changed Food rows show up. Misses aren't
+    # kept, so a new Food row (or a food index still building at startup) is used right away
+    memo = LRUCache(
+        max_entries=config('LOCAL_ANALYSIS_MEMO_SIZE', default=5000, cast=int),
+        ttl=config('LOCAL_ANALYSIS_MEMO_TTL', default=300, cast=int),
+    )
+
+    FOOD_FIELDS = ('id', 'name', *(f'{nutrient}_per_100g' for nutrient in NUTRIENTS))
+
+    @classmethod
+    def analyze(cls, parsed_foods: Optional[List[Dict]]) -> Optional[Dict]:
+        """Analysis in NutritionAI's format plus the resolved 'foods', or None to escalate"""
+        if not cls.ENABLED or not parsed_foods:
+            return None
+
+        resolved = cls.resolve([item['food'] for item in parsed_foods])
+        if any(match is None for match in resolved):
+            return None
+
+        foods = []
+        totals = dict.fromkeys(NUTRIENTS, 0.0)
+        weighted_quality = 0.0
+        grams = 0.0
+        for item, (food, quality) in zip(parsed_foods, resolved):
+            ratio = item['quantity_grams'] / 100
+            values = {nutrient: food[f'{nutrient}_per_100g'] * ratio for nutrient in NUTRIENTS}
+            for nutrient, value in values.items():
+                totals[nutrient] += value
+            weighted_quality += quality * item['quantity_grams']
+            grams += item['quantity_grams']
+            foods.append({
+                'food_id': food['id'],
+                'name': food['name'],
+                'quantity_grams': item['quantity_grams'],
+                'match': quality,
+                **{nutrient: round(value, 1) for nutrient, value in values.items()},
+            })
+
+        from .ai_service import NutritionAI
+
+        totals = {nutrient: round(value, 1) for nutrient, value in totals.items()}
+        quality = weighted_quality / grams if grams else 0
+        return {
+            **totals,
+            'recommendations': NutritionAI.recommendations_for(totals['protein'], totals['carbs'], totals['fiber']),
+            'confidence_score': round(quality * cls.MAX_CONFIDENCE, 2),
+            'source': 'local',
+            'foods': foods,
+        }
+
+    @staticmethod
+    def _variants(name: str) -> List[str]:
+        """Singular/plural spellings to try after the exact name"""
+        variants = []
+        if name.endswith('ies'):
+            variants.append(name[:-3] + 'y')
+        elif name.endswith(('oes', 'ches', 'shes', 'ses', 'xes')):
+            variants.append(name[:-2])
+        if name.endswith('s') and not name.endswith('ss'):
+            variants.append(name[:-1])
+        else:
+            variants.append(name + 's')
+        return variants
+
+    @classmethod
+    def resolve(cls, names: List[str]) -> List[Optional[Tuple[Dict, float]]]:
+        """(food values, match quality) for each name, or None where nothing matched"""
+        from meals.models import Food
+
+        keys = [' '.join(name.lower().split()) for name in names]
+        found = {}
+        pending = []
+        for key in dict.fromkeys(keys):
+            match = cls.memo.get(key, MISSING)
+            if match is MISSING:
+                pending.append(key)
+            else:
+                found[key] = match
+
+        if pending:
+            candidates = {}  # lowercased Food name -> [(parsed key, quality)]
+            for key in pending:
+                candidates.setdefault(key, []).append((key, cls.EXACT_MATCH))
+                for variant in cls._variants(key):
+                    candidates.setdefault(variant, []).append((key, cls.VARIANT_MATCH))
+
+            # Every exact and plural/singular lookup in one query on the lower(name) index
+            rows = (
+                Food.objects.annotate(name_lower=Lower('name'))
+                .filter(name_lower__in=list(candidates))
+                .values('name_lower', *cls.FOOD_FIELDS)
+            )
+            for row in rows:
+                for key, quality in candidates[row.pop('name_lower')]:
+                    if key not in found or found[key][1] < quality:
+                        found[key] = (row, quality)
+
+            for key in pending:
+                if key not in found:
+                    # USDA-style names: "Egg, whole, raw" for "eggs"; shortest name is the most generic
+                    prefixes = Q()
+                    for name in (key, *cls._variants(key)):
+                        prefixes |= Q(name_lower__startswith=f'{name},')
+                    food = (
+                        Food.objects.annotate(name_lower=Lower('name'))
+                        .filter(prefixes)
+                        .order_by(Length('name'), 'name')
+                        .values(*cls.FOOD_FIELDS)
+                        .first()
+                    )
+                    found[key] = (food, cls.PREFIX_MATCH) if food else cls._fuzzy_match(key)
+                if found[key] is not None:
+                    cls.memo.set(key, found[key])
+
+        return [found[key] for key in keys]
+
+    @classmethod
+    def _fuzzy_match(cls, key: str) -> Optional[Tuple[Dict, float]]:
+        """Closest Food by the in-memory trigram index, for typos, word order and aliases"""
+        from meals.models import Food
+
+        hits = FoodIndexService.search(key, limit=1, min_score=cls.FUZZY_MIN_SCORE)
+        if not hits:
+            return None
+        food = Food.objects.filter(id=hits[0]['food_id']).values(*cls.FOOD_FIELDS).first()
+        if food is None:  # deleted since it was indexed
+            return None
+        return food, round(cls.FUZZY_MATCH * hits[0]['score'], 3)
+
+    @classmethod
+    def memo_stats(cls) -> Dict:
+        return cls.memo.stats()
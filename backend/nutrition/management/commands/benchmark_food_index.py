@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from nutrition.benchmarks import run_food_index_benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmark FoodIndex build time, memory and search latency on synthetic food tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,400000', help='Comma-separated table sizes')
+        parser.add_argument('--queries', type=int, default=500)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options['sizes'].split(',')]
+        for result in run_food_index_benchmark(sizes=sizes, queries=options['queries']):
+            self.stdout.write(
+                f"{result['foods']:>7} foods: build {result['build_seconds']:>6}s   "
+                f"memory {result['index_bytes'] / 2 ** 20:>7.1f} MiB   "
+                f"search p50 {result['p50_us']:>7} us  p99 {result['p99_us']:>7} us  "
+                f"max {result['max_us']:>7} us   "
+                f"({result['matched']}/{result['queries']} queries matched)"
+            )
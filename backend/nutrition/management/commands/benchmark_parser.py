@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from nutrition.benchmarks import run_parser_benchmark
+
+
+class Command(BaseCommand):
+    help = "Benchmark MealParser against the legacy split/re.search parser on a realistic corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        result = run_parser_benchmark(iterations=options['iterations'])
+
+        self.stdout.write(
+            f"Corpus: {result['corpus_size']} descriptions, {result['corpus_chars']} chars"
+        )
+        for name in ('legacy', 'tokenizer'):
+            stats = result[name]
+            self.stdout.write(
+                f"{name:>10}: {stats['parses_per_sec']:>8} parses/sec   "
+                f"peak alloc {stats['peak_alloc_bytes'] / 1024:.1f} KiB per corpus pass"
+            )
+
+        speedup = result['tokenizer']['parses_per_sec'] / max(result['legacy']['parses_per_sec'], 1)
+        self.stdout.write(f"Speedup: {speedup:.2f}x")
+
+        if result['mismatches']:
+            self.stdout.write(self.style.ERROR(
+                f"{len(result['mismatches'])} descriptions parse differently:"
+            ))
+            for description in result['mismatches']:
+                self.stdout.write(f"  {description!r}")
+        else:
+            self.stdout.write(self.style.SUCCESS("Output identical to the legacy parser"))
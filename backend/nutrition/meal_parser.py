@@ -1,10 +1,15 @@
 import re
-from typing import List, Dict, Tuple, Optional
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, List, Dict, Tuple, Optional
+
+from decouple import config
+
+from .cache import MISSING, LRUCache
 
 
 class MealParser:
     """Parse meal descriptions into individual food items with quantities"""
-    
+
     # Common portion size patterns
     PORTION_PATTERNS = {
         r'(\d+(?:\.\d+)?)\s*(?:cups?|c)': ('cup', 1),
@@ -17,75 +22,165 @@ class MealParser:
         r'(\d+(?:\.\d+)?)\s*(?:slices?)': ('slice', 30),  # estimate
         r'(\d+(?:\.\d+)?)\s*(?:servings?)': ('serving', 150),  # estimate
     }
-    
+
     # Common separators
     SEPARATORS = [',', ' and ', ' with ', '\n', ';']
-    
+
+    STOP_WORDS = frozenset(['a', 'an', 'the', 'some', 'of'])
+
+    # Units in PORTION_PATTERNS order: when a fragment mentions several units,
+    # the one listed first sets the quantity
+    UNITS = [
+        (r'cups?|c', 1),
+        (r'tablespoons?|tbsp', 1),
+        (r'teaspoons?|tsp', 1),
+        (r'ounces?|oz', 28.35),
+        (r'pounds?|lbs?', 453.59),
+        (r'grams?|g', 1),
+        (r'pieces?|pcs?', 100),
+        (r'slices?', 30),
+        (r'servings?', 150),
+    ]
+    GRAMS_PER_UNIT = [grams for _, grams in UNITS]
+
+    # One alternation finds separators and quantities in a single left-to-right scan.
+    # ' with ' yields to an overlapping ' and ' ("x with and y"), matching the old
+    # split order; quantities never span a newline because newlines separate items.
+    QUANTITY_PATTERN = r'(?P<amount>\d+(?:\.\d+)?)[^\S\n]*(?ai:{})'.format(
+        '|'.join(f'(?P<u{i}>{unit})' for i, (unit, _) in enumerate(UNITS))
+    )
+    TOKEN_RE = re.compile(rf'(?P<sep>,|;|\n| and | with (?!and ))|{QUANTITY_PATTERN}')
+    QUANTITY_RE = re.compile(QUANTITY_PATTERN)
+
+    # Parsed results of recent descriptions, stored as compact tuples. Keyed on the exact
+    # text: case and spacing decide where ' and '/' with ' split, so they can't be folded.
+    memo = LRUCache(max_entries=config('MEAL_PARSER_MEMO_SIZE', default=10000, cast=int))
+
+    # Batches smaller than this are parsed in-process even when a pool is requested
+    PARALLEL_MIN_BATCH = 2000
+
     @classmethod
     def parse_meal(cls, description: str) -> List[Dict]:
         """
         Parse meal description into food items with quantities
         Returns: [{'food': 'chicken breast', 'quantity_grams': 200}, ...]
         """
+        parsed = cls.memo.get(description, MISSING)
+        if parsed is MISSING:
+            parsed = cls._compact(cls._parse_description(description))
+            cls.memo.set(description, parsed)
+        return cls._expand(parsed)
+
+    @classmethod
+    def parse_many(cls, descriptions: Iterable[str], processes: Optional[int] = None,
+                   chunk_size: int = 500) -> List[List[Dict]]:
+        """
+        Parse many descriptions at once, in input order.
+        Duplicates are parsed once, results are shared with parse_meal through the memo,
+        and with `processes` set large batches are parsed in chunks on a process pool.
+        """
+        descriptions = list(descriptions)
+        parsed_by_text = {}
+        pending = []
+        for description in dict.fromkeys(descriptions):
+            parsed = cls.memo.get(description, MISSING)
+            if parsed is MISSING:
+                pending.append(description)
+            else:
+                parsed_by_text[description] = parsed
+
+        if processes and len(pending) >= cls.PARALLEL_MIN_BATCH:
+            chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+            with ProcessPoolExecutor(max_workers=processes) as pool:
+                parsed_chunks = pool.map(_parse_chunk, chunks)
+                for chunk, parsed_chunk in zip(chunks, parsed_chunks):
+                    parsed_by_text.update(zip(chunk, parsed_chunk))
+        else:
+            parsed_by_text.update(zip(pending, _parse_chunk(pending)))
+
+        for description in pending:
+            cls.memo.set(description, parsed_by_text[description])
+
+        return [cls._expand(parsed_by_text[description]) for description in descriptions]
+
+    @classmethod
+    def memo_stats(cls) -> Dict:
+        return cls.memo.stats()
+
+    @staticmethod
+    def _compact(items: List[Dict]) -> Tuple:
+        return tuple((item['food'], item['quantity_grams']) for item in items)
+
+    @staticmethod
+    def _expand(parsed: Tuple) -> List[Dict]:
+        return [{'food': food, 'quantity_grams': quantity} for food, quantity in parsed]
+
+    @classmethod
+    def _parse_description(cls, description: str) -> List[Dict]:
+        """Uncached single-pass parse"""
         items = []
-        
-        # Split by common separators
-        parts = [description]
-        for sep in cls.SEPARATORS:
-            new_parts = []
-            for part in parts:
-                new_parts.extend(part.split(sep))
-            parts = new_parts
-        
-        for part in parts:
-            part = part.strip()
-            if not part:
-                continue
-            
-            food_item = cls._parse_food_item(part)
-            if food_item:
-                items.append(food_item)
-        
+        start = 0
+        quantities = []
+
+        for match in cls.TOKEN_RE.finditer(description):
+            if match.lastgroup == 'sep':
+                food_item = cls._build_item(description, start, match.start(), quantities)
+                if food_item:
+                    items.append(food_item)
+                start = match.end()
+                quantities = []
+            else:
+                quantities.append(match)
+
+        food_item = cls._build_item(description, start, len(description), quantities)
+        if food_item:
+            items.append(food_item)
         return items
-    
+
     @classmethod
     def _parse_food_item(cls, text: str) -> Optional[Dict]:
         """Parse a single food item with quantity"""
-        text = text.lower().strip()
-        
-        # Try to extract quantity
-        quantity_grams = 100  # default
-        food_name = text
-        
-        for pattern, (unit, grams_per_unit) in cls.PORTION_PATTERNS.items():
-            match = re.search(pattern, text)
-            if match:
-                amount = float(match.group(1))
-                quantity_grams = amount * grams_per_unit
-                # Remove the quantity from the food name
-                food_name = re.sub(pattern, '', text).strip()
-                break
-        
+        return cls._build_item(text, 0, len(text), list(cls.QUANTITY_RE.finditer(text)))
+
+    @classmethod
+    def _build_item(cls, text: str, start: int, end: int, quantities: List) -> Optional[Dict]:
+        """Turn a fragment and the quantity matches found inside it into a food item"""
+        if not quantities:
+            food_name = cls._clean_food_name(text[start:end].lower())
+            if not food_name:
+                return None
+            return {'food': food_name, 'quantity_grams': 100}
+
+        # The earliest-listed unit wins; every mention of that unit is dropped from the name.
+        # Compared as UNITS indexes: as group names, 'u10' would sort before 'u2'
+        unit = min(int(m.lastgroup[1:]) for m in quantities)
+        used = [m for m in quantities if int(m.lastgroup[1:]) == unit]
+        quantity_grams = float(used[0].group('amount')) * cls.GRAMS_PER_UNIT[unit]
+
+        pieces = []
+        for m in used:
+            pieces.append(text[start:m.start()])
+            start = m.end()
+        pieces.append(text[start:end])
+
         # Clean up the food name
-        food_name = cls._clean_food_name(food_name)
-        
+        food_name = cls._clean_food_name(''.join(pieces).lower())
+
         if not food_name:
             return None
-        
+
         return {
             'food': food_name,
             'quantity_grams': round(quantity_grams, 1)
         }
-    
+
     @classmethod
     def _clean_food_name(cls, name: str) -> str:
         """Clean and standardize food names"""
         # Remove common words
-        remove_words = ['a', 'an', 'the', 'some', 'of']
-        words = name.split()
-        words = [w for w in words if w not in remove_words]
-        
-        # Join and clean
-        clean_name = ' '.join(words).strip()
-        
-        return clean_name
\ No newline at end of file
+        return ' '.join(w for w in name.split() if w not in cls.STOP_WORDS)
+
+
+def _parse_chunk(descriptions: List[str]) -> List[Tuple]:
+    """Process-pool entry point; returns compact results so less data crosses processes"""
+    return [MealParser._compact(MealParser._parse_description(d)) for d in descriptions]
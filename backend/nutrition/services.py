@@ -1,38 +1,93 @@
-import requests
 import os
 from typing import List, Dict, Optional
 from decouple import config
 
+from .cache import MISSING, TwoTierCache
+from .http_client import get_async_http_client, get_http_client
+
 class USDAFoodService:
     """Service to fetch food nutrition data from USDA FoodData Central API"""
     
     BASE_URL = "https://api.nal.usda.gov/fdc/v1"
     API_KEY = config('USDA_API_KEY', default='DEMO_KEY')  # Free API key
-    
+    DEFAULT_DATA_TYPES = ('Survey (FNDDS)', 'Foundation', 'SR Legacy')
+
+    # Per-process LRU backed by the shared Django cache; empty results are cached briefly
+    cache = TwoTierCache(
+        'usda',
+        max_entries=config('USDA_CACHE_MAX_ENTRIES', default=1000, cast=int),
+        ttl=config('USDA_CACHE_TTL', default=60 * 60 * 24, cast=int),
+        negative_ttl=config('USDA_CACHE_NEGATIVE_TTL', default=60 * 10, cast=int),
+        alias=config('USDA_CACHE_ALIAS', default='default'),
+    )
+
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return ' '.join(query.lower().split())
+
     @classmethod
-    def search_foods(cls, query: str, page_size: int = 5) -> List[Dict]:
-        """Search for foods by name"""
-        url = f"{cls.BASE_URL}/foods/search"
+    def _search_request(cls, query: str, page_size: int, data_types: Optional[List[str]]):
+        """Cache key, URL and params for a search"""
+        query = cls.normalize_query(query)
+        data_types = sorted(data_types or cls.DEFAULT_DATA_TYPES)
+        cache_key = ('search', query, page_size, tuple(data_types))
         params = {
             'api_key': cls.API_KEY,
             'query': query,
             'pageSize': page_size,
-            'dataType': ['Survey (FNDDS)', 'Foundation', 'SR Legacy']
+            'dataType': data_types
         }
+        return cache_key, f"{cls.BASE_URL}/foods/search", params
+
+    @classmethod
+    def search_foods(cls, query: str, page_size: int = 5, data_types: Optional[List[str]] = None) -> List[Dict]:
+        """Search for foods by name"""
+        cache_key, url, params = cls._search_request(query, page_size, data_types)
+
+        cached = cls.cache.get(cache_key)
+        if cached is not MISSING:
+            return [dict(food) for food in cached]
         
         try:
-            response = requests.get(url, params=params, timeout=5)
+            response = get_http_client().get(url, params=params, timeout=5)
             response.raise_for_status()
             data = response.json()
             
             foods = []
             for food in data.get('foods', [])[:page_size]:
                 foods.append(cls._parse_food_data(food))
-            
-            return foods
         except Exception as e:
             print(f"USDA API error: {e}")
             return []
+
+        cls.cache.set(cache_key, foods)
+        return [dict(food) for food in foods]
+
+    @classmethod
+    async def asearch_foods(cls, query: str, page_size: int = 5, data_types: Optional[List[str]] = None) -> List[Dict]:
+        """Async variant of search_foods for ASGI views"""
+        cache_key, url, params = cls._search_request(query, page_size, data_types)
+
+        cached = await cls.cache.aget(cache_key)
+        if cached is not MISSING:
+            return [dict(food) for food in cached]
+
+        try:
+            response = await get_async_http_client().get(url, params=params, timeout=5)
+            response.raise_for_status()
+            data = response.json()
+
+            foods = [cls._parse_food_data(food) for food in data.get('foods', [])[:page_size]]
+        except Exception as e:
+            print(f"USDA API error: {e}")
+            return []
+
+        await cls.cache.aset(cache_key, foods)
+        return [dict(food) for food in foods]
+
+    @classmethod
+    def cache_stats(cls) -> Dict:
+        return cls.cache.stats()
     
     @classmethod
     def _parse_food_data(cls, food_data: Dict) -> Dict:
@@ -63,16 +118,84 @@ class USDAFoodService:
             'fiber_per_100g': nutrients.get('fiber', 0),
         }
 
+    LOCAL_FOOD_FIELDS = (
+        'name', 'usda_id', 'calories_per_100g', 'protein_per_100g',
+        'carbs_per_100g', 'fat_per_100g', 'fiber_per_100g'
+    )
+
+    @classmethod
+    def _local_food_queryset(cls, fdc_id: int):
+        from meals.models import Food
+
+        return Food.objects.filter(usda_id=str(fdc_id)).values(*cls.LOCAL_FOOD_FIELDS)
+
+    @staticmethod
+    def _local_food_data(food: Optional[Dict]) -> Optional[Dict]:
+        if not food:
+            return None
+
+        food['fdcId'] = int(food.pop('usda_id'))
+        return food
+
+    @classmethod
+    def get_local_food(cls, fdc_id: int) -> Optional[Dict]:
+        """Get food data imported with `manage.py import_fdc`, if present"""
+        return cls._local_food_data(cls._local_food_queryset(fdc_id).first())
+
     @classmethod
     def get_food_by_id(cls, fdc_id: int) -> Optional[Dict]:
         """Get detailed food data by FDC ID"""
+        local_food = cls.get_local_food(fdc_id)
+        if local_food:
+            return local_food
+
+        cache_key = ('food', int(fdc_id))
+        cached = cls.cache.get(cache_key)
+        if cached is not MISSING:
+            return dict(cached) if cached else None
+
         url = f"{cls.BASE_URL}/food/{fdc_id}"
         params = {'api_key': cls.API_KEY}
         
         try:
-            response = requests.get(url, params=params, timeout=5)
-            response.raise_for_status()
-            return cls._parse_food_data(response.json())
+            response = get_http_client().get(url, params=params, timeout=5)
+            if response.status_code == 404:
+                food = None
+            else:
+                response.raise_for_status()
+                food = cls._parse_food_data(response.json())
         except Exception as e:
             print(f"USDA API error: {e}")
-            return None
\ No newline at end of file
+            return None
+
+        cls.cache.set(cache_key, food)
+        return dict(food) if food else None
+
+    @classmethod
+    async def aget_food_by_id(cls, fdc_id: int) -> Optional[Dict]:
+        """Async variant of get_food_by_id for ASGI views"""
+        local_food = cls._local_food_data(await cls._local_food_queryset(fdc_id).afirst())
+        if local_food:
+            return local_food
+
+        cache_key = ('food', int(fdc_id))
+        cached = await cls.cache.aget(cache_key)
+        if cached is not MISSING:
+            return dict(cached) if cached else None
+
+        url = f"{cls.BASE_URL}/food/{fdc_id}"
+        params = {'api_key': cls.API_KEY}
+
+        try:
+            response = await get_async_http_client().get(url, params=params, timeout=5)
+            if response.status_code == 404:
+                food = None
+            else:
+                response.raise_for_status()
+                food = cls._parse_food_data(response.json())
+        except Exception as e:
+            print(f"USDA API error: {e}")
+            return None
+
+        await cls.cache.aset(cache_key, food)
+        return dict(food) if food else None
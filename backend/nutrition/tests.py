@@ -1,3 +1,660 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import re
+import tempfile
+import zipfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import httpx
+import requests
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
+
+from meals.models import Food
+
+from .benchmarks import synthetic_food_names
+from .ai_service import NutritionAI
+from .cache import MISSING, LRUCache, TwoTierCache
+from .fdc_import import DATA_TYPES, FoodImporter, iter_source_records
+from .food_index import FoodIndex, FoodIndexService
+from .http_client import AsyncHTTPClient, CircuitBreaker, CircuitOpenError, HTTPClient, PoolExhaustedError
+from .local_engine import LocalNutritionEngine
+from .meal_parser import MealParser
+
+
+def fake_response(status: int, **headers) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers)
+    return response
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertEqual(breaker.allow_request(), (True, False))
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+        self.assertEqual(breaker.allow_request(), (False, False))
+
+    def test_success_resets_the_count(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(breaker.allow_request(), (True, True))
+        self.assertEqual(breaker.state, breaker.HALF_OPEN)
+        self.assertEqual(breaker.allow_request(), (False, False))
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, breaker.CLOSED)
+        self.assertEqual(breaker.allow_request(), (True, False))
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0)
+        for _ in range(3):
+            breaker.record_failure()
+        breaker.allow_request()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, breaker.OPEN)
+
+    def test_released_probe_can_be_taken_again(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        breaker.allow_request()
+        breaker.release_probe()
+        self.assertEqual(breaker.allow_request(), (True, True))
+
+
+@mock.patch('nutrition.http_client.time.sleep')
+class HTTPClientTests(SimpleTestCase):
+    URL = 'https://upstream.test/v1'
+
+    def _client(self, responses, **kwargs):
+        client = HTTPClient(**kwargs)
+        state = client.host_state('upstream.test')
+        state.session.request = mock.Mock(side_effect=responses)
+        return client, state
+
+    def test_retry_after_is_honoured_and_capped(self, sleep):
+        client = HTTPClient()
+        self.assertEqual(client.backoff_delay(0, fake_response(429, **{'Retry-After': '2'})), 2.0)
+        self.assertEqual(client.backoff_delay(0, fake_response(429, **{'Retry-After': '600'})), client.BACKOFF_MAX)
+        for attempt in range(6):
+            delay = client.backoff_delay(attempt)
+            self.assertLessEqual(delay, min(client.BACKOFF_MAX, client.BACKOFF_BASE * 2 ** attempt))
+
+    def test_retries_retryable_statuses(self, sleep):
+        client, state = self._client(
+            [fake_response(503, **{'Retry-After': '1'}), fake_response(200)], max_retries=2
+        )
+        self.assertEqual(client.get(self.URL).status_code, 200)
+        sleep.assert_called_once_with(1.0)
+        self.assertEqual(state.stats.retries, 1)
+        self.assertEqual(state.breaker.failures, 0)
+
+    def test_client_errors_are_not_retried(self, sleep):
+        client, state = self._client([fake_response(404)], max_retries=2)
+        self.assertEqual(client.get(self.URL).status_code, 404)
+        self.assertEqual(state.session.request.call_count, 1)
+        self.assertEqual(state.breaker.failures, 0)
+
+    def test_exhausted_retries_count_one_failure(self, sleep):
+        client, state = self._client([fake_response(502)] * 3, max_retries=2)
+        self.assertEqual(client.get(self.URL).status_code, 502)
+        self.assertEqual(state.session.request.call_count, 3)
+        self.assertEqual(state.breaker.failures, 1)
+
+    def test_connection_errors_are_retried_then_raised(self, sleep):
+        client, state = self._client([requests.ConnectionError()] * 2, max_retries=1)
+        with self.assertRaises(requests.ConnectionError):
+            client.get(self.URL)
+        self.assertEqual(state.session.request.call_count, 2)
+        self.assertEqual(state.breaker.failures, 1)
+
+    def test_other_errors_count_as_failures(self, sleep):
+        client, state = self._client([requests.TooManyRedirects()], max_retries=2)
+        with self.assertRaises(requests.TooManyRedirects):
+            client.get(self.URL)
+        self.assertEqual(state.session.request.call_count, 1)
+        self.assertEqual(state.breaker.failures, 1)
+
+    def test_open_circuit_short_circuits(self, sleep):
+        client, state = self._client([fake_response(500)] * 2, max_retries=0, failure_threshold=2)
+        client.get(self.URL)
+        client.get(self.URL)
+        with self.assertRaises(CircuitOpenError):
+            client.get(self.URL)
+        self.assertEqual(state.session.request.call_count, 2)
+        self.assertEqual(state.stats.short_circuited, 1)
+
+    def test_pool_exhaustion_is_not_an_upstream_failure(self, sleep):
+        client, state = self._client([fake_response(200)], pool_maxsize=1)
+        state.slots.acquire()
+        with self.assertRaises(PoolExhaustedError):
+            client.get(self.URL, timeout=0.01)
+        state.slots.release()
+        self.assertEqual(state.breaker.failures, 0)
+        self.assertEqual(state.session.request.call_count, 0)
+
+    def test_only_the_probe_releases_the_probe_slot(self, sleep):
+        # Let through while closed; before it ends (without a verdict) the circuit opens
+        # and another request takes the half-open probe
+        client, state = self._client([], reset_timeout=0, failure_threshold=1, pool_maxsize=1)
+        breaker = state.breaker
+        allow_request = breaker.allow_request
+
+        def allow_then_trip():
+            decision = allow_request()
+            breaker.record_failure()
+            self.assertEqual(allow_request(), (True, True))
+            return decision
+
+        state.slots.acquire()
+        with mock.patch.object(breaker, 'allow_request', allow_then_trip), self.assertRaises(PoolExhaustedError):
+            client.get(self.URL, timeout=0.01)
+        state.slots.release()
+        self.assertEqual(breaker.allow_request(), (False, False))
+
+    def test_probe_without_a_verdict_frees_the_slot(self, sleep):
+        client, state = self._client([], reset_timeout=0, failure_threshold=1, pool_maxsize=1)
+        state.breaker.record_failure()
+        state.slots.acquire()
+        with self.assertRaises(PoolExhaustedError):
+            client.get(self.URL, timeout=0.01)
+        state.slots.release()
+        self.assertEqual(state.breaker.allow_request(), (True, True))
+
+
+class AsyncHTTPClientTests(SimpleTestCase):
+    """The async client only charges the upstream's breaker for the upstream's failures"""
+
+    URL = 'https://upstream.test/v1'
+
+    def _clients(self, handler, **kwargs):
+        sync_client = HTTPClient(max_retries=0, **kwargs)
+        return sync_client, AsyncHTTPClient(sync_client, transport=httpx.MockTransport(handler))
+
+    def test_saturated_pool_is_not_an_upstream_failure(self):
+        async def scenario():
+            release = asyncio.Event()
+
+            async def handler(request):
+                await release.wait()
+                return httpx.Response(200)
+
+            sync_client, client = self._clients(handler, pool_maxsize=1)
+            first = asyncio.create_task(client.get(self.URL, timeout=5))
+            await asyncio.sleep(0.01)
+            with self.assertRaises(PoolExhaustedError):
+                await client.get(self.URL, timeout=0.05)
+            release.set()
+            self.assertEqual((await first).status_code, 200)
+            await client.aclose()
+            return sync_client.host_state('upstream.test').breaker
+
+        breaker = asyncio.run(scenario())
+        self.assertEqual(breaker.failures, 0)
+        self.assertEqual(breaker.state, breaker.CLOSED)
+
+    def test_slow_upstream_counts_as_a_failure(self):
+        async def scenario():
+            async def handler(request):
+                await asyncio.sleep(1)
+                return httpx.Response(200)
+
+            sync_client, client = self._clients(handler)
+            with self.assertRaises(TimeoutError):
+                await client.get(self.URL, timeout=0.05)
+            await client.aclose()
+            return sync_client.host_state('upstream.test').breaker
+
+        self.assertEqual(asyncio.run(scenario()).failures, 1)
+
+    def test_aclose_closes_the_loops_connections(self):
+        async def scenario():
+            _, client = self._clients(lambda request: httpx.Response(200))
+            await client.get(self.URL)
+            http, _ = client._loop_state()
+            await client.aclose()
+            return http, client
+
+        http, client = asyncio.run(scenario())
+        self.assertTrue(http.is_closed)
+        self.assertEqual(len(client._loops), 0)
+
+
+@mock.patch('nutrition.cache.time.monotonic', return_value=1000.0)
+class LRUCacheTests(SimpleTestCase):
+    def test_entries_expire_after_their_ttl(self, monotonic):
+        lru = LRUCache(ttl=10)
+        lru.set('a', 1)
+        lru.set('b', 2, ttl=30)
+        monotonic.return_value = 1010.0
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.get('b'), 2)
+        self.assertEqual((lru.hits, lru.misses), (1, 1))
+
+    def test_no_ttl_never_expires(self, monotonic):
+        lru = LRUCache()
+        lru.set('a', 1)
+        monotonic.return_value = 10 ** 9
+        self.assertEqual(lru.get('a'), 1)
+
+    def test_zero_ttl_is_not_stored(self, monotonic):
+        lru = LRUCache(ttl=60)
+        lru.set('a', 1)
+        lru.set('a', 2, ttl=0)
+        lru.set('b', 3, ttl=-1)
+        self.assertEqual(len(lru), 0)
+        self.assertIs(lru.get('a', MISSING), MISSING)
+
+    def test_least_recently_used_is_evicted(self, monotonic):
+        lru = LRUCache(max_entries=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+        self.assertIs(lru.get('b', MISSING), MISSING)
+        self.assertEqual((lru.get('a'), lru.get('c')), (1, 3))
+        self.assertEqual(lru.evictions, 1)
+
+
+@mock.patch('nutrition.cache.time.time', return_value=1000.0)
+class TwoTierCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = TwoTierCache('test', ttl=60, negative_ttl=5)
+
+    def test_negative_results_are_hits(self, now):
+        self.cache.set('none', None)
+        self.cache.set('empty', [])
+        self.assertIsNone(self.cache.get('none'))
+        self.assertEqual(self.cache.get('empty'), [])
+        self.assertIs(self.cache.get('unknown'), MISSING)
+        self.assertEqual(self.cache.local.hits, 2)
+
+    def test_negative_results_use_the_negative_ttl(self, now):
+        self.cache.set('none', None)
+        self.assertEqual(cache.get(self.cache.make_key('none')), (None, 1005.0))
+
+    def test_shared_hit_fills_local_for_the_remaining_lifetime(self, now):
+        self.cache.set('key', {'food': 1})
+        self.cache.local.clear()
+        now.return_value = 1050.0
+        with mock.patch.object(self.cache.local, 'set', wraps=self.cache.local.set) as local_set:
+            self.assertEqual(self.cache.get('key'), {'food': 1})
+        local_set.assert_called_once_with('key', {'food': 1}, ttl=10.0)
+        self.assertEqual(self.cache.shared_hits, 1)
+
+    def test_shared_entry_past_its_expiry_is_served_but_not_kept(self, now):
+        # Written by a process whose clock runs behind this one's
+        cache.set(self.cache.make_key('key'), ('value', 999.0))
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(len(self.cache.local), 0)
+
+    def test_delete_clears_both_tiers(self, now):
+        self.cache.set('key', 'value')
+        self.cache.delete('key')
+        self.assertIs(self.cache.get('key'), MISSING)
+        self.assertEqual(self.cache.shared_misses, 1)
+
+
+class FoodIndexTests(SimpleTestCase):
+    FOODS = [
+        (1, 'Chicken, breast, grilled', []),
+        (2, 'Chicken, breast, grilled, skinless', []),
+        (3, 'Chicken, thigh, grilled', []),
+        (4, 'Beef, ground, cooked', []),
+        (5, 'Yogurt, Greek, plain', ['greek yogurt', 'plain greek yoghurt']),
+        (6, 'Oats, rolled, raw', ['porridge oats']),
+    ]
+
+    def setUp(self):
+        self.index = FoodIndex()
+        self.index.build(self.FOODS)
+
+    def ids(self, query, **kwargs):
+        return [hit['food_id'] for hit in self.index.search(query, **kwargs)]
+
+    def test_closer_names_rank_first(self):
+        hits = self.index.search('grilled chicken breast')
+        self.assertEqual([hit['food_id'] for hit in hits], [1, 2, 3])
+        self.assertEqual([hit['score'] for hit in hits], [1.0, 0.75, 0.5])
+
+    def test_typos_plurals_and_word_order(self):
+        self.assertEqual(self.ids('grilled chiken breast', limit=1), [1])
+        self.assertEqual(self.ids('chicken breasts', limit=1), [1])
+        self.assertEqual(self.ids('ground beef cooked', limit=1), [4])
+
+    def test_aliases_match_once_per_food(self):
+        hits = self.index.search('greek yogurt')
+        self.assertEqual([hit['food_id'] for hit in hits], [5])
+        self.assertEqual(hits[0]['name'], 'greek yogurt')
+        self.assertEqual(self.ids('porridge oats'), [6])
+
+    def test_min_score_and_limit(self):
+        self.assertEqual(self.ids('grilled chicken breast', min_score=0.6), [1, 2])
+        self.assertEqual(self.ids('grilled chicken breast', limit=2), [1, 2])
+        self.assertEqual(self.ids('pizza'), [])
+        self.assertEqual(self.ids('!!'), [])
+
+    def test_upsert_and_remove(self):
+        self.index.upsert(4, 'Beef, ground, raw', ['mince'])
+        self.assertEqual(self.ids('mince'), [4])
+        self.index.remove(1)
+        self.assertEqual(self.ids('grilled chicken breast', limit=1), [2])
+        self.assertEqual(len(self.index), 5)
+
+    def test_pruned_search_matches_scoring_every_name(self):
+        names = synthetic_food_names(3000, seed=7)
+        index = FoodIndex()
+        index.build((food_id, name, []) for food_id, name in enumerate(names))
+        state = index._state
+        queries = [
+            'grilled chicken breast', 'whole wheat bread', 'whole wheatb read', 'greek yogurt plain',
+            'baby spinach', 'salmon fillet smoked', 'peanut buter', '2 eggs', 'chicken', 'brown rice boiled',
+        ]
+        for query in queries:
+            with self.subTest(query):
+                words = list(dict.fromkeys(query.split()))
+                similar = [index._similar_words(state, word) for word in words]
+                scores = {}
+                for food_id, _, word_ids in filter(None, state.entries):
+                    matched = [max((sim.get(word_id, 0) for word_id in word_ids), default=0) for sim in similar]
+                    matched = [score for score in matched if score]
+                    score = sum(matched) / (len(words) + len(word_ids) - len(matched))
+                    if score >= 0.3:
+                        scores[food_id] = max(score, scores.get(food_id, 0))
+                expected = sorted((round(score, 3) for score in scores.values()), reverse=True)[:5]
+                self.assertEqual([hit['score'] for hit in index.search(query)], expected)
+
+
+class FoodIndexServiceTests(SimpleTestCase):
+    def test_requests_dont_wait_for_the_startup_build(self):
+        warming = mock.Mock(is_alive=mock.Mock(return_value=True))
+        with mock.patch.object(FoodIndexService, '_built', False), \
+                mock.patch.object(FoodIndexService, '_warming', warming), \
+                mock.patch.object(FoodIndexService, 'build') as build:
+            self.assertIsNone(FoodIndexService.get_index())
+            self.assertEqual(FoodIndexService.search('chicken'), [])
+        build.assert_not_called()
+
+    def test_built_on_first_use_without_warm(self):
+        def build():
+            FoodIndexService._built = True
+
+        with mock.patch.object(FoodIndexService, '_built', False), \
+                mock.patch.object(FoodIndexService, '_warming', None), \
+                mock.patch.object(FoodIndexService, 'build', side_effect=build) as build_index:
+            self.assertIs(FoodIndexService.get_index(), FoodIndexService.index)
+        build_index.assert_called_once()
+
+
+class LocalNutritionEngineTests(TestCase):
+    """Items resolve locally only on a confident match; anything else escalates the meal"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.chicken = Food.objects.create(name='Chicken, breast, grilled', calories_per_100g=165, protein_per_100g=31)
+        cls.rice = Food.objects.create(name='Rice, white, cooked', calories_per_100g=130, carbs_per_100g=28)
+        Food.objects.create(name='Banana', calories_per_100g=89, carbs_per_100g=23)
+
+    def setUp(self):
+        LocalNutritionEngine.memo.clear()
+        index = FoodIndex()
+        index.build(Food.objects.values_list('id', 'name', 'aliases'))
+        patcher = mock.patch.object(FoodIndexService, 'get_index', return_value=index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def qualities(self, *names):
+        return [match and match[1] for match in LocalNutritionEngine.resolve(list(names))]
+
+    def test_exact_plural_and_prefix_matches(self):
+        self.assertEqual(self.qualities('Banana', 'bananas', 'rice'), [1.0, 0.95, 0.75])
+
+    def test_confident_fuzzy_match_resolves(self):
+        [(food, quality)] = LocalNutritionEngine.resolve(['grilled chiken breast'])
+        self.assertEqual(food['id'], self.chicken.id)
+        self.assertGreaterEqual(quality, LocalNutritionEngine.FUZZY_MATCH * LocalNutritionEngine.FUZZY_MIN_SCORE)
+
+    def test_weak_fuzzy_match_escalates(self):
+        # Shares two of three words with the chicken breast: above the index's floor, not a match
+        self.assertTrue(FoodIndexService.get_index().search('grilled chicken thigh'))
+        self.assertEqual(self.qualities('grilled chicken thigh'), [None])
+        parsed = [
+            {'food': 'rice', 'quantity_grams': 150},
+            {'food': 'grilled chicken thigh', 'quantity_grams': 120},
+        ]
+        self.assertIsNone(LocalNutritionEngine.analyze(parsed))
+
+    def test_resolved_meal_is_analyzed_locally(self):
+        analysis = LocalNutritionEngine.analyze([
+            {'food': 'rice', 'quantity_grams': 200},
+            {'food': 'grilled chicken breast', 'quantity_grams': 100},
+        ])
+        self.assertEqual(analysis['source'], 'local')
+        self.assertEqual(analysis['calories'], 425)
+        self.assertEqual([food['food_id'] for food in analysis['foods']], [self.rice.id, self.chicken.id])
+
+    def test_misses_are_not_memoized(self):
+        self.assertEqual(self.qualities('quinoa'), [None])
+        Food.objects.create(name='Quinoa', calories_per_100g=120)
+        self.assertEqual(self.qualities('quinoa'), [1.0])
+        self.assertEqual(len(LocalNutritionEngine.memo), 1)
+
+
+class FoodImporterTests(TestCase):
+    """An FDC import creates, adopts, updates, skips and renames the same way from every format"""
+
+    # (fdc_id, description, {nutrient id: amount per 100g})
+    FDC_FOODS = [
+        (1001, 'Apple, raw', {1008: 52, 1003: 0.3}),
+        (1002, 'Banana, raw', {1008: 89, 1003: 1.1}),
+        (1003, 'Kale, raw', {1008: 35, 1003: 2.9}),
+        (1004, 'Rice, cooked', {1008: 130, 1003: 2.7}),
+        (1005, 'Oats', {1008: 389, 1003: 16.9}),
+    ]
+    EXPECTED = {'created': 2, 'adopted': 1, 'updated': 1, 'unchanged': 1, 'renamed': 1}
+
+    def setUp(self):
+        Food.objects.create(name='Apple, raw', usda_id='1001', calories_per_100g=52, protein_per_100g=0.3)
+        Food.objects.create(name='Banana, raw', usda_id='1002', calories_per_100g=80, protein_per_100g=1.1)
+        # Hand-entered, so FDC 1003 takes it over; 'Rice, cooked' belongs to another FDC food
+        self.kale = Food.objects.create(name='Kale, raw', calories_per_100g=50)
+        Food.objects.create(name='Rice, cooked', usda_id='9999', calories_per_100g=128)
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+
+    def write_json(self):
+        path = os.path.join(self.dir, 'sr_legacy.json')
+        foods = [
+            {
+                'fdcId': fdc_id, 'description': description, 'dataType': 'SR Legacy',
+                'foodNutrients': [{'nutrient': {'id': nid}, 'amount': amount} for nid, amount in amounts.items()],
+            }
+            for fdc_id, description, amounts in self.FDC_FOODS
+        ]
+        with open(path, 'w') as fp:
+            json.dump({'SRLegacyFoods': foods}, fp)
+        return path
+
+    def write_csv(self):
+        path = os.path.join(self.dir, 'csv')
+        os.mkdir(path)
+        with open(os.path.join(path, 'food.csv'), 'w', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['fdc_id', 'data_type', 'description'])
+            for fdc_id, description, _ in self.FDC_FOODS:
+                writer.writerow([fdc_id, 'sr_legacy_food', description])
+        with open(os.path.join(path, 'food_nutrient.csv'), 'w', newline='') as fp:
+            writer = csv.writer(fp)
+            writer.writerow(['id', 'fdc_id', 'nutrient_id', 'amount'])
+            rows = [(fdc_id, nid, amount) for fdc_id, _, amounts in self.FDC_FOODS for nid, amount in amounts.items()]
+            for row_id, row in enumerate(rows, 1):
+                writer.writerow([row_id, *row])
+        return path
+
+    def write_zip(self):
+        csv_dir = self.write_csv()
+        path = os.path.join(self.dir, 'sr_legacy_csv.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            for name in ('food.csv', 'food_nutrient.csv'):
+                archive.write(os.path.join(csv_dir, name), f'FoodData_Central_sr_legacy_food_csv/{name}')
+        return path
+
+    def run_import(self, path):
+        return FoodImporter(batch_size=3).run(iter_source_records(path, DATA_TYPES))
+
+    def assertImported(self, path):
+        self.assertEqual(self.run_import(path), self.EXPECTED)
+        self.assertEqual(Food.objects.count(), 6)
+        self.kale.refresh_from_db()
+        self.assertEqual((self.kale.usda_id, self.kale.calories_per_100g), ('1003', 35))
+        self.assertEqual(Food.objects.get(usda_id='1002').calories_per_100g, 89)
+        self.assertEqual(Food.objects.get(usda_id='1004').name, 'Rice, cooked [1004]')
+        self.assertEqual(Food.objects.get(name='Rice, cooked').usda_id, '9999')
+        # Nothing left to write the second time
+        self.assertEqual(self.run_import(path)['unchanged'], len(self.FDC_FOODS))
+
+    def test_json_import(self):
+        self.assertImported(self.write_json())
+
+    def test_csv_directory_import(self):
+        self.assertImported(self.write_csv())
+
+    def test_zip_import(self):
+        self.assertImported(self.write_zip())
+
+    def test_dry_run_counts_without_writing(self):
+        stats = FoodImporter(dry_run=True).run(iter_source_records(self.write_json(), DATA_TYPES))
+        self.assertEqual(stats, self.EXPECTED)
+        self.assertEqual(Food.objects.count(), 4)
+
+    def test_command_reports_adopted_foods(self):
+        out = StringIO()
+        call_command('import_fdc', self.write_json(), stdout=out)
+        self.assertIn('2 created, 1 adopted from hand-entered foods, 1 updated, 1 unchanged', out.getvalue())
+
+
+def completion(content) -> requests.Response:
+    """An OpenAI chat completion whose answer is `content` (a string, or JSON-encoded)"""
+    response = fake_response(200)
+    content = content if isinstance(content, str) else json.dumps(content)
+    response._content = json.dumps({'choices': [{'message': {'content': content}}]}).encode()
+    return response
+
+
+@mock.patch('nutrition.ai_service.print', create=True)
+@mock.patch.object(NutritionAI, 'USE_REAL_AI', True)
+@mock.patch('nutrition.ai_service.LocalNutritionEngine.analyze', return_value=None)
+class NutritionAITests(SimpleTestCase):
+    """Only well-formed OpenAI answers are returned and cached; anything else falls back to the mock"""
+
+    DESCRIPTION = 'chicken and rice'
+    PARSED = [{'food': 'chicken', 'quantity_grams': 150}, {'food': 'rice', 'quantity_grams': 200}]
+    ANSWER = {
+        'calories': '520', 'protein': 48, 'carbs': 58.5, 'fat': 9, 'fiber': 1.2,
+        'recommendations': 'Add a side of vegetables', 'confidence_score': 0.8,
+    }
+
+    def setUp(self):
+        cache.clear()
+        NutritionAI.cache.local.clear()
+        self.ai = NutritionAI()
+        self.key = NutritionAI.result_cache_key(self.PARSED)
+        self.mock_estimate = self.ai._analyze_mock(self.DESCRIPTION, self.PARSED)
+
+    def analyze(self, post, **kwargs):
+        client = mock.Mock(post=post)
+        with mock.patch('nutrition.ai_service.get_http_client', return_value=client):
+            return self.ai.analyze_meal(self.DESCRIPTION, self.PARSED, **kwargs)
+
+    def test_answer_is_normalized_and_cached(self, *mocks):
+        post = mock.Mock(return_value=completion(self.ANSWER))
+        analysis = self.analyze(post)
+        self.assertEqual(analysis['calories'], 520.0)
+        self.assertEqual(analysis['recommendations'], ['Add a side of vegetables'])
+        self.assertEqual(self.analyze(post), analysis)
+        self.assertEqual(post.call_count, 1)
+
+    def test_bad_answers_fall_back_and_are_not_cached(self, *mocks):
+        partial = {key: value for key, value in self.ANSWER.items() if key != 'fat'}
+        answers = {
+            'not json': 'Roughly 500 calories',
+            'not an object': [self.ANSWER],
+            'partial': partial,
+            'non-numeric': {**self.ANSWER, 'calories': 'about 500'},
+            'negative': {**self.ANSWER, 'protein': -4},
+            'boolean': {**self.ANSWER, 'fiber': True},
+            'bad recommendations': {**self.ANSWER, 'recommendations': [{'tip': 'eat greens'}]},
+        }
+        for name, answer in answers.items():
+            with self.subTest(name):
+                post = mock.Mock(return_value=completion(answer))
+                self.assertEqual(self.analyze(post), self.mock_estimate)
+                self.assertIs(NutritionAI.cache.get(self.key), MISSING)
+                with self.assertRaises(ValueError):
+                    self.analyze(post, fallback=False)
+                self.assertEqual(post.call_count, 2)
+
+    def test_open_circuit_falls_back_to_the_mock(self, *mocks):
+        post = mock.Mock(side_effect=CircuitOpenError('api.openai.com is failing'))
+        self.assertEqual(self.analyze(post), self.mock_estimate)
+        self.assertIs(NutritionAI.cache.get(self.key), MISSING)
+        with self.assertRaises(CircuitOpenError):
+            self.analyze(post, fallback=False)
+
+    def test_async_open_circuit_falls_back_to_the_mock(self, *mocks):
+        client = mock.Mock(post=mock.AsyncMock(side_effect=CircuitOpenError('api.openai.com is failing')))
+        with mock.patch('nutrition.ai_service.get_async_http_client', return_value=client):
+            analysis = asyncio.run(self.ai.aanalyze_meal(self.DESCRIPTION, self.PARSED))
+        self.assertEqual(analysis, self.mock_estimate)
+        self.assertIs(NutritionAI.cache.get(self.key), MISSING)
+
+    def test_async_bad_answer_is_not_cached(self, *mocks):
+        client = mock.Mock(post=mock.AsyncMock(return_value=completion({'calories': 500})))
+        with mock.patch('nutrition.ai_service.get_async_http_client', return_value=client):
+            analysis = asyncio.run(self.ai.aanalyze_meal(self.DESCRIPTION, self.PARSED))
+        self.assertEqual(analysis, self.mock_estimate)
+        self.assertIs(NutritionAI.cache.get(self.key), MISSING)
+
+
+class MealParserTests(SimpleTestCase):
+    def setUp(self):
+        MealParser.memo.clear()
+
+    def test_items_and_quantities(self):
+        self.assertEqual(MealParser.parse_meal('2 cups rice, 100g chicken and an apple\n3 slices of bread'), [
+            {'food': 'rice', 'quantity_grams': 2.0},
+            {'food': 'chicken', 'quantity_grams': 100.0},
+            {'food': 'apple', 'quantity_grams': 100},
+            {'food': 'bread', 'quantity_grams': 90.0},
+        ])
+
+    def test_earliest_listed_unit_wins(self):
+        # grams are listed before slices, whichever comes first in the text; only the
+        # winning unit is taken out of the name
+        self.assertEqual(MealParser.parse_meal('2 slices toast 60g'), [{'food': '2 slices toast', 'quantity_grams': 60.0}])
+
+    def test_units_compare_by_index_past_ten(self):
+        # As strings 'u10' < 'u2'; the unit listed third must still beat the eleventh
+        quantity_re = re.compile(r'(?P<amount>\d+)\s*(?:(?P<u2>tsp)|(?P<u10>pinch))')
+        grams = [0] * 11
+        grams[2], grams[10] = 5, 0.3
+        text = '1 pinch salt 2 tsp'
+        with mock.patch.object(MealParser, 'GRAMS_PER_UNIT', grams):
+            item = MealParser._build_item(text, 0, len(text), list(quantity_re.finditer(text)))
+        self.assertEqual(item['quantity_grams'], 10.0)
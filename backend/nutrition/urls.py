@@ -3,4 +3,5 @@ from . import views
 
 urlpatterns = [
     path('analyze/', views.NutritionAnalysisView.as_view(), name='nutrition_analyze'),
+    path('stats/', views.service_stats_json, name='service_stats'),
 ]
\ No newline at end of file
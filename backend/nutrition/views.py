@@ -3,6 +3,14 @@ from rest_framework.response import Response
 from rest_framework import permissions, status
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
+from django.http import JsonResponse
+
+from .ai_service import NutritionAI
+from .food_index import FoodIndexService
+from .http_client import get_http_client
+from .local_engine import LocalNutritionEngine
+from .meal_parser import MealParser
+from .services import USDAFoodService
 
 @method_decorator(csrf_exempt, name='dispatch')
 class NutritionAnalysisView(APIView):
@@ -39,4 +47,19 @@ class NutritionAnalysisView(APIView):
             'analysis': mock_analysis,
             'recommendations': mock_recommendations,
             'confidence_score': 0.85
-        })
\ No newline at end of file
+        })
+
+
+def service_stats_json(request):
+    """Cache counters and upstream latency stats of this worker process (staff only)"""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Staff access required'}, status=403)
+
+    return JsonResponse({
+        'usda_cache': USDAFoodService.cache_stats(),
+        'meal_parser_memo': MealParser.memo_stats(),
+        'local_food_memo': LocalNutritionEngine.memo_stats(),
+        'food_index': FoodIndexService.stats(),
+        'ai_result_cache': NutritionAI.cache_stats(),
+        'http': get_http_client().stats(),
+    })